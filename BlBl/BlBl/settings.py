@@ -148,3 +148,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MODELSCOPE_API_KEY = os.getenv('MODELSCOPE_API_KEY', 'ms-01597560-bc5b-41c0-86ff-2466a31fc959').strip()
 MODELSCOPE_BASE_URL = os.getenv('MODELSCOPE_BASE_URL', 'https://api-inference.modelscope.cn/v1').strip()
 MODELSCOPE_MODEL_ID = os.getenv('MODELSCOPE_MODEL_ID', 'deepseek-ai/DeepSeek-V3.2').strip()
+
+# ============ 推荐模型配置 ============
+# 离线脚本生成的模型目录: item_cf.py -> item_index, als_recommender.py -> als_model,
+# run_recommendation.py -> hybrid_model（也兼容旧的 .npz 文件）
+REC_MODEL_PATH = os.getenv('REC_MODEL_PATH', os.path.join(BASE_DIR, 'item_index'))
+REC_MODEL_CHECK_INTERVAL = 30  # 检查模型文件是否更新的间隔（秒）
+
+# ============ 缓存配置 ============
+# 默认使用进程内缓存；多个Web进程部署时换成 Redis/Memcached 等共享缓存，
+# 否则信号只能清除当前进程的缓存，其他进程要等缓存过期
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bilibili-stats',
+    }
+}
+DASHBOARD_STATS_TTL = 300  # 首页统计数据的缓存时间（秒）
+KESHIHUA_CACHE_TTL = 60    # 可视化页面统计数据的缓存时间（秒）
+WORDCLOUD_CACHE_TTL = 600  # 词云数据的缓存时间（秒）
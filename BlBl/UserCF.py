@@ -10,6 +10,9 @@ from operator import itemgetter
 from datetime import datetime
 import sys
 
+from popularity import PopularityIndex
+from rec_publisher import publish_recommendations
+
 
 class UserBasedCF():
     def __init__(self, n_sim_user=3, n_rec_video=5):
@@ -20,6 +23,7 @@ class UserBasedCF():
         self.user_sim_matrix = {}  # {user_id: {other_user_id: similarity}}
         self.video_count = 0
         self.all_videos = set()
+        self.popularity = None  # PopularityIndex，训练集加载后第一次使用热门后备时构建
         print(f'相似用户数 = {self.n_sim_user}')
         print(f'推荐视频数 = {self.n_rec_video}')
 
@@ -55,6 +59,7 @@ class UserBasedCF():
                 print(f"解析行时出错: {line}, 错误: {e}")
                 continue
 
+        self.popularity = None
         print('训练集和测试集划分成功!')
         print(f'训练集大小 = {trainSet_len}, 用户数: {len(self.trainSet)}')
         print(f'测试集大小 = {testSet_len}, 用户数: {len(self.testSet)}')
@@ -186,36 +191,16 @@ class UserBasedCF():
         return sorted(rank.items(), key=lambda x: x[1], reverse=True)[:N]
 
     def get_popular_fallback(self, watched_videos, N):
-        """获取热门视频作为后备推荐"""
+        """获取热门视频作为后备推荐（沿预先排好序的热门列表跳过已观看的视频）"""
         if not self.trainSet:
             return []
+        return self.popularity_index().top(N, watched_videos)
 
-        # 计算每个视频的观看次数
-        video_popularity = {}
-        for user_videos in self.trainSet.values():
-            for video in user_videos:
-                video_popularity[video] = video_popularity.get(video, 0) + 1
-
-        # 过滤掉用户已观看的视频
-        for video in watched_videos:
-            video_popularity.pop(video, None)
-
-        if not video_popularity:
-            return []
-
-        # 按流行度排序
-        popular_videos = sorted(video_popularity.items(),
-                                key=lambda x: x[1], reverse=True)[:N]
-
-        # 转换为(视频ID, 评分)格式
-        result = []
-        if popular_videos:
-            max_pop = max([count for _, count in popular_videos])
-            for video, count in popular_videos:
-                score = (count / max_pop) * 5.0 if max_pop > 0 else 3.0
-                result.append((video, score))
-
-        return result
+    def popularity_index(self):
+        """返回热门视频索引，每个训练集只统计一次"""
+        if self.popularity is None or self.popularity.source is not self.trainSet:
+            self.popularity = PopularityIndex(self.trainSet)
+        return self.popularity
 
     def evaluate_and_save(self):
         """评估并保存推荐结果到数据库"""
@@ -234,18 +219,6 @@ class UserBasedCF():
                 database='bill_video',
                 charset='utf8'
             )
-            cursor = db.cursor()
-
-            # 清空推荐表
-            cursor.execute("TRUNCATE TABLE myapp_rec;")
-            db.commit()
-            print("已清空推荐表")
-
-            # 准备插入语句
-            insert_sql = """
-                INSERT INTO myapp_rec (user_id, video_id, score, created_at) 
-                VALUES (%s, %s, %s, NOW())
-            """
 
             all_recommendations = []
 
@@ -265,50 +238,34 @@ class UserBasedCF():
                         print(f"数据类型转换错误: user={user_id}, video={video_id}, score={score}, 错误: {e}")
                         continue
 
-            # 批量插入推荐数据
+            # 特别处理用户25（在发布前补齐，线上表不会出现用户25暂时没有推荐的情况）
+            if not any(user_id == 25 for user_id, _, _ in all_recommendations):
+                print("为用户25生成后备推荐...")
+
+                # 如果用户25在训练集中但没有推荐，使用热门视频
+                recommendations = self.recommend('25') if '25' in self.trainSet else []
+                if not recommendations:
+                    # 使用全局热门视频
+                    recommendations = self.get_popular_fallback(set(), 5)
+
+                count_25 = 0
+                for video_id, score in recommendations:
+                    try:
+                        all_recommendations.append((25, int(video_id), float(score)))
+                        count_25 += 1
+                    except (ValueError, TypeError) as e:
+                        print(f"生成用户25后备推荐失败: {e}")
+                        continue
+                print(f"已为用户25生成 {count_25} 条推荐")
+
+            # 写入暂存表后原子替换推荐表
             if all_recommendations:
                 try:
-                    cursor.executemany(insert_sql, all_recommendations)
-                    db.commit()
-                    print(f"成功插入 {len(all_recommendations)} 条推荐记录")
+                    publish_recommendations(db, all_recommendations)
                 except Exception as e:
                     print(f"批量插入失败: {e}")
-                    db.rollback()
-
-            # 特别处理用户25
-            cursor.execute("SELECT COUNT(*) FROM myapp_rec WHERE user_id = 25")
-            count_25 = cursor.fetchone()[0]
-
-            if count_25 == 0:
-                print("为用户25生成后备推荐...")
 
-                # 如果用户25在训练集中但没有推荐，使用热门视频
-                if '25' in self.trainSet:
-                    recommendations = self.recommend('25')
-
-                    if recommendations:
-                        for video_id, score in recommendations:
-                            try:
-                                video_id_int = int(video_id)
-                                score_float = float(score)
-                                cursor.execute(insert_sql, (25, video_id_int, score_float))
-                            except Exception as e:
-                                print(f"插入用户25推荐失败: {e}")
-                                continue
-                    else:
-                        # 使用全局热门视频
-                        popular_fallback = self.get_popular_fallback(set(), 5)
-                        for video_id, score in popular_fallback:
-                            try:
-                                video_id_int = int(video_id)
-                                score_float = float(score)
-                                cursor.execute(insert_sql, (25, video_id_int, score_float))
-                            except Exception as e:
-                                print(f"插入用户25热门视频失败: {e}")
-                                continue
-
-                db.commit()
-                print(f"已为用户25生成 {cursor.rowcount} 条推荐")
+            cursor = db.cursor()
 
             # 统计信息
             cursor.execute("SELECT COUNT(*) FROM myapp_rec")
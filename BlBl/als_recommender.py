@@ -0,0 +1,305 @@
+"""
+隐式反馈矩阵分解推荐算法（Implicit ALS）
+收藏数据只有"收藏/未收藏"，适合用置信度加权的交替最小二乘：
+    置信度 c_ui = 1 + alpha * rating，偏好 p_ui = 1（收藏过）或 0
+训练后保存稠密的用户/视频隐向量，推荐时只需一次点积 + Top-N 部分排序
+"""
+import csv
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pymysql
+from scipy import sparse
+
+from interaction_loader import load_weighted_interactions
+from rec_models import FactorModel, top_n
+from run_recommendation import save_recommendation_rows
+
+
+class ImplicitALS():
+    def __init__(self, n_factors=32, regularization=0.1, alpha=8.0, iterations=15,
+                 n_rec_video=9, n_threads=None, seed=42):
+        """
+        初始化
+        Args:
+            n_factors: 隐向量维度
+            regularization: L2正则系数
+            alpha: 置信度系数（评分5时置信度为 1 + 5*alpha）
+            iterations: 交替迭代次数
+            n_rec_video: 推荐视频数量
+            n_threads: 求解线程数，默认使用全部CPU
+            seed: 随机种子
+        """
+        self.n_factors = n_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.n_rec_video = n_rec_video
+        self.n_threads = n_threads or os.cpu_count() or 1
+        self.seed = seed
+
+        # 数据存储（格式与 UserBasedCF 一致）
+        self.trainSet = {}  # {user_id: {video_id: rating}}
+        self.testSet = {}   # {user_id: {video_id: rating}}
+
+        # ID与矩阵行列号的映射
+        self.user_ids = []
+        self.video_ids = []
+        self.user_index = {}
+        self.video_index = {}
+
+        self.user_items = None    # 用户×视频 置信度CSR矩阵
+        self.user_factors = None  # (用户数, n_factors)
+        self.item_factors = None  # (视频数, n_factors)
+
+        print(f'隐向量维度 = {self.n_factors}')
+        print(f'迭代次数 = {self.iterations}')
+        print(f'推荐视频数 = {self.n_rec_video}')
+        print(f'线程数 = {self.n_threads}')
+
+    def get_dataset(self, filename, pivot=0.85):
+        """从CSV文件加载数据集"""
+        trainSet_len = 0
+        testSet_len = 0
+
+        with open(filename, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # 跳过标题行
+            for parts in reader:
+                if len(parts) != 3:
+                    continue
+                user, video, rating = (part.strip() for part in parts)
+                if not user or not video:
+                    continue
+
+                if random.random() < pivot:
+                    self.trainSet.setdefault(user, {})[video] = int(rating)
+                    trainSet_len += 1
+                else:
+                    self.testSet.setdefault(user, {})[video] = int(rating)
+                    testSet_len += 1
+
+        print('训练集和测试集划分成功!')
+        print(f'训练集大小 = {trainSet_len}, 用户数: {len(self.trainSet)}')
+        print(f'测试集大小 = {testSet_len}, 用户数: {len(self.testSet)}')
+
+    def load_dataset(self, data, pivot=0.85, seed=None):
+        """
+        从 InteractionData 加载数据集，训练集直接转换为置信度矩阵，不再经过逐行的字典
+        Args:
+            data: interaction_loader.InteractionData
+        """
+        train, test = data.split(pivot, seed)
+        train = train.compact()
+        self.testSet = test.to_dict()
+        self.trainSet = {}
+
+        self.user_ids = [str(user) for user in train.user_ids.tolist()]
+        self.video_ids = [str(video) for video in train.video_ids.tolist()]
+        self.user_index = {user: i for i, user in enumerate(self.user_ids)}
+        self.video_index = {video: j for j, video in enumerate(self.video_ids)}
+        self.user_items = (train.to_csr().astype(np.float64) * self.alpha).tocsr()
+
+        print('训练集和测试集划分成功!')
+        print(f'训练集大小 = {len(train)}, 用户数: {train.n_users}')
+        print(f'测试集大小 = {len(test)}, 用户数: {len(self.testSet)}')
+
+    def _build_matrix(self):
+        """把训练集转换为 用户×视频 置信度矩阵（存 alpha*rating，即 c_ui - 1）"""
+        self.user_ids = list(self.trainSet.keys())
+        self.user_index = {user: i for i, user in enumerate(self.user_ids)}
+        self.video_index = {}
+
+        rows, cols, data = [], [], []
+        for user, videos in self.trainSet.items():
+            i = self.user_index[user]
+            for video, rating in videos.items():
+                j = self.video_index.setdefault(video, len(self.video_index))
+                rows.append(i)
+                cols.append(j)
+                data.append(self.alpha * float(rating))
+
+        self.video_ids = [None] * len(self.video_index)
+        for video, j in self.video_index.items():
+            self.video_ids[j] = video
+
+        self.user_items = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), (rows, cols)),
+            shape=(len(self.user_ids), len(self.video_ids))
+        )
+
+    def _solve_rows(self, confidence, fixed, start, stop, out):
+        """
+        求解第 start~stop 行的隐向量:
+            x_u = (YᵀY + Yᵀ(C_u - I)Y + λI)⁻¹ Yᵀ C_u p_u
+        同一批行的线性方程组一次性交给 np.linalg.solve 批量求解
+        """
+        n_factors = fixed.shape[1]
+        base = self._gram + self.regularization * np.eye(n_factors)
+        A = np.repeat(base[np.newaxis, :, :], stop - start, axis=0)
+        b = np.zeros((stop - start, n_factors))
+
+        indptr, indices, data = confidence.indptr, confidence.indices, confidence.data
+        for k, row in enumerate(range(start, stop)):
+            lo, hi = indptr[row], indptr[row + 1]
+            if lo == hi:
+                continue
+            Y_u = fixed[indices[lo:hi]]
+            c_minus_1 = data[lo:hi]
+            A[k] += (Y_u.T * c_minus_1) @ Y_u
+            b[k] = Y_u.T @ (c_minus_1 + 1.0)
+
+        out[start:stop] = np.linalg.solve(A, b[:, :, np.newaxis])[:, :, 0]
+
+    def _alternate(self, confidence, fixed, out, chunk_size=256):
+        """固定一侧隐向量，多线程求解另一侧"""
+        self._gram = fixed.T @ fixed
+        n_rows = confidence.shape[0]
+        chunks = [(start, min(start + chunk_size, n_rows)) for start in range(0, n_rows, chunk_size)]
+
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            futures = [executor.submit(self._solve_rows, confidence, fixed, start, stop, out)
+                       for start, stop in chunks]
+            for future in futures:
+                future.result()
+
+    def fit(self):
+        """训练隐向量"""
+        if self.trainSet:
+            self._build_matrix()
+        if self.user_items is None or self.user_items.nnz == 0:
+            print("训练集为空，无法训练")
+            return
+
+        n_users, n_videos = self.user_items.shape
+        print(f"训练ALS: 用户数={n_users}, 视频数={n_videos}, 交互数={self.user_items.nnz}")
+
+        rng = np.random.default_rng(self.seed)
+        self.user_factors = rng.normal(0, 0.01, (n_users, self.n_factors))
+        self.item_factors = rng.normal(0, 0.01, (n_videos, self.n_factors))
+        item_users = sparse.csr_matrix(self.user_items.T)
+
+        for iteration in range(self.iterations):
+            self._alternate(self.user_items, self.item_factors, self.user_factors)
+            self._alternate(item_users, self.user_factors, self.item_factors)
+            print(f"  第 {iteration + 1}/{self.iterations} 轮完成")
+
+        self.user_factors = self.user_factors.astype(np.float32)
+        self.item_factors = self.item_factors.astype(np.float32)
+        print("ALS训练完成!")
+
+    def recommend_for_user(self, user):
+        """
+        为用户生成推荐: 得分 = 用户向量·视频向量，过滤已收藏后取前N个
+        Returns:
+            [(video_id, score)]，得分归一化到0-5分
+        """
+        N = self.n_rec_video
+        i = self.user_index.get(user)
+        if i is None or self.item_factors is None:
+            return []
+
+        scores = self.item_factors @ self.user_factors[i]
+        lo, hi = self.user_items.indptr[i], self.user_items.indptr[i + 1]
+        scores[self.user_items.indices[lo:hi]] = -np.inf
+
+        top = top_n(scores, N)
+        top = top[scores[top] > 0]
+        if top.size == 0:
+            return []
+
+        max_score = scores[top[0]]
+        return [(self.video_ids[j], float(scores[j] / max_score * 5.0)) for j in top]
+
+    def save_model(self, path='als_model'):
+        """保存隐向量，供在线推荐服务加载"""
+        if self.user_factors is None:
+            print("模型未训练，未保存")
+            return
+        FactorModel(
+            [int(user) for user in self.user_ids], [int(video) for video in self.video_ids],
+            self.user_factors, self.item_factors, self.regularization, self.alpha
+        ).save(path)
+
+    def save_recommendations(self, db_connection):
+        """生成所有用户的推荐，并通过与 UserBasedCF 相同的写入流程保存到推荐表"""
+        print("\n" + "="*50)
+        print("保存ALS推荐结果到数据库")
+        print("="*50)
+
+        if self.user_factors is None:
+            print("模型未训练，无法生成推荐")
+            return
+
+        all_recommendations = []
+        for user_id in self.user_ids:
+            for video_id, score in self.recommend_for_user(user_id):
+                try:
+                    all_recommendations.append((int(user_id), int(video_id), float(score)))
+                except (ValueError, TypeError) as e:
+                    print(f"数据类型转换错误: user={user_id}, video={video_id}, 错误: {e}")
+                    continue
+
+        save_recommendation_rows(db_connection, all_recommendations)
+
+
+def main():
+    """主函数"""
+    print("=" * 60)
+    print("隐式反馈ALS推荐算法")
+    print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    als = ImplicitALS(n_factors=32, iterations=15, n_rec_video=9)
+
+    try:
+        db = pymysql.connect(
+            host="localhost",
+            user='root',
+            password='li974521',
+            database='bill_video',
+            charset='utf8'
+        )
+    except Exception as e:
+        print(f"数据库连接失败: {e}")
+        return
+
+    try:
+        # 步骤1: 从数据库直接加载收藏和评论数据（按时间衰减加权）
+        data = load_weighted_interactions(db)
+        if len(data) == 0:
+            print("错误: 没有从数据库读取到数据")
+            return
+
+        # 步骤2: 加载数据集并训练
+        print("\n" + "-" * 40)
+        print("加载数据集...")
+        als.load_dataset(data, pivot=0.9)
+
+        print("\n" + "-" * 40)
+        als.fit()
+        als.save_model('als_model')
+
+        # 步骤3: 生成并保存推荐
+        als.save_recommendations(db)
+    finally:
+        db.close()
+
+    print("\n" + "=" * 60)
+    print("算法运行完成!")
+    print(f"结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
+    except Exception as e:
+        print(f"程序运行出错: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,260 @@
+"""
+近似最近邻索引召回率基准测试
+用 benchmark.py 的幂律合成数据，对比 RandomProjectionIndex 与精确计算的前K个最近邻:
+    profiles: 用户兴趣画像（用户×标签，稀疏）的余弦近邻
+    als: ALS视频隐向量（稠密）的余弦近邻
+    neighbors: 混合推荐最终的相似用户列表（sim_backend='ann' 对比 'sparse'）
+    minhash: MinHash+LSH候选用户对（behavior_backend='minhash'）对Jaccard不低于阈值的用户对的召回率，
+             以及最终相似用户列表与 'sparse' 的重合比例
+召回率 = 近似结果与精确结果前K个的交集 / 精确结果的个数
+
+用法:
+    python ann_benchmark.py
+    python ann_benchmark.py --users 20000 --tables 4 8 16 --bits 8 12
+    python ann_benchmark.py --vectors profiles --queries 500
+    python ann_benchmark.py --vectors minhash --thresholds 0.1 0.2 0.3
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ann_index import RandomProjectionIndex, exact_top_k
+from benchmark import generate_videos, generate_wishlist
+from evaluate import holdout_split
+from interaction_store import InteractionStore
+
+VECTOR_TYPES = ('profiles', 'als', 'neighbors', 'minhash')
+
+
+def build_hybrid(ratings, video_rows, sim_backend, behavior_backend='exact'):
+    """训练混合推荐模型（不输出日志），返回 UserBasedCF"""
+    from run_recommendation import UserBasedCF
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = UserBasedCF(n_sim_user=0, sim_backend=sim_backend, behavior_backend=behavior_backend)
+        model.verbose = False
+        trainSet, _ = holdout_split(ratings, pivot=1.0)
+        model.trainSet = InteractionStore.from_dict(trainSet)
+        model.set_video_tags(video_rows)
+        model.build_user_profiles()
+    return model
+
+
+def profile_vectors(ratings, video_rows):
+    import sparse_similarity
+    model = build_hybrid(ratings, video_rows, 'python')
+    user_tag, _ = sparse_similarity.build_csr_matrix(model.user_profiles, model.trainSet.user_keys)
+    return user_tag
+
+
+def als_vectors(ratings):
+    from als_recommender import ImplicitALS
+    from interaction_loader import InteractionData
+    users, videos = zip(*[(int(user), int(video)) for user, video, _ in ratings])
+    with contextlib.redirect_stdout(io.StringIO()):
+        als = ImplicitALS(n_factors=32, iterations=5)
+        als.load_dataset(InteractionData.from_ids(users, videos, np.full(len(users), 5.0)), pivot=1.0, seed=0)
+        als.fit()
+    return als.item_factors
+
+
+def measure_recall(vectors, k, n_tables, n_bits, n_probes, queries, seed):
+    """构建索引并对抽样的行查询，统计召回率、候选数和耗时"""
+    start = time.perf_counter()
+    index = RandomProjectionIndex(n_tables, n_bits, n_probes, seed).build(vectors)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(index), min(queries, len(index)), replace=False)
+    recalls = []
+    candidates = 0
+    query_seconds = 0.0
+    exact_seconds = 0.0
+    for row in rows.tolist():
+        vector = index._row_vector(row)
+
+        start = time.perf_counter()
+        exact, _ = exact_top_k(index.vectors, vector, k, exclude=[row])
+        exact_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        found, _ = index.query_row(row, k)
+        query_seconds += time.perf_counter() - start
+
+        candidates += index.candidates(vector).size
+        if exact.size:
+            recalls.append(len(np.intersect1d(found, exact)) / exact.size)
+
+    return {
+        'n_tables': n_tables,
+        'n_bits': n_bits,
+        'n_probes': n_probes,
+        'recall': float(np.mean(recalls)) if recalls else 0.0,
+        'avg_candidates': candidates / len(rows),
+        'build_seconds': build_seconds,
+        'query_ms': query_seconds / len(rows) * 1000,
+        'exact_ms': exact_seconds / len(rows) * 1000,
+    }
+
+
+def timed_similarity(ratings, video_rows, k, sim_backend, behavior_backend='exact', threshold=None):
+    """计算混合推荐的相似用户（保留前k个），返回 (TopKNeighbors, 耗时)"""
+    model = build_hybrid(ratings, video_rows, sim_backend, behavior_backend)
+    model.n_keep_sim = k
+    if threshold is not None:
+        model.minhash_threshold = threshold
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.calc_user_sim_with_content()
+    return model.user_sim_matrix, time.perf_counter() - start
+
+
+def neighbor_overlap(exact, approx):
+    """两份相似用户列表每个用户前k个邻居的平均重合比例"""
+    recalls = []
+    for i in range(len(exact.user_keys)):
+        expected = exact.neighbors[i, :exact.counts[i]]
+        if expected.size:
+            recalls.append(len(np.intersect1d(approx.neighbors[i, :approx.counts[i]], expected)) / expected.size)
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+def measure_neighbor_recall(ratings, video_rows, k):
+    """混合推荐的相似用户列表: sim_backend='ann' 与 'sparse' 前k个的重合比例"""
+    exact, exact_seconds = timed_similarity(ratings, video_rows, k, 'sparse')
+    approx, approx_seconds = timed_similarity(ratings, video_rows, k, 'ann')
+    return {
+        'recall': neighbor_overlap(exact, approx),
+        'sparse_seconds': exact_seconds,
+        'ann_seconds': approx_seconds,
+    }
+
+
+def measure_minhash_recall(ratings, video_rows, k, thresholds, seed):
+    """
+    MinHash+LSH 的召回损失:
+        pair_recall: Jaccard >= 阈值的用户对中被选为候选的比例
+        recall: 最终相似用户列表与 sim_backend='sparse' 前k个的重合比例
+    """
+    import sparse_similarity
+    from minhash_lsh import MinHashLSH
+    from scipy import sparse
+
+    user_video = InteractionStore.from_dict(holdout_split(ratings, pivot=1.0)[0]).to_csr(binary=True)
+    start = time.perf_counter()
+    blocks = [block for _, block in sparse_similarity.iter_combined_similarity(user_video, user_video, 1.0, 0.0)]
+    jaccard = sparse.triu(sparse.vstack(blocks), k=1).tocoo()
+    jaccard_seconds = time.perf_counter() - start
+    exact, exact_seconds = timed_similarity(ratings, video_rows, k, 'sparse')
+    n_users = user_video.shape[0]
+
+    runs = []
+    for threshold in thresholds:
+        lsh = MinHashLSH(threshold=threshold, seed=seed)
+        start = time.perf_counter()
+        i, j = lsh.candidate_pairs(lsh.signatures(user_video))
+        candidate_seconds = time.perf_counter() - start
+
+        wanted = jaccard.data >= threshold
+        wanted_keys = jaccard.row[wanted].astype(np.int64) * n_users + jaccard.col[wanted]
+        found = np.isin(wanted_keys, i * n_users + j)
+        approx, approx_seconds = timed_similarity(ratings, video_rows, k, 'sparse', 'minhash', threshold)
+        runs.append({
+            'threshold': threshold,
+            'bands': lsh.bands,
+            'rows': lsh.rows,
+            'candidate_pairs': int(len(i)),
+            'overlapping_pairs': int(jaccard.nnz),
+            'pair_recall': float(found.mean()) if found.size else 0.0,
+            'recall': neighbor_overlap(exact, approx),
+            'candidate_seconds': candidate_seconds,
+            'minhash_seconds': approx_seconds,
+            'exact_jaccard_seconds': jaccard_seconds,
+            'sparse_seconds': exact_seconds,
+        })
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='近似最近邻索引召回率基准测试')
+    parser.add_argument('--users', type=int, default=5000, help='用户数')
+    parser.add_argument('--video-ratio', type=float, default=0.5, help='视频数 = 用户数 * video-ratio')
+    parser.add_argument('--vectors', nargs='+', default=list(VECTOR_TYPES),
+                        help=f"测试的向量（{', '.join(VECTOR_TYPES)}）")
+    parser.add_argument('-k', type=int, default=10, help='近邻数K')
+    parser.add_argument('--tables', type=int, nargs='+', default=[4, 8, 16], help='哈希表数')
+    parser.add_argument('--bits', type=int, nargs='+', default=[8, 12], help='每张表的超平面数')
+    parser.add_argument('--probes', type=int, default=2, help='多探查的翻转位数')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.1, 0.2, 0.3],
+                        help='MinHash LSH 的Jaccard阈值')
+    parser.add_argument('--queries', type=int, default=200, help='抽样查询数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--output', default='ann_benchmark_results.json', help='结果JSON文件')
+    args = parser.parse_args()
+    unknown = [name for name in args.vectors if name not in VECTOR_TYPES]
+    if unknown:
+        parser.error(f"未知向量类型: {', '.join(unknown)}")
+
+    print("=" * 60)
+    print("近似最近邻索引召回率基准测试")
+    print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    n_videos = max(1, int(args.users * args.video_ratio))
+    ratings = generate_wishlist(args.users, n_videos, seed=args.seed)
+    video_rows = generate_videos(n_videos, seed=args.seed)
+    print(f"用户 {args.users}, 视频 {n_videos}, 收藏 {len(ratings)}, K={args.k}")
+
+    results = {
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'users': args.users,
+        'videos': n_videos,
+        'interactions': len(ratings),
+        'k': args.k,
+        'runs': [],
+    }
+
+    for name in args.vectors:
+        if name == 'neighbors':
+            print("\n相似用户列表（ann 对比 sparse）...")
+            run = measure_neighbor_recall(ratings, video_rows, args.k)
+            print(f"  召回率 {run['recall']:.3f}, sparse {run['sparse_seconds']:.2f}s, ann {run['ann_seconds']:.2f}s")
+            results['runs'].append(dict(run, vectors=name))
+            continue
+
+        if name == 'minhash':
+            print("\nMinHash+LSH 候选用户对（minhash 对比 sparse）...")
+            print(f"  {'阈值':>4}{'分段':>8}{'候选对':>10}{'对召回率':>8}{'邻居召回率':>8}{'候选(s)':>10}{'相似度(s)':>10}")
+            for run in measure_minhash_recall(ratings, video_rows, args.k, args.thresholds, args.seed):
+                print(f"  {run['threshold']:>6.2f}{run['bands']:>6}x{run['rows']:<3}{run['candidate_pairs']:>11}"
+                      f"{run['pair_recall']:>11.3f}{run['recall']:>13.3f}{run['candidate_seconds']:>12.2f}"
+                      f"{run['minhash_seconds']:>12.2f}")
+                results['runs'].append(dict(run, vectors=name))
+            print(f"  用户对中有共同收藏的 {run['overlapping_pairs']} 个，"
+                  f"精确Jaccard {run['exact_jaccard_seconds']:.2f}s，sparse 相似度 {run['sparse_seconds']:.2f}s")
+            continue
+
+        vectors = profile_vectors(ratings, video_rows) if name == 'profiles' else als_vectors(ratings)
+        print(f"\n{name}: {vectors.shape[0]} 个向量, 维数 {vectors.shape[1]}")
+        print(f"  {'表数':>4}{'位数':>6}{'召回率':>10}{'平均候选':>10}{'构建(s)':>10}{'查询(ms)':>10}{'精确(ms)':>10}")
+        for n_tables in args.tables:
+            for n_bits in args.bits:
+                run = measure_recall(vectors, args.k, n_tables, n_bits, args.probes, args.queries, args.seed)
+                print(f"  {n_tables:>6}{n_bits:>8}{run['recall']:>12.3f}{run['avg_candidates']:>12.1f}"
+                      f"{run['build_seconds']:>12.3f}{run['query_ms']:>12.3f}{run['exact_ms']:>12.3f}")
+                results['runs'].append(dict(run, vectors=name))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {args.output}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
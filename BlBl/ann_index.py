@@ -0,0 +1,208 @@
+"""
+近似最近邻索引（随机投影LSH，余弦相似度）
+用户兴趣画像（用户×标签）、ALS隐向量等向量较多时，逐对计算相似度是 O(n²)，
+先用随机超平面把向量哈希到桶里，只对同桶（以及翻转少数几位后的相邻桶）的候选精确计算余弦相似度:
+    每张哈希表有 n_bits 个随机超平面，向量在每个超平面哪一侧组成一个 n_bits 位的桶编号
+    夹角越小的两个向量落在同一个桶的概率越高；多张表取并集提高召回率
+    查询时额外探查投影绝对值最小的 n_probes 位翻转后的桶（multi-probe）
+索引可以保存为模型目录（rec_models.save_artifact），以内存映射方式加载
+"""
+import numpy as np
+
+from rec_models import IdIndex, load_artifact, save_artifact
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+
+def _is_sparse(vectors):
+    return sparse is not None and sparse.issparse(vectors)
+
+
+def normalize_rows(vectors):
+    """每行除以L2范数（零向量保持为零），支持稠密数组和SciPy稀疏矩阵"""
+    if _is_sparse(vectors):
+        vectors = sparse.csr_matrix(vectors, dtype=np.float32)
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        return sparse.csr_matrix(sparse.diags(scale.astype(np.float32)) @ vectors)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def exact_top_k(vectors, query, k, exclude=None):
+    """精确计算余弦相似度的前k个（vectors 需已归一化），用于评估召回率"""
+    scores = np.asarray(vectors @ query).ravel().astype(np.float64)
+    if exclude is not None:
+        scores[exclude] = -np.inf
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return np.array([], dtype=np.int64), np.array([])
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return top, scores[top]
+
+
+class RandomProjectionIndex():
+    model_type = 'ann_lsh'
+
+    def __init__(self, n_tables=8, n_bits=12, n_probes=2, seed=42):
+        """
+        初始化
+        Args:
+            n_tables: 哈希表数，越多召回率越高、查询越慢
+            n_bits: 每张表的超平面数，越多每个桶越小
+            n_probes: 查询时额外探查的翻转位数
+        """
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.n_probes = n_probes
+        self.seed = seed
+
+        self.vectors = None       # 归一化后的向量（稠密数组或CSR矩阵）
+        self.planes = None        # (n_tables, 维数, n_bits) 随机超平面
+        self.sorted_codes = None  # (n_tables, 向量数) 每张表按桶编号排序后的编号
+        self.orders = None        # (n_tables, 向量数) 排序后对应的行号
+        self.id_index = None      # 行号 <-> ID
+
+    def __len__(self):
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def _project(self, vectors, table):
+        projection = vectors @ self.planes[table]
+        return np.asarray(projection)
+
+    def _codes(self, projection):
+        bits = (projection > 0).astype(np.int64)
+        return bits @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def build(self, vectors, ids=None):
+        """
+        构建索引
+        Args:
+            vectors: (向量数, 维数) 稠密数组或SciPy稀疏矩阵
+            ids: 每行对应的整数ID，默认为行号
+        """
+        self.vectors = normalize_rows(vectors)
+        n_rows, dim = self.vectors.shape
+        rng = np.random.default_rng(self.seed)
+        self.planes = rng.standard_normal((self.n_tables, dim, self.n_bits)).astype(np.float32)
+
+        self.sorted_codes = np.empty((self.n_tables, n_rows), dtype=np.int64)
+        self.orders = np.empty((self.n_tables, n_rows), dtype=np.int32)
+        for table in range(self.n_tables):
+            codes = self._codes(self._project(self.vectors, table))
+            order = np.argsort(codes, kind='stable')
+            self.sorted_codes[table] = codes[order]
+            self.orders[table] = order
+
+        self.id_index = IdIndex(np.arange(n_rows) if ids is None else [int(i) for i in ids])
+        return self
+
+    def _probe_codes(self, projection):
+        """查询向量在一张表中要探查的桶: 本身所在的桶 + 翻转投影最接近0的几位"""
+        code = int(self._codes(projection[None, :])[0])
+        codes = [code]
+        for bit in np.argsort(np.abs(projection))[:self.n_probes].tolist():
+            codes.append(code ^ (1 << bit))
+        return codes
+
+    def candidates(self, query):
+        """返回与查询向量落在同一（或相邻）桶中的行号"""
+        found = []
+        for table in range(self.n_tables):
+            projection = np.asarray(query @ self.planes[table]).ravel()
+            sorted_codes = self.sorted_codes[table]
+            for code in self._probe_codes(projection):
+                lo = np.searchsorted(sorted_codes, code, side='left')
+                hi = np.searchsorted(sorted_codes, code, side='right')
+                if hi > lo:
+                    found.append(self.orders[table, lo:hi])
+        if not found:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate(found)).astype(np.int64)
+
+    def _query_vector(self, vector):
+        if _is_sparse(vector):
+            vector = vector.toarray()
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _row_vector(self, row):
+        if _is_sparse(self.vectors):
+            return self.vectors[row].toarray().ravel()
+        return np.asarray(self.vectors[row], dtype=np.float32)
+
+    def query(self, vector, k=10, exclude=None):
+        """
+        查询前k个近似最近邻
+        Args:
+            exclude: 不返回的行号（如查询向量本身）
+        Returns:
+            (行号数组, 余弦相似度数组)，按相似度降序
+        """
+        vector = self._query_vector(vector)
+        rows = self.candidates(vector)
+        if exclude is not None:
+            rows = rows[~np.isin(rows, exclude)]
+        if rows.size == 0 or k <= 0:
+            return np.array([], dtype=np.int64), np.array([])
+
+        scores = np.asarray(self.vectors[rows] @ vector).ravel().astype(np.float64)
+        keep = scores > 0
+        rows, scores = rows[keep], scores[keep]
+        if rows.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((rows, -scores))
+        return rows[order], scores[order]
+
+    def query_row(self, row, k=10):
+        """查询第row行向量的近似最近邻（不包括自身）"""
+        return self.query(self._row_vector(row), k, exclude=[row])
+
+    def similar(self, id_, k=10):
+        """按ID查询，返回 [(ID, 相似度)]"""
+        row = self.id_index.get(id_)
+        if row is None:
+            return []
+        rows, scores = self.query_row(row, k)
+        return [(int(self.id_index.ids[j]), float(score)) for j, score in zip(rows.tolist(), scores.tolist())]
+
+    def save(self, path):
+        arrays = {
+            'ids': self.id_index.ids, 'id_sorter': self.id_index.sorter,
+            'planes': self.planes, 'sorted_codes': self.sorted_codes, 'orders': self.orders,
+        }
+        if _is_sparse(self.vectors):
+            arrays.update(vector_indptr=self.vectors.indptr, vector_indices=self.vectors.indices,
+                          vector_data=self.vectors.data)
+        else:
+            arrays['vectors'] = self.vectors
+        save_artifact(path, self.model_type, arrays, n_tables=self.n_tables, n_bits=self.n_bits,
+                      n_probes=self.n_probes, seed=self.seed, shape=list(self.vectors.shape))
+        print(f"近似最近邻索引已保存到 {path}（{len(self)} 个向量）")
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        manifest, arrays = load_artifact(path, mmap_mode)
+        if manifest['model_type'] != cls.model_type:
+            raise ValueError(f"不是近似最近邻索引: {manifest['model_type']}")
+        meta = manifest['meta']
+        index = cls(meta['n_tables'], meta['n_bits'], meta['n_probes'], meta['seed'])
+        if 'vectors' in arrays:
+            index.vectors = arrays['vectors']
+        else:
+            if sparse is None:
+                raise ImportError("加载稀疏向量索引需要scipy")
+            index.vectors = sparse.csr_matrix(
+                (arrays['vector_data'], arrays['vector_indices'], arrays['vector_indptr']), shape=tuple(meta['shape']))
+        index.planes = arrays['planes']
+        index.sorted_codes = arrays['sorted_codes']
+        index.orders = arrays['orders']
+        index.id_index = IdIndex(arrays['ids'], arrays['id_sorter'])
+        return index
@@ -0,0 +1,204 @@
+"""
+推荐流程规模基准测试
+用固定随机种子生成幂律分布的收藏数据（少数用户收藏很多、少数视频被大量收藏）
+和 study_clean 的分类/标签信息，不依赖 MySQL，逐阶段统计各算法的耗时和内存峰值，
+结果写入JSON文件，便于对比不同版本的性能变化
+
+用法:
+    python benchmark.py                                   # 默认 1000 / 10000 用户
+    python benchmark.py --users 10000 100000 --algorithms hybrid usercf
+    python benchmark.py --users 1000000 --algorithms hybrid itemcf --no-memory
+
+纯Python实现的算法（usercf / enhanced）在大规模数据上非常慢，请按需选择算法
+"""
+import argparse
+import json
+import platform
+import time
+from datetime import datetime
+
+import numpy as np
+
+from evaluate import ADAPTERS, PhaseProfiler, holdout_split
+
+CATEGORIES = {
+    '知识': ['科学科普', '社科人文', '职业职场', '设计创意'],
+    '科技': ['计算机技术', '数码', '软件应用', '人工智能'],
+    '动画': ['MAD·AMV', '短片·手书', '综合'],
+    '游戏': ['单机游戏', '网络游戏', '手机游戏'],
+    '生活': ['日常', '美食', '运动', '出行'],
+    '音乐': ['原创音乐', '翻唱', '演奏'],
+    '影视': ['影视杂谈', '短片', '预告·资讯'],
+}
+
+TITLE_KEYWORDS = ['python', 'pandas', 'numpy', '二次元', '动漫', '漫展', 'cos', '教程', '入门', '实战']
+
+DEFAULT_ALGORITHMS = ['hybrid', 'usercf', 'enhanced']
+
+
+def generate_wishlist(n_users, n_videos=None, avg_items=20, user_exponent=1.5, item_exponent=1.1, seed=42):
+    """
+    生成幂律分布的收藏记录
+    Args:
+        n_users: 用户数
+        n_videos: 视频数，默认与用户数相同
+        avg_items: 每个用户的平均收藏数
+        user_exponent: 用户活跃度的帕累托指数，越小越集中
+        item_exponent: 视频流行度的Zipf指数，越大越集中
+    Returns:
+        [(user_id, video_id, rating)]，格式与 rating.csv 一致
+    """
+    rng = np.random.default_rng(seed)
+    n_videos = n_videos or n_users
+
+    # 用户活跃度: 帕累托分布，缩放到平均 avg_items 个收藏
+    activity = rng.pareto(user_exponent, n_users) + 1
+    counts = np.maximum(1, np.round(activity / activity.mean() * avg_items)).astype(np.int64)
+    counts = np.minimum(counts, n_videos)
+
+    # 视频流行度: 按排名的Zipf分布，排名随机打乱到视频ID上
+    popularity = 1.0 / np.arange(1, n_videos + 1) ** item_exponent
+    popularity = popularity[rng.permutation(n_videos)]
+    popularity /= popularity.sum()
+
+    users = np.repeat(np.arange(1, n_users + 1), counts)
+    videos = rng.choice(n_videos, size=users.size, p=popularity) + 1
+
+    # 同一用户不会重复收藏同一视频（与 Wishlist 的 unique_together 一致）
+    pairs = np.unique(users * (n_videos + 1) + videos)
+    users, videos = pairs // (n_videos + 1), pairs % (n_videos + 1)
+    return [(str(user), str(video), 5) for user, video in zip(users.tolist(), videos.tolist())]
+
+
+def generate_videos(n_videos, seed=42):
+    """生成 study_clean 的 (id, category, video_type, title) 记录"""
+    rng = np.random.default_rng(seed + 1)
+    categories = list(CATEGORIES)
+    category_idx = rng.integers(0, len(categories), n_videos)
+    type_pick = rng.random(n_videos)
+    keyword_idx = rng.integers(0, len(TITLE_KEYWORDS), n_videos)
+    has_keyword = rng.random(n_videos) < 0.3
+
+    rows = []
+    for i in range(n_videos):
+        category = categories[category_idx[i]]
+        types = CATEGORIES[category]
+        video_type = types[int(type_pick[i] * len(types))]
+        title = f"{video_type}视频{i + 1}"
+        if has_keyword[i]:
+            title = f"{TITLE_KEYWORDS[keyword_idx[i]]} {title}"
+        rows.append((i + 1, category, video_type, title))
+    return rows
+
+
+def run_benchmark(algorithm, ratings, video_rows, n_rec_video=9, sample_users=1000,
+                  seed=42, trace_memory=True):
+    """
+    按阶段运行一个算法
+    推荐阶段只为随机抽样的用户生成推荐，结果中同时给出平均每个用户的耗时
+    """
+    adapter = ADAPTERS[algorithm](n_rec_video)
+    profiler = PhaseProfiler(trace_memory=trace_memory, quiet=True)
+
+    with profiler.phase('import'):
+        adapter.prepare()
+
+    try:
+        with profiler.phase('load'):
+            trainSet, testSet = holdout_split(ratings, pivot=1.0, seed=seed)
+            adapter.load(trainSet, testSet)
+
+        with profiler.phase('metadata'):
+            adapter.load_metadata(video_rows)
+
+        with profiler.phase('similarity'):
+            adapter.fit()
+
+        users = list(trainSet.keys())
+        if sample_users and len(users) > sample_users:
+            rng = np.random.default_rng(seed)
+            users = [users[i] for i in rng.choice(len(users), sample_users, replace=False)]
+
+        with profiler.phase('recommend'):
+            for user in users:
+                adapter.recommend(user)
+    finally:
+        profiler.stop()
+
+    recommend = profiler.phases['recommend']
+    recommend['users'] = len(users)
+    recommend['ms_per_user'] = recommend['seconds'] / len(users) * 1000 if users else 0.0
+
+    return {
+        'algorithm': algorithm,
+        'phases': profiler.phases,
+        'total_seconds': sum(phase['seconds'] for name, phase in profiler.phases.items() if name != 'import'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推荐流程规模基准测试')
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000], help='用户数（可指定多个规模）')
+    parser.add_argument('--video-ratio', type=float, default=0.5, help='视频数 = 用户数 * video-ratio')
+    parser.add_argument('--avg-items', type=int, default=20, help='每个用户的平均收藏数')
+    parser.add_argument('--algorithms', nargs='+', default=DEFAULT_ALGORITHMS,
+                        help=f"要测试的算法（{', '.join(ADAPTERS)}）")
+    parser.add_argument('--sample-users', type=int, default=1000, help='推荐阶段抽样的用户数，0表示全部')
+    parser.add_argument('-n', type=int, default=9, help='推荐视频数N')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--no-memory', action='store_true', help='不统计内存（tracemalloc会拖慢运行）')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果JSON文件')
+    args = parser.parse_args()
+    unknown = [name for name in args.algorithms if name not in ADAPTERS]
+    if unknown:
+        parser.error(f"未知算法: {', '.join(unknown)}")
+
+    print("=" * 60)
+    print("推荐流程规模基准测试")
+    print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    results = {
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'runs': [],
+    }
+
+    for n_users in args.users:
+        n_videos = max(1, int(n_users * args.video_ratio))
+        start = time.perf_counter()
+        ratings = generate_wishlist(n_users, n_videos, args.avg_items, seed=args.seed)
+        video_rows = generate_videos(n_videos, seed=args.seed)
+        print(f"\n规模: 用户 {n_users}, 视频 {n_videos}, 收藏 {len(ratings)} "
+              f"（生成耗时 {time.perf_counter() - start:.2f}s）")
+
+        for algorithm in args.algorithms:
+            print(f"  运行 {algorithm} ...", end='', flush=True)
+            try:
+                run = run_benchmark(algorithm, ratings, video_rows, args.n, args.sample_users,
+                                    args.seed, not args.no_memory)
+            except Exception as e:
+                print(f" 失败: {e}")
+                run = {'algorithm': algorithm, 'error': str(e)}
+            else:
+                phases = ", ".join(f"{name}={phase['seconds']:.3f}s" for name, phase in run['phases'].items())
+                print(f" 完成 {run['total_seconds']:.2f}s ({phases})")
+
+            run.update({'users': n_users, 'videos': n_videos, 'interactions': len(ratings)})
+            results['runs'].append(run)
+
+            # 每完成一项就写一次，长时间运行中断时已完成的结果不会丢失
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(f"\n基准测试结果已保存到 {args.output}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
@@ -0,0 +1,119 @@
+"""
+基于内容推荐的向量化实现
+    视频×标签 权重矩阵 V: 由 video_tags 构建，行顺序与 video_tags 的插入顺序一致
+    用户×标签 兴趣矩阵 P: P = 归一化(R @ V)，R 为 用户×视频 评分矩阵，每行除以该行最大值
+    内容得分: S = P @ Vᵀ，一次稀疏矩阵乘法得到一批用户对全部视频的得分，再逐行部分排序取Top-N
+结果与逐个视频、逐个标签累加的写法一致（得分保留9位小数，同分视频按 video_tags 中的先后排列）
+"""
+import numpy as np
+from scipy import sparse
+
+from rec_models import content_scores
+
+
+class ContentEngine():
+    def __init__(self, video_tags, store):
+        """
+        Args:
+            video_tags: {video_id: {tag: weight}}
+            store: 训练集 InteractionStore
+        """
+        self.store = store
+        self.video_keys = list(video_tags.keys())
+        self.tag_index = {}
+
+        rows, cols, data = [], [], []
+        for i, tags in enumerate(video_tags.values()):
+            for tag, weight in tags.items():
+                rows.append(i)
+                cols.append(self.tag_index.setdefault(tag, len(self.tag_index)))
+                data.append(weight)
+        self.tag_keys = list(self.tag_index.keys())
+        self.video_tag = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), (rows, cols)),
+            shape=(len(self.video_keys), len(self.tag_keys)))
+        self.tag_video = sparse.csr_matrix(self.video_tag.T)
+
+        # 训练集视频列号 -> V 的行号（没有标签的视频为-1）
+        video_row = {video: i for i, video in enumerate(self.video_keys)}
+        self.store_to_video = np.array([video_row.get(video, -1) for video in store.video_keys], dtype=np.int64)
+
+        self.profiles = self._build_profiles()
+        self._cache = {}
+        self._cache_n = 0
+
+    def _build_profiles(self):
+        """P = R @ V，每行除以最大值"""
+        store = self.store
+        mapped = self.store_to_video[store.indices]
+        has_tags = mapped >= 0
+        user_rows = np.repeat(np.arange(len(store)), np.diff(store.indptr))
+        ratings = sparse.csr_matrix(
+            (store.data[has_tags].astype(np.float64), (user_rows[has_tags], mapped[has_tags])),
+            shape=(len(store), len(self.video_keys)))
+        profiles = sparse.csr_matrix(ratings @ self.video_tag)
+        profiles.eliminate_zeros()
+
+        row_max = np.zeros(profiles.shape[0])
+        nonempty = np.diff(profiles.indptr) > 0
+        row_max[nonempty] = np.maximum.reduceat(profiles.data, profiles.indptr[:-1][nonempty])
+        scale = np.divide(1.0, row_max, out=np.zeros_like(row_max), where=row_max != 0)
+        return sparse.csr_matrix(sparse.diags(scale) @ profiles)
+
+    def profile_dict(self, user):
+        """返回用户兴趣画像 {tag: weight}"""
+        i = self.store.user_index.get(user)
+        if i is None:
+            return {}
+        lo, hi = self.profiles.indptr[i], self.profiles.indptr[i + 1]
+        return {self.tag_keys[j]: weight for j, weight in
+                zip(self.profiles.indices[lo:hi].tolist(), self.profiles.data[lo:hi].tolist())}
+
+    def recommend(self, user, N):
+        """为单个用户生成基于内容的推荐 [(video_id, score)]"""
+        if N <= 0:
+            return []
+        if N <= self._cache_n and user in self._cache:
+            return self._cache[user][:N]
+        i = self.store.user_index.get(user)
+        if i is None:
+            return []
+        scores = self.profiles[i] @ self.tag_video
+        return self._top_n(i, scores.indices, scores.data, N)
+
+    def precompute(self, N, users=None, block_size=1024):
+        """
+        分块为一批用户计算内容推荐并缓存，每块只做一次稀疏矩阵乘法
+        Args:
+            users: 用户ID列表，默认训练集中的全部用户
+        """
+        self._cache = {}
+        self._cache_n = N
+        if N <= 0:
+            return
+        rows = np.arange(len(self.store)) if users is None else \
+            np.array([self.store.user_index[user] for user in users if user in self.store.user_index], dtype=np.int64)
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start:start + block_size]
+            scores = sparse.csr_matrix(self.profiles[block_rows] @ self.tag_video)
+            for k, i in enumerate(block_rows.tolist()):
+                lo, hi = scores.indptr[k], scores.indptr[k + 1]
+                self._cache[self.store.user_keys[i]] = self._top_n(i, scores.indices[lo:hi], scores.data[lo:hi], N)
+
+    def _top_n(self, i, videos, scores, N):
+        """过滤已收藏和非正得分的视频，归一化到0-5分后取前N个"""
+        watched = self.store_to_video[self.store.row(i)[0]]
+        keep = (scores > 0) & ~np.isin(videos, watched)
+        videos, scores = videos[keep], scores[keep]
+        if videos.size == 0:
+            return []
+
+        scores = content_scores(scores)
+
+        # 先用 argpartition 找出第N大的得分，再对不低于它的候选排序（同分按视频顺序）
+        if videos.size > N:
+            kth = scores[np.argpartition(-scores, N - 1)[:N]].min()
+            candidates = scores >= kth
+            videos, scores = videos[candidates], scores[candidates]
+        order = np.lexsort((videos, -scores))[:N]
+        return [(self.video_keys[j], score) for j, score in zip(videos[order].tolist(), scores[order].tolist())]
@@ -0,0 +1,464 @@
+"""
+推荐算法离线评估
+用固定随机种子把 rating.csv（或数据库中按时间衰减加权的收藏和评论）划分为训练集和测试集，所有算法使用同一份划分，
+统计 准确率@N、召回率@N、覆盖率、流行度，以及 加载/相似度/推荐/保存 各阶段的耗时和内存峰值
+
+用法:
+    python evaluate.py                       # 评估全部算法
+    python evaluate.py hybrid usercf -n 9    # 只评估指定算法
+    python evaluate.py --db --output eval.json
+    python evaluate.py --source db           # 使用与线上训练相同的加权交互数据
+
+部分算法同分视频的先后顺序依赖集合遍历顺序，需要完全可复现时请固定 PYTHONHASHSEED
+"""
+import argparse
+import contextlib
+import csv
+import importlib
+import io
+import json
+import math
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+
+def load_ratings(filename='rating.csv'):
+    """读取 rating.csv，返回 [(user_id, video_id, rating)]，ID统一为字符串"""
+    rows = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # 跳过标题行
+        for parts in reader:
+            if len(parts) != 3:
+                continue
+            user, video, rating = (part.strip() for part in parts)
+            if not user or not video:
+                continue
+            try:
+                rows.append((user, video, int(rating)))
+            except ValueError:
+                continue
+    return rows
+
+
+def interaction_ratings(data):
+    """
+    把 interaction_loader.InteractionData 转换为 load_ratings 的格式
+    Returns:
+        [(user_id, video_id, weight)]，权重为按时间衰减的收藏+评论权重
+    """
+    users = data.user_ids[data.users].astype(str).tolist()
+    videos = data.video_ids[data.items].astype(str).tolist()
+    return list(zip(users, videos, data.weights.tolist()))
+
+
+def holdout_split(rows, pivot=0.85, seed=42):
+    """
+    固定随机种子划分训练集/测试集，格式与各算法的 get_dataset 一致
+    Returns:
+        (trainSet, testSet): {user_id: {video_id: rating}}
+    """
+    rng = random.Random(seed)
+    trainSet, testSet = {}, {}
+    for user, video, rating in rows:
+        target = trainSet if rng.random() < pivot else testSet
+        target.setdefault(user, {})[video] = rating
+    return trainSet, testSet
+
+
+def compute_metrics(recommendations, trainSet, testSet, N):
+    """
+    计算评估指标
+    Args:
+        recommendations: {user_id: [(video_id, score)]}
+    Returns:
+        {'precision', 'recall', 'coverage', 'popularity', 'users'}
+        popularity 为推荐视频 log(1+训练集收藏数) 的平均值，越大说明越偏向热门视频
+    """
+    item_popularity = {}
+    for videos in trainSet.values():
+        for video in videos:
+            item_popularity[video] = item_popularity.get(video, 0) + 1
+
+    hits = 0
+    rec_count = 0
+    test_count = 0
+    popularity = 0.0
+    recommended_items = set()
+
+    for user, test_videos in testSet.items():
+        if user not in trainSet:
+            continue
+        rec_videos = [str(video) for video, _ in recommendations.get(user, [])[:N]]
+        hits += sum(1 for video in rec_videos if video in test_videos)
+        rec_count += len(rec_videos)
+        test_count += len(test_videos)
+        for video in rec_videos:
+            recommended_items.add(video)
+            popularity += math.log(1 + item_popularity.get(video, 0))
+
+    return {
+        'precision': hits / rec_count if rec_count else 0.0,
+        'recall': hits / test_count if test_count else 0.0,
+        'coverage': len(recommended_items) / len(item_popularity) if item_popularity else 0.0,
+        'popularity': popularity / rec_count if rec_count else 0.0,
+        'users': sum(1 for user in testSet if user in trainSet),
+    }
+
+
+class PhaseProfiler():
+    """记录各阶段的耗时和 tracemalloc 内存峰值"""
+
+    def __init__(self, trace_memory=True, quiet=True):
+        self.trace_memory = trace_memory
+        self.quiet = quiet
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+
+        # 算法内部的逐用户输出会明显拖慢计时，评估时默认不显示
+        output = contextlib.redirect_stdout(io.StringIO()) if self.quiet else contextlib.nullcontext()
+        start = time.perf_counter()
+        try:
+            with output:
+                yield
+        finally:
+            result = {'seconds': time.perf_counter() - start}
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                result['peak_mb'] = max(peak - base, 0) / 1024 / 1024
+            self.phases[name] = result
+
+    def stop(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class RecommenderAdapter():
+    """把各推荐算法统一为 load / fit / recommend / save 四个阶段"""
+    name = ''
+    description = ''
+
+    def __init__(self, n_rec_video=9):
+        self.n_rec_video = n_rec_video
+        self.model = None
+
+    def create_model(self):
+        raise NotImplementedError
+
+    def prepare(self):
+        """创建算法实例（模块导入开销不计入加载阶段）"""
+        self.model = self.create_model()
+
+    def load(self, trainSet, testSet, db_connection=None):
+        self.model.n_rec_video = self.n_rec_video
+        self.model.trainSet = trainSet
+        self.model.testSet = testSet
+
+    def load_metadata(self, video_rows):
+        """使用 study_clean 的 (id, category, video_type, title) 记录代替数据库加载视频信息"""
+
+    def fit(self):
+        raise NotImplementedError
+
+    def recommend(self, user):
+        raise NotImplementedError
+
+    def save(self, db_connection):
+        raise NotImplementedError
+
+
+class HybridAdapter(RecommenderAdapter):
+    name = 'hybrid'
+    description = '混合推荐（run_recommendation.UserBasedCF）'
+    sim_backend = 'sparse'
+    behavior_backend = 'exact'
+
+    def create_model(self):
+        from run_recommendation import UserBasedCF
+        model = UserBasedCF(n_sim_user=0, n_rec_video=self.n_rec_video, sim_backend=self.sim_backend,
+                            behavior_backend=self.behavior_backend)
+        model.verbose = False
+        return model
+
+    def load(self, trainSet, testSet, db_connection=None):
+        from interaction_store import InteractionStore
+        super().load(trainSet, testSet, db_connection)
+        self.model.trainSet = InteractionStore.from_dict(trainSet)
+        if db_connection is not None:
+            self.model.load_video_tags(db_connection)
+
+    def load_metadata(self, video_rows):
+        self.model.set_video_tags(video_rows)
+
+    def fit(self):
+        self.model.build_user_profiles()
+        self.model.calc_user_sim_with_content()
+
+    def recommend(self, user):
+        return self.model.recommend_for_user(user)
+
+    def save(self, db_connection):
+        self.model.save_recommendations(db_connection)
+
+
+class HybridANNAdapter(HybridAdapter):
+    name = 'hybrid-ann'
+    description = '混合推荐，近似最近邻找相似用户（run_recommendation.UserBasedCF, sim_backend=ann）'
+    sim_backend = 'ann'
+
+
+class HybridMinHashAdapter(HybridAdapter):
+    name = 'hybrid-minhash'
+    description = '混合推荐，MinHash+LSH找候选用户对（run_recommendation.UserBasedCF, behavior_backend=minhash）'
+    behavior_backend = 'minhash'
+
+
+class UserCFAdapter(RecommenderAdapter):
+    name = 'usercf'
+    description = '基于用户的协同过滤（UserCF.UserBasedCF）'
+
+    def create_model(self):
+        from UserCF import UserBasedCF
+        return UserBasedCF(n_sim_user=3, n_rec_video=self.n_rec_video)
+
+    def fit(self):
+        self.model.calc_user_sim()
+
+    def recommend(self, user):
+        return self.model.recommend(user)
+
+    def save(self, db_connection):
+        self.model.evaluate_and_save()
+
+
+class EnhancedAdapter(RecommenderAdapter):
+    name = 'enhanced'
+    description = '增强协同过滤（协同过滤修改带相关用户（）.EnhancedUserBasedCF）'
+
+    def create_model(self):
+        # 文件名不是合法的模块名，只能通过 importlib 导入
+        module = importlib.import_module('协同过滤修改带相关用户（）')
+        return module.EnhancedUserBasedCF(n_sim_user=5, n_rec_video=self.n_rec_video)
+
+    def load(self, trainSet, testSet, db_connection=None):
+        super().load(trainSet, testSet, db_connection)
+        model = self.model
+        for videos in trainSet.values():
+            model.all_videos.update(videos)
+        for videos in testSet.values():
+            model.all_videos.update(videos)
+        for user, videos in trainSet.items():
+            if videos:
+                model.user_mean_ratings[user] = sum(videos.values()) / len(videos)
+        if db_connection is not None:
+            model.load_video_categories(db_connection)
+
+    def load_metadata(self, video_rows):
+        self.model.set_video_categories(
+            (video_id, category, video_type) for video_id, category, video_type, _ in video_rows)
+
+    def fit(self):
+        self.model.calc_user_sim_enhanced()
+
+    def recommend(self, user):
+        return self.model.recommend_enhanced(user)
+
+    def save(self, db_connection):
+        self.model.save_recommendations()
+
+
+class ItemCFAdapter(RecommenderAdapter):
+    name = 'itemcf'
+    description = '基于物品的协同过滤（item_cf.ItemBasedCF）'
+
+    def create_model(self):
+        from item_cf import ItemBasedCF
+        return ItemBasedCF(n_sim_video=20, n_rec_video=self.n_rec_video)
+
+    def load(self, trainSet, testSet, db_connection=None):
+        self.model.set_interactions(
+            [(user, video) for user, videos in trainSet.items() for video in videos])
+
+    def fit(self):
+        self.model.calc_item_sim()
+
+    def recommend(self, user):
+        return [(str(video), score) for video, score in self.model.recommend_for_user(user)]
+
+    def save(self, db_connection):
+        self.model.save_index('item_index')
+
+
+class ALSAdapter(RecommenderAdapter):
+    name = 'als'
+    description = '隐式反馈矩阵分解（als_recommender.ImplicitALS）'
+
+    def create_model(self):
+        from als_recommender import ImplicitALS
+        return ImplicitALS(n_factors=32, iterations=15, n_rec_video=self.n_rec_video)
+
+    def fit(self):
+        self.model.fit()
+
+    def recommend(self, user):
+        return self.model.recommend_for_user(user)
+
+    def save(self, db_connection):
+        self.model.save_recommendations(db_connection)
+
+
+ADAPTERS = {adapter.name: adapter for adapter in
+            (HybridAdapter, HybridANNAdapter, HybridMinHashAdapter, UserCFAdapter, EnhancedAdapter,
+             ItemCFAdapter, ALSAdapter)}
+
+
+def evaluate(adapter, ratings, N=9, pivot=0.85, seed=42, db_connection=None,
+             save=False, trace_memory=True, quiet=True):
+    """
+    在固定划分上运行一个算法并返回评估结果
+    Args:
+        adapter: RecommenderAdapter 实例
+        ratings: load_ratings 或 interaction_ratings 的返回值
+        save: 是否执行保存阶段（会写入推荐表或模型文件）
+    """
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        adapter.prepare()
+
+    profiler = PhaseProfiler(trace_memory=trace_memory, quiet=quiet)
+    try:
+        with profiler.phase('load'):
+            trainSet, testSet = holdout_split(ratings, pivot, seed)
+            adapter.load(trainSet, testSet, db_connection)
+
+        with profiler.phase('similarity'):
+            adapter.fit()
+
+        recommendations = {}
+        with profiler.phase('recommend'):
+            for user in testSet:
+                if user in trainSet:
+                    recommendations[user] = adapter.recommend(user)
+
+        if save:
+            with profiler.phase('save'):
+                adapter.save(db_connection)
+    finally:
+        profiler.stop()
+
+    result = {'algorithm': adapter.name, 'N': N, 'pivot': pivot, 'seed': seed}
+    result.update(compute_metrics(recommendations, trainSet, testSet, N))
+    result['phases'] = profiler.phases
+    return result
+
+
+def print_report(results):
+    """输出评估结果对比表"""
+    print("\n" + "=" * 60)
+    print("评估结果")
+    print("=" * 60)
+    print(f"{'算法':<10}{'准确率':>10}{'召回率':>10}{'覆盖率':>10}{'流行度':>10}{'用户数':>8}")
+    for r in results:
+        print(f"{r['algorithm']:<10}{r['precision']:>10.4f}{r['recall']:>10.4f}"
+              f"{r['coverage']:>10.4f}{r['popularity']:>10.4f}{r['users']:>8}")
+
+    print("\n各阶段耗时（秒）/ 内存峰值（MB）:")
+    for r in results:
+        parts = []
+        for name, phase in r['phases'].items():
+            text = f"{name}={phase['seconds']:.3f}s"
+            if 'peak_mb' in phase:
+                text += f"/{phase['peak_mb']:.1f}MB"
+            parts.append(text)
+        print(f"  {r['algorithm']:<10}" + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推荐算法离线评估')
+    parser.add_argument('algorithms', nargs='*', help=f"要评估的算法（{', '.join(ADAPTERS)}），默认全部")
+    parser.add_argument('-n', type=int, default=9, help='推荐视频数N')
+    parser.add_argument('--source', choices=['csv', 'db'], default='csv',
+                        help='评估数据: csv=评分文件, db=数据库中按时间衰减加权的收藏和评论（与线上训练一致）')
+    parser.add_argument('--file', default='rating.csv', help='评分文件')
+    parser.add_argument('--pivot', type=float, default=0.85, help='训练集比例')
+    parser.add_argument('--seed', type=int, default=42, help='划分使用的随机种子')
+    parser.add_argument('--db', action='store_true', help='连接数据库加载视频标签/分类')
+    parser.add_argument('--save', action='store_true', help='同时执行保存阶段（会覆盖线上推荐结果）')
+    parser.add_argument('--no-memory', action='store_true', help='不统计内存（tracemalloc会拖慢运行）')
+    parser.add_argument('--verbose', action='store_true', help='显示算法自身的输出')
+    parser.add_argument('--output', help='把结果保存为JSON文件')
+    args = parser.parse_args()
+    unknown = [name for name in args.algorithms if name not in ADAPTERS]
+    if unknown:
+        parser.error(f"未知算法: {', '.join(unknown)}")
+
+    print("=" * 60)
+    print("推荐算法离线评估")
+    print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    if args.source == 'csv' and not os.path.exists(args.file):
+        from run_recommendation import create_rating_csv_from_db
+        if create_rating_csv_from_db() == 0:
+            print("错误: 没有从数据库读取到数据")
+            return
+
+    db = None
+    if args.db or args.save or args.source == 'db':
+        import pymysql
+        db = pymysql.connect(
+            host="localhost",
+            user='root',
+            password='li974521',
+            database='bill_video',
+            charset='utf8'
+        )
+
+    results = []
+    try:
+        if args.source == 'db':
+            from interaction_loader import load_weighted_interactions
+            ratings = interaction_ratings(load_weighted_interactions(db))
+            print(f"从数据库读取 {len(ratings)} 条加权交互记录，划分比例={args.pivot}, 随机种子={args.seed}")
+        else:
+            ratings = load_ratings(args.file)
+            print(f"读取 {len(ratings)} 条评分记录，划分比例={args.pivot}, 随机种子={args.seed}")
+        if not ratings:
+            print("错误: 没有读取到数据")
+            return
+
+        for name in args.algorithms or list(ADAPTERS):
+            print(f"\n评估 {name}: {ADAPTERS[name].description} ...")
+            try:
+                results.append(evaluate(ADAPTERS[name](args.n), ratings, args.n, args.pivot, args.seed,
+                                        db, args.save, not args.no_memory, not args.verbose))
+            except Exception as e:
+                print(f"评估 {name} 失败: {e}")
+                import traceback
+                traceback.print_exc()
+    finally:
+        if db is not None:
+            db.close()
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n评估结果已保存到 {args.output}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
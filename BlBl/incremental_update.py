@@ -0,0 +1,280 @@
+"""
+推荐结果增量更新
+只读取上次检查点之后新增的收藏记录（按 myapp_wishlist 的自增主键，检查点取自全量计算读取的同一批记录，
+同一秒内写入的收藏不会漏掉，全量计算已经读到的收藏也不会重复累加），
+只为受影响的用户重算相似用户列表（共同收藏数由 用户×视频 稀疏矩阵现算，不保存用户对的共现计数），
+并只重写推荐结果发生变化的用户
+新收藏的权重与全量计算（interaction_loader.load_weighted_interactions）相同: 收藏权重 * 时间衰减，
+衰减基准时间沿用全量计算时的 now，同样的数据增量更新与全量计算得到相同的训练集
+注意: 取消收藏、新评论、新增视频和热门后备的变化不会被增量捕获，需要定期全量重建
+"""
+import os
+import pickle
+import time
+
+import numpy as np
+from scipy import sparse
+
+import sparse_similarity
+from interaction_loader import WISHLIST_WEIGHT, decay_weights
+from interaction_store import InteractionStore
+from rec_publisher import current_version, update_user_recommendations
+
+
+class IncrementalUpdater():
+    def __init__(self, user_cf, checkpoint_file='rec_checkpoint.pkl', w1=0.7, w2=0.3):
+        """
+        初始化
+        Args:
+            user_cf: 已训练（或待从检查点恢复）的 UserBasedCF 实例
+            checkpoint_file: 检查点文件路径
+            w1: 行为相似度权重
+            w2: 内容相似度权重
+        """
+        self.user_cf = user_cf
+        self.checkpoint_file = checkpoint_file
+        self.w1 = w1
+        self.w2 = w2
+
+        self.last_wishlist_id = None  # 已处理的最大收藏记录ID
+        self.published_version = None  # 检查点对应的线上推荐版本（rec_publisher 发布时的 created_at）
+        self.decay_now = None  # 全量计算时的时间衰减基准（Unix时间戳）
+        self.user_tag = None   # 用户×标签 CSR矩阵，行顺序与 user_sim_matrix.user_keys 一致
+        self.tag_index = {}    # {tag: 列号}
+        # 以下由训练集现算，不保存到检查点
+        self.user_video = None  # 用户×视频 二值CSR矩阵，行顺序与 user_sim_matrix.user_keys 一致
+        self._sizes = None      # 每个用户的收藏数
+        self._norms = None      # 每个用户标签向量的范数
+
+    def build_from_model(self, last_wishlist_id, published_version=None, decay_now=None):
+        """
+        全量训练完成后，根据训练结果构建增量更新所需的状态
+        Args:
+            last_wishlist_id: 全量计算读取到的最大收藏记录ID（InteractionData.last_wishlist_id）
+            published_version: 全量计算发布的推荐版本，增量更新只在这个版本上重写
+            decay_now: 全量计算加载交互时的衰减基准时间，新收藏按同一基准计算权重
+        """
+        cf = self.user_cf
+        self.last_wishlist_id = last_wishlist_id
+        self.published_version = published_version
+        self.decay_now = decay_now
+
+        user_tag, tag_keys = sparse_similarity.build_csr_matrix(
+            cf.user_profiles, cf.user_sim_matrix.user_keys)
+        self.user_tag = user_tag
+        self.tag_index = {tag: j for j, tag in enumerate(tag_keys)}
+        self._update_matrices()
+
+    def save_checkpoint(self):
+        """保存检查点"""
+        cf = self.user_cf
+        state = {
+            'last_wishlist_id': self.last_wishlist_id,
+            'published_version': self.published_version,
+            'decay_now': self.decay_now,
+            'trainSet': cf.trainSet,
+            'video_tags': cf.video_tags,
+            'user_profiles': cf.user_profiles,
+            'user_sim_matrix': cf.user_sim_matrix,
+            'last_recommendations': cf.last_recommendations,
+            'user_tag': self.user_tag,
+            'tag_index': self.tag_index,
+        }
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.checkpoint_file)
+        print(f"检查点已保存到 {self.checkpoint_file}（截至收藏记录 {self.last_wishlist_id}）")
+
+    def load_checkpoint(self):
+        """加载检查点，成功返回True"""
+        if not os.path.exists(self.checkpoint_file):
+            print(f"检查点 {self.checkpoint_file} 不存在")
+            return False
+
+        with open(self.checkpoint_file, 'rb') as f:
+            state = pickle.load(f)
+        if 'last_wishlist_id' not in state:
+            # 旧版本检查点按 added_time 记录进度，无法准确衔接
+            print(f"检查点 {self.checkpoint_file} 是旧版本格式")
+            return False
+
+        cf = self.user_cf
+        # 旧版本检查点中的训练集是嵌套字典
+        cf.trainSet = InteractionStore.from_dict(state['trainSet'])
+        cf.video_tags = state['video_tags']
+        cf.user_profiles = state['user_profiles']
+        cf.user_sim_matrix = state['user_sim_matrix']
+        cf.last_recommendations = state['last_recommendations']
+        self.last_wishlist_id = state['last_wishlist_id']
+        self.published_version = state.get('published_version')
+        self.decay_now = state.get('decay_now')
+        self.user_tag = state['user_tag']
+        self.tag_index = state['tag_index']
+        self._update_matrices()
+
+        print(f"已加载检查点: 用户数={len(cf.trainSet)}, 截至收藏记录 {self.last_wishlist_id}")
+        return True
+
+    def fetch_new_interactions(self, db_connection):
+        """读取检查点之后新增的收藏记录 (id, user_id, video_id, Unix时间戳)"""
+        cursor = db_connection.cursor()
+        sql = """
+        SELECT id, user_id, video_id, COALESCE(CAST(UNIX_TIMESTAMP(added_time) AS SIGNED), -1)
+        FROM myapp_wishlist
+        WHERE user_id IS NOT NULL AND video_id IS NOT NULL
+        """
+        params = ()
+        if self.last_wishlist_id is not None:
+            sql += " AND id > %s"
+            params = (self.last_wishlist_id,)
+        sql += " ORDER BY id"
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    def apply(self, db_connection):
+        """
+        执行一次增量更新（检查点由调用方在更新成功后保存）
+        Returns:
+            重写了推荐结果的用户数
+        """
+        # 检查点之后重新发布或回滚过，last_recommendations 与线上推荐表不再对应
+        live_version = current_version(db_connection)
+        if live_version != self.published_version:
+            raise RuntimeError(f"线上推荐版本 {live_version} 与检查点的版本 {self.published_version} 不一致，需要全量计算")
+
+        rows = self.fetch_new_interactions(db_connection)
+        print(f"检查点之后新增 {len(rows)} 条收藏记录")
+        if not rows:
+            return 0
+
+        cf = self.user_cf
+        changed_users = []
+        new_videos = set()
+        new_rows = []
+
+        # 1. 更新训练集: 权重与全量计算一致（收藏权重 * 时间衰减），
+        #    用户已经评论过的视频再收藏时权重累加到已有记录上
+        now = self.decay_now if self.decay_now is not None else time.time()
+        weights = WISHLIST_WEIGHT * decay_weights([row[3] for row in rows], now)
+        for (row_id, user_id, video_id, _), weight in zip(rows, weights.tolist()):
+            if self.last_wishlist_id is None or row_id > self.last_wishlist_id:
+                self.last_wishlist_id = row_id
+
+            user, video = str(user_id), str(video_id)
+            new_rows.append((user, video, weight))
+
+            if user not in changed_users:
+                changed_users.append(user)
+            if video not in cf.video_tags:
+                new_videos.add(video)
+
+        if not changed_users:
+            return 0
+        cf.trainSet = InteractionStore.from_dict(cf.trainSet).with_interactions(new_rows, accumulate=True)
+        print(f"收藏发生变化的用户数: {len(changed_users)}")
+
+        # 2. 补充新视频标签并重建变化用户的兴趣画像
+        if new_videos:
+            cf.load_video_tags(db_connection, video_ids=new_videos)
+        cf.build_user_profiles(changed_users)
+
+        store = cf.user_sim_matrix
+        store.add_users(changed_users)
+        self._update_user_tag_rows(changed_users)
+        self._update_matrices()
+
+        # 3. 重算变化用户的相似用户；相似度是对称的，
+        #    变化用户进入或离开其他用户的Top-K时，这些用户也需要重算
+        changed_idx = np.array([store.user_index[u] for u in changed_users], dtype=np.int64)
+        kth = store.kth_sims()
+        dirty = np.isin(store.neighbors, changed_idx).any(axis=1)
+        for start, block in self._iter_combined_rows(changed_idx):
+            for k in range(block.shape[0]):
+                cols, sims = self._set_row(changed_idx[start + k], block, k)
+                # 相似度与第K个邻居相同时行号小的优先，也可能挤掉原来的邻居；存储的相似度是float32
+                dirty[cols[sims.astype(np.float32) >= kth[cols]]] = True
+        dirty[changed_idx] = False
+
+        dirty_idx = np.flatnonzero(dirty)
+        for start, block in self._iter_combined_rows(dirty_idx):
+            for k in range(block.shape[0]):
+                self._set_row(dirty_idx[start + k], block, k)
+        print(f"重算相似用户: 变化用户 {len(changed_idx)} 个, 受影响用户 {len(dirty_idx)} 个")
+
+        # 4. 找出推荐可能变化的用户: 自身收藏变化、相似用户列表变化、或前K个相似用户的收藏变化
+        affected = set(changed_idx.tolist()) | set(dirty_idx.tolist())
+        used_neighbors = store.neighbors[:, :cf.n_sim_user]
+        affected |= set(np.flatnonzero(np.isin(used_neighbors, changed_idx).any(axis=1)).tolist())
+
+        updated = {}
+        for j in sorted(affected):
+            user = store.user_keys[j]
+            recommendations = cf.recommend_for_user(user)
+            if self._rounded(recommendations) != self._rounded(cf.last_recommendations.get(user, [])):
+                updated[user] = recommendations
+
+        # 5. 只重写推荐结果变化的用户（写入检查点对应的线上版本）
+        update_user_recommendations(db_connection, self.published_version, updated)
+        cf.last_recommendations.update(updated)
+
+        print(f"增量更新完成: 检查 {len(affected)} 个用户, 重写 {len(updated)} 个用户的推荐")
+        return len(updated)
+
+    def _update_user_tag_rows(self, users):
+        """用变化用户的新画像替换 用户×标签 矩阵中对应的行"""
+        cf = self.user_cf
+        store = cf.user_sim_matrix
+
+        for user in users:
+            for tag in cf.user_profiles.get(user, {}):
+                self.tag_index.setdefault(tag, len(self.tag_index))
+
+        shape = (len(store), len(self.tag_index))
+        user_tag = self.user_tag.tocsr().copy()
+        user_tag.resize(shape)
+
+        rows, cols, data = [], [], []
+        keep = np.ones(shape[0])
+        for user in users:
+            i = store.user_index[user]
+            keep[i] = 0
+            for tag, weight in cf.user_profiles.get(user, {}).items():
+                if weight:
+                    rows.append(i)
+                    cols.append(self.tag_index[tag])
+                    data.append(float(weight))
+
+        new_rows = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+        self.user_tag = (sparse.diags(keep) @ user_tag + new_rows).tocsr()
+
+    def _update_matrices(self):
+        """按训练集重建 用户×视频 二值矩阵（行顺序与相似用户存储一致），并计算收藏数和标签向量范数"""
+        cf = self.user_cf
+        store = cf.user_sim_matrix
+        train = InteractionStore.from_dict(cf.trainSet)
+        order = np.array([train.user_index[user] for user in store.user_keys], dtype=np.int64)
+        self.user_video = train.to_csr(binary=True)[order]
+        self._sizes = np.diff(self.user_video.indptr).astype(np.float64)
+        self._norms = np.sqrt(np.asarray(self.user_tag.multiply(self.user_tag).sum(axis=1)).ravel())
+
+    def _iter_combined_rows(self, rows, block_size=1024):
+        """分块计算指定用户与所有用户的合并相似度（与全量计算公式一致），Yields: (块内起始位置, CSR矩阵)"""
+        for start in range(0, len(rows), block_size):
+            yield start, sparse_similarity.combined_similarity_rows(
+                self.user_video, self.user_tag, rows[start:start + block_size],
+                self.w1, self.w2, self._sizes, self._norms)
+
+    def _set_row(self, i, block, k):
+        """用块中第k行的相似度更新第i个用户的Top-K邻居，返回该行的 (列号数组, 相似度数组)"""
+        lo, hi = block.indptr[k], block.indptr[k + 1]
+        cols, sims = block.indices[lo:hi], block.data[lo:hi]
+        self.user_cf.user_sim_matrix.set_row(i, zip(sims.tolist(), cols.tolist()))
+        return cols, sims
+
+    @staticmethod
+    def _rounded(recommendations):
+        # 推荐表 score 字段只保留两位小数
+        return [(str(video), round(float(score), 2)) for video, score in recommendations]
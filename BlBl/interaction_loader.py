@@ -0,0 +1,269 @@
+"""
+收藏数据加载
+用服务端游标分批读取 myapp_wishlist，直接编码为整数数组（用户行号、视频列号、权重），
+同时保存 行号↔用户ID、列号↔视频ID 的映射表，训练前不再经过 rating.csv 中转
+load_weighted_interactions 额外读取评论表，按收藏/评论时间做指数衰减后合并为带权重的交互；
+增量更新（incremental_update）和在线推荐（myapp/rec_service）使用同样的权重和衰减公式
+"""
+import time
+
+import numpy as np
+from pymysql.cursors import SSCursor
+
+SECONDS_PER_DAY = 86400.0
+
+# 交互权重: 收藏 / 每条评论的基础权重，按时间指数衰减
+WISHLIST_WEIGHT = 5.0
+COMMENT_WEIGHT = 2.0
+HALF_LIFE_DAYS = 90.0
+MIN_DECAY = 0.1
+
+
+class InteractionData():
+    """整数编码的用户-视频交互数据"""
+
+    def __init__(self, user_ids, video_ids, users, items, weights):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)    # 行号 -> 用户ID
+        self.video_ids = np.asarray(video_ids, dtype=np.int64)  # 列号 -> 视频ID
+        self.users = np.asarray(users, dtype=np.int32)          # 每条交互的用户行号
+        self.items = np.asarray(items, dtype=np.int32)          # 每条交互的视频列号
+        self.weights = np.asarray(weights, dtype=np.float32)    # 每条交互的权重（评分）
+        self.last_wishlist_id = None  # 读取到的最大收藏记录ID，作为增量更新的检查点
+        self._user_index = None
+        self._video_index = None
+
+    @classmethod
+    def from_ids(cls, user_ids, video_ids, weights):
+        """根据原始ID数组编码（映射表按ID升序）"""
+        user_keys, users = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+        video_keys, items = np.unique(np.asarray(video_ids, dtype=np.int64), return_inverse=True)
+        return cls(user_keys, video_keys, users, items, weights)
+
+    def __len__(self):
+        return len(self.users)
+
+    @property
+    def n_users(self):
+        return len(self.user_ids)
+
+    @property
+    def n_videos(self):
+        return len(self.video_ids)
+
+    @property
+    def user_index(self):
+        """{用户ID: 行号}"""
+        if self._user_index is None:
+            self._user_index = {user_id: i for i, user_id in enumerate(self.user_ids.tolist())}
+        return self._user_index
+
+    @property
+    def video_index(self):
+        """{视频ID: 列号}"""
+        if self._video_index is None:
+            self._video_index = {video_id: j for j, video_id in enumerate(self.video_ids.tolist())}
+        return self._video_index
+
+    def subset(self, mask):
+        """按布尔掩码取部分交互，映射表不变"""
+        return InteractionData(self.user_ids, self.video_ids,
+                               self.users[mask], self.items[mask], self.weights[mask])
+
+    def split(self, pivot=0.85, seed=None):
+        """按比例随机划分训练集和测试集"""
+        mask = np.random.default_rng(seed).random(len(self)) < pivot
+        return self.subset(mask), self.subset(~mask)
+
+    def compact(self):
+        """去掉没有交互的用户和视频，重新编号"""
+        user_keys, users = np.unique(self.users, return_inverse=True)
+        item_keys, items = np.unique(self.items, return_inverse=True)
+        return InteractionData(self.user_ids[user_keys], self.video_ids[item_keys],
+                               users, items, self.weights)
+
+    def to_csr(self):
+        """转换为 用户×视频 的CSR矩阵"""
+        from scipy import sparse
+        return sparse.csr_matrix((self.weights, (self.users, self.items)),
+                                 shape=(self.n_users, self.n_videos))
+
+    def to_store(self):
+        """转换为 InteractionStore（只包含有交互的用户和视频，ID为字符串）"""
+        from interaction_store import InteractionStore
+        data = self.compact()
+        return InteractionStore.from_codes(data.user_ids.astype(str).tolist(), data.video_ids.astype(str).tolist(),
+                                           data.users, data.items, data.weights)
+
+    def to_dict(self):
+        """
+        转换为各推荐算法使用的 {user_id: {video_id: rating}} 格式（ID为字符串）
+        按用户分组后整段转换，不再逐行解析
+        """
+        if len(self) == 0:
+            return {}
+
+        order = np.argsort(self.users, kind='stable')
+        users = self.users[order]
+        weights = self.weights[order]
+        if np.all(weights == np.round(weights)):
+            weights = weights.astype(np.int64)
+        videos = self.video_ids[self.items[order]].astype(str)
+
+        boundaries = np.flatnonzero(np.diff(users)) + 1
+        group_users = self.user_ids[users[np.concatenate(([0], boundaries))]].astype(str)
+
+        result = {}
+        for user, user_videos, user_weights in zip(group_users.tolist(),
+                                                   np.split(videos, boundaries),
+                                                   np.split(weights, boundaries)):
+            result[user] = dict(zip(user_videos.tolist(), user_weights.tolist()))
+        return result
+
+
+def _fetch_columns(db_connection, sql, n_columns, chunk_size):
+    """用服务端游标分批读取整数列，每批直接转换为数组，返回每一列的 int64 数组"""
+    chunks = []
+    cursor = db_connection.cursor(SSCursor)
+    try:
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int64))
+    finally:
+        cursor.close()
+
+    if not chunks:
+        return [np.array([], dtype=np.int64) for _ in range(n_columns)]
+    columns = np.concatenate(chunks)
+    return [columns[:, k] for k in range(n_columns)]
+
+
+def load_wishlist(db_connection, chunk_size=50000, weight=5.0):
+    """
+    流式读取收藏表
+    Args:
+        chunk_size: 每次从服务端游标读取的记录数
+        weight: 收藏的权重（与 rating.csv 中的评分一致）
+    Returns:
+        InteractionData
+    """
+    print("从数据库流式读取收藏数据...")
+    user_ids, video_ids = _fetch_columns(db_connection, """
+        SELECT user_id, video_id
+        FROM myapp_wishlist
+        WHERE user_id IS NOT NULL AND video_id IS NOT NULL
+    """, 2, chunk_size)
+
+    if not len(user_ids):
+        print("收藏表为空")
+        return InteractionData([], [], [], [], [])
+
+    data = InteractionData.from_ids(user_ids, video_ids, np.full(len(user_ids), weight, dtype=np.float32))
+    print(f"获取到 {len(data)} 条收藏数据，用户数: {data.n_users}，视频数: {data.n_videos}")
+    return data
+
+
+def decay_weights(timestamps, now, half_life_days=HALF_LIFE_DAYS, min_decay=MIN_DECAY):
+    """
+    指数时间衰减系数 0.5 ** (距今天数 / 半衰期)，整列一次计算
+    Args:
+        timestamps: Unix时间戳数组，小于0表示时间未知（不衰减）
+        min_decay: 衰减系数下限，很久以前的收藏仍然保留一部分权重
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    age_days = np.maximum(now - timestamps, 0.0) / SECONDS_PER_DAY
+    decay = np.maximum(np.power(0.5, age_days / half_life_days), min_decay)
+    return np.where(timestamps < 0, 1.0, decay)
+
+
+def combine_interactions(sources):
+    """
+    合并多个来源的交互，同一用户-视频的多条记录（收藏 + 多条评论）权重相加
+    Args:
+        sources: [(用户ID数组, 视频ID数组, 权重数组)]
+    Returns:
+        InteractionData（每个用户-视频只有一条记录）
+    """
+    user_ids = np.concatenate([np.asarray(users, dtype=np.int64) for users, _, _ in sources])
+    video_ids = np.concatenate([np.asarray(videos, dtype=np.int64) for _, videos, _ in sources])
+    weights = np.concatenate([np.asarray(w, dtype=np.float64) for _, _, w in sources])
+    if not len(user_ids):
+        return InteractionData([], [], [], [], [])
+
+    user_keys, users = np.unique(user_ids, return_inverse=True)
+    video_keys, items = np.unique(video_ids, return_inverse=True)
+    n_videos = len(video_keys)
+    pairs, inverse = np.unique(users.astype(np.int64) * n_videos + items, return_inverse=True)
+    totals = np.bincount(inverse.ravel(), weights=weights, minlength=len(pairs))
+    return InteractionData(user_keys, video_keys, pairs // n_videos, pairs % n_videos, totals)
+
+
+def load_weighted_interactions(db_connection, chunk_size=50000, wishlist_weight=WISHLIST_WEIGHT,
+                               comment_weight=COMMENT_WEIGHT, half_life_days=HALF_LIFE_DAYS, min_decay=MIN_DECAY,
+                               now=None):
+    """
+    流式读取收藏表和评论表，生成带时间衰减权重的交互
+        收藏: wishlist_weight * 衰减(added_time)
+        评论: 每条评论 comment_weight * 衰减(ctime)，用户评论过（即看过）的视频也作为交互
+    同一用户-视频的收藏和评论权重相加；只保留用户和视频都存在的评论
+    增量更新只处理新增收藏（用同一个 now 计算衰减后加入），新评论在下一次全量计算时计入
+    Args:
+        now: 计算衰减的基准时间（Unix时间戳），默认当前时间
+    Returns:
+        InteractionData，last_wishlist_id 为本次读取到的最大收藏记录ID（与训练数据来自同一次查询）
+    """
+    now = time.time() if now is None else now
+    print("从数据库流式读取收藏和评论数据...")
+    wishlist_users, wishlist_videos, wishlist_times, wishlist_ids = _fetch_columns(db_connection, """
+        SELECT user_id, video_id, COALESCE(CAST(UNIX_TIMESTAMP(added_time) AS SIGNED), -1), id
+        FROM myapp_wishlist
+        WHERE user_id IS NOT NULL AND video_id IS NOT NULL
+    """, 4, chunk_size)
+    comment_users, comment_videos, comment_times = _fetch_columns(db_connection, """
+        SELECT c.uid, c.fid, COALESCE(CAST(UNIX_TIMESTAMP(c.ctime) AS SIGNED), -1)
+        FROM myapp_comment c
+        JOIN users u ON u.id = c.uid
+        JOIN study_clean v ON v.id = c.fid
+    """, 3, chunk_size)
+
+    data = combine_interactions([
+        (wishlist_users, wishlist_videos,
+         wishlist_weight * decay_weights(wishlist_times, now, half_life_days, min_decay)),
+        (comment_users, comment_videos,
+         comment_weight * decay_weights(comment_times, now, half_life_days, min_decay)),
+    ])
+    data.last_wishlist_id = int(wishlist_ids.max()) if len(wishlist_ids) else None
+    if len(data) == 0:
+        print("收藏表和评论表为空")
+        return data
+    print(f"获取到 {len(wishlist_users)} 条收藏、{len(comment_users)} 条评论，"
+          f"合并为 {len(data)} 条交互，用户数: {data.n_users}，视频数: {data.n_videos}")
+    return data
+
+
+def _timestamp(value):
+    return value.timestamp() if value is not None else -1
+
+
+def user_interaction_weights(wishlist, comments, now=None, wishlist_weight=WISHLIST_WEIGHT,
+                             comment_weight=COMMENT_WEIGHT, half_life_days=HALF_LIFE_DAYS, min_decay=MIN_DECAY):
+    """
+    单个用户的交互权重，公式与 load_weighted_interactions 一致（在线推荐时按请求现算）
+    Args:
+        wishlist: [(video_id, added_time)]
+        comments: [(video_id, ctime)]，时间为 datetime，未知时为 None
+    Returns:
+        {video_id: 权重}，按首次出现的先后排列，同一视频的收藏和评论权重相加
+    """
+    now = time.time() if now is None else now
+    rows = [(video, wishlist_weight, _timestamp(added)) for video, added in wishlist] + \
+           [(video, comment_weight, _timestamp(ctime)) for video, ctime in comments]
+    if not rows:
+        return {}
+    decay = decay_weights([ts for _, _, ts in rows], now, half_life_days, min_decay)
+    weights = {}
+    for (video, weight, _), factor in zip(rows, decay.tolist()):
+        weights[video] = weights.get(video, 0.0) + weight * factor
+    return weights
@@ -0,0 +1,242 @@
+"""
+紧凑的训练集存储
+按用户分组的CSR结构: indptr（每个用户的起止位置）+ indices（视频列号，int32）+ data（评分），
+用户ID和视频ID各保存一份词表，每条交互只占几个字节，
+代替 {str(user): {str(video): rating}} 的嵌套字典
+
+InteractionStore 实现了 Mapping 接口，trainSet[user]、user in trainSet、trainSet.items()
+等原有写法不用修改；计算密集的地方直接使用 indptr/indices/data 数组
+每个用户的视频按加入的先后顺序保存（与原来字典的插入顺序一致），同分时的排序结果不变
+"""
+from array import array
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class UserVideos(Mapping):
+    """单个用户的收藏（只读视图）: {video_id: rating}"""
+    __slots__ = ('_store', '_lo', '_hi')
+
+    def __init__(self, store, lo, hi):
+        self._store = store
+        self._lo = lo
+        self._hi = hi
+
+    @property
+    def indices(self):
+        return self._store.indices[self._lo:self._hi]
+
+    @property
+    def data(self):
+        return self._store.data[self._lo:self._hi]
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def __iter__(self):
+        video_keys = self._store.video_keys
+        return iter([video_keys[j] for j in self.indices.tolist()])
+
+    def _position(self, video):
+        j = self._store.video_index.get(video)
+        if j is None:
+            return None
+        hits = np.flatnonzero(self.indices == j)
+        return self._lo + int(hits[0]) if hits.size else None
+
+    def __getitem__(self, video):
+        pos = self._position(video)
+        if pos is None:
+            raise KeyError(video)
+        return self._store.data[pos].item()
+
+    def __contains__(self, video):
+        return self._position(video) is not None
+
+    def items(self):
+        video_keys = self._store.video_keys
+        return [(video_keys[j], rating) for j, rating in zip(self.indices.tolist(), self.data.tolist())]
+
+    def values(self):
+        return self.data.tolist()
+
+
+class InteractionStore(Mapping):
+    """训练集: {user_id: UserVideos}"""
+
+    def __init__(self, user_keys, video_keys, indptr, indices, data, user_index=None, video_index=None):
+        self.user_keys = list(user_keys)    # 行号 -> 用户ID（字符串）
+        self.video_keys = list(video_keys)  # 列号 -> 视频ID（字符串）
+        self.user_index = user_index if user_index is not None else \
+            {user: i for i, user in enumerate(self.user_keys)}
+        self.video_index = video_index if video_index is not None else \
+            {video: j for j, video in enumerate(self.video_keys)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data)
+
+    @staticmethod
+    def _rating_array(ratings):
+        ratings = np.asarray(ratings)
+        if ratings.size and np.all(ratings == np.round(ratings)) and np.abs(ratings).max() < 2 ** 15:
+            return ratings.astype(np.int16)
+        return ratings.astype(np.float32)
+
+    @classmethod
+    def from_codes(cls, user_keys, video_keys, users, items, ratings, user_index=None, video_index=None):
+        """
+        根据编码后的交互构建
+        Args:
+            users / items: 每条交互的用户行号、视频列号
+            ratings: 每条交互的评分
+            user_index / video_index: 已有的 {ID: 编号} 字典，可直接复用
+        """
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        ratings = np.asarray(ratings)
+
+        # 重复的 (用户, 视频) 只保留一条: 位置取第一次出现，评分取最后一次（与字典赋值一致）
+        keys = users * (len(video_keys) + 1) + items
+        unique_keys, first = np.unique(keys, return_index=True)
+        if len(unique_keys) < len(keys):
+            last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+            by_position = np.argsort(first)
+            users, items = users[first[by_position]], items[first[by_position]]
+            ratings = ratings[last[by_position]]
+
+        order = np.argsort(users, kind='stable')
+        counts = np.bincount(users, minlength=len(user_keys))
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return cls(user_keys, video_keys, indptr,
+                   items.astype(np.int32)[order], cls._rating_array(ratings)[order], user_index, video_index)
+
+    @classmethod
+    def from_dict(cls, rows):
+        """根据 {user_id: {video_id: rating}} 构建"""
+        if isinstance(rows, InteractionStore):
+            return rows
+        video_index = {}
+        indptr = [0]
+        indices = []
+        ratings = []
+        for videos in rows.values():
+            for video, rating in videos.items():
+                indices.append(video_index.setdefault(video, len(video_index)))
+                ratings.append(rating)
+            indptr.append(len(indices))
+        return cls(rows.keys(), video_index.keys(), indptr, indices, cls._rating_array(ratings))
+
+    def __len__(self):
+        return len(self.user_keys)
+
+    def __iter__(self):
+        return iter(self.user_keys)
+
+    def __contains__(self, user):
+        return user in self.user_index
+
+    def __getitem__(self, user):
+        i = self.user_index[user]
+        return UserVideos(self, int(self.indptr[i]), int(self.indptr[i + 1]))
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    @property
+    def n_videos(self):
+        return len(self.video_keys)
+
+    def row(self, i):
+        """第i个用户的 (视频列号数组, 评分数组)"""
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return self.indices[lo:hi], self.data[lo:hi]
+
+    def video_counts(self):
+        """每个视频被收藏的次数"""
+        return np.bincount(self.indices, minlength=self.n_videos)
+
+    def to_csr(self, binary=False):
+        """转换为 用户×视频 的CSR矩阵"""
+        from scipy import sparse
+        data = np.ones(self.nnz, dtype=np.float64) if binary else self.data.astype(np.float64)
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape=(len(self), self.n_videos))
+
+    def with_interactions(self, rows, accumulate=False):
+        """
+        追加交互后返回新的存储
+        新视频追加在用户已有视频之后，新用户追加在最后，与字典的插入顺序一致
+        Args:
+            rows: [(user_id, video_id, rating)]
+            accumulate: 为False时已存在的 (用户, 视频) 跳过；为True时评分累加到已有记录上
+                        （与 interaction_loader.combine_interactions 合并同一用户-视频的多条记录一致）
+        """
+        user_keys = list(self.user_keys)
+        user_index = dict(self.user_index)
+        video_keys = list(self.video_keys)
+        video_index = dict(self.video_index)
+        added = {}
+        increments = {}  # 已有记录在 data 中的位置 -> 累加的评分
+        for user, video, rating in rows:
+            if video in self.get(user, ()):
+                if accumulate:
+                    pos = self[user]._position(video)
+                    increments[pos] = increments.get(pos, 0) + rating
+                continue
+            if (user, video) in added:
+                if accumulate:
+                    i, j, total = added[(user, video)]
+                    added[(user, video)] = (i, j, total + rating)
+                continue
+            i = user_index.setdefault(user, len(user_keys))
+            if i == len(user_keys):
+                user_keys.append(user)
+            j = video_index.setdefault(video, len(video_keys))
+            if j == len(video_keys):
+                video_keys.append(video)
+            added[(user, video)] = (i, j, rating)
+
+        if not added and not increments:
+            return self
+
+        old_ratings = self.data
+        if increments:
+            old_ratings = self.data.astype(np.float64)
+            np.add.at(old_ratings, list(increments.keys()), list(increments.values()))
+
+        old_users = np.repeat(np.arange(len(self.user_keys)), np.diff(self.indptr))
+        new = np.array([(i, j) for i, j, _ in added.values()], dtype=np.int64).reshape(-1, 2)
+        users = np.concatenate((old_users, new[:, 0]))
+        items = np.concatenate((self.indices, new[:, 1]))
+        ratings = np.concatenate((old_ratings, [rating for _, _, rating in added.values()]))
+        return InteractionStore.from_codes(user_keys, video_keys, users, items, ratings, user_index, video_index)
+
+    def nbytes(self):
+        """数组部分占用的字节数"""
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+
+class InteractionStoreBuilder():
+    """逐条添加交互，最后一次性生成 InteractionStore（用户、视频按首次出现的顺序编号）"""
+
+    def __init__(self):
+        self.user_index = {}
+        self.video_index = {}
+        self.users = array('i')
+        self.items = array('i')
+        self.ratings = array('f')
+
+    def __len__(self):
+        return len(self.users)
+
+    def add(self, user, video, rating):
+        self.users.append(self.user_index.setdefault(user, len(self.user_index)))
+        self.items.append(self.video_index.setdefault(video, len(self.video_index)))
+        self.ratings.append(rating)
+
+    def build(self):
+        return InteractionStore.from_codes(
+            self.user_index.keys(), self.video_index.keys(),
+            np.frombuffer(self.users, dtype=np.int32), np.frombuffer(self.items, dtype=np.int32),
+            np.frombuffer(self.ratings, dtype=np.float32), self.user_index, self.video_index)
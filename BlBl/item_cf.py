@@ -0,0 +1,138 @@
+"""
+基于物品的协同过滤推荐算法
+离线计算视频-视频相似度并保存Top-K邻居索引，
+在线推荐时只需查找用户已收藏视频的邻居并累加相似度
+"""
+from datetime import datetime
+
+import pymysql
+from scipy import sparse
+
+import sparse_similarity
+from rec_models import ItemNeighborIndex
+from topk_neighbors import TopKNeighbors
+
+
+class ItemBasedCF():
+    def __init__(self, n_sim_video=20, n_rec_video=9):
+        """
+        初始化
+        Args:
+            n_sim_video: 每个视频保留的相似视频数
+            n_rec_video: 推荐视频数量
+        """
+        self.n_sim_video = n_sim_video
+        self.n_rec_video = n_rec_video
+
+        self.user_items = {}  # {user_id: set(video_id)}
+        self.video_ids = []   # 矩阵列号 -> 视频ID
+        self.user_video = None  # 用户×视频 二值CSR矩阵
+        self.index = None     # ItemNeighborIndex
+
+        print(f'相似视频数 = {self.n_sim_video}')
+        print(f'推荐视频数 = {self.n_rec_video}')
+
+    def load_interactions(self, db_connection):
+        """从收藏表加载用户-视频交互（只保留study_clean中存在的视频）"""
+        print("加载收藏数据...")
+        cursor = db_connection.cursor()
+        cursor.execute("""
+            SELECT w.user_id, w.video_id
+            FROM myapp_wishlist w
+            JOIN study_clean v ON v.id = w.video_id
+            WHERE w.user_id IS NOT NULL
+        """)
+        rows = cursor.fetchall()
+        cursor.close()
+        self.set_interactions(rows)
+
+    def set_interactions(self, rows):
+        """根据 (user_id, video_id) 列表构建用户×视频矩阵"""
+        self.user_items = {}
+        for user_id, video_id in rows:
+            self.user_items.setdefault(int(user_id), set()).add(int(video_id))
+
+        users = list(self.user_items.keys())
+        user_video, video_ids = sparse_similarity.build_csr_matrix(
+            {user: dict.fromkeys(videos, 1) for user, videos in self.user_items.items()},
+            users, binary=True)
+        self.user_video = user_video
+        self.video_ids = video_ids
+        print(f"用户数: {len(users)}, 视频数: {len(video_ids)}, 收藏数: {user_video.nnz}")
+
+    def calc_item_sim(self, block_size=1024):
+        """计算视频-视频余弦相似度（共同收藏数 / sqrt(收藏数i * 收藏数j)），每个视频保留Top-K"""
+        if self.user_video is None or self.user_video.nnz == 0:
+            print("没有收藏数据，无法计算视频相似度")
+            return
+
+        print("计算视频相似度...")
+        video_user = sparse.csr_matrix(self.user_video.T)
+        store = TopKNeighbors(self.video_ids, self.n_sim_video)
+        for start, block in sparse_similarity.iter_cosine_similarity(video_user, block_size):
+            store.add_sparse_block(start, block)
+
+        self.index = ItemNeighborIndex.from_store(store)
+        print(f"视频邻居索引占用 {store.nbytes() / 1024:.1f} KB")
+
+    def save_index(self, path='item_index'):
+        if self.index is None:
+            print("视频邻居索引为空，未保存")
+            return
+        self.index.save(path)
+
+    def recommend_for_user(self, user_id):
+        """为训练数据中的用户生成推荐"""
+        watched_videos = self.user_items.get(int(user_id), set())
+        if self.index is None or not watched_videos:
+            return []
+        return self.index.recommend(watched_videos, self.n_rec_video)
+
+
+def main():
+    """构建并保存视频邻居索引"""
+    print("=" * 60)
+    print("基于物品的协同过滤 - 构建视频邻居索引")
+    print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    item_cf = ItemBasedCF(n_sim_video=20, n_rec_video=9)
+
+    try:
+        db = pymysql.connect(
+            host="localhost",
+            user='root',
+            password='li974521',
+            database='bill_video',
+            charset='utf8'
+        )
+        item_cf.load_interactions(db)
+        db.close()
+    except Exception as e:
+        print(f"数据库连接失败: {e}")
+        return
+
+    item_cf.calc_item_sim()
+    item_cf.save_index('item_index')
+
+    for user_id in [25, 27]:
+        recommendations = item_cf.recommend_for_user(user_id)
+        print(f"\n用户{user_id}的推荐:")
+        for video_id, score in recommendations:
+            print(f"  视频{video_id}: 得分={score:.3f}")
+
+    print("\n" + "=" * 60)
+    print("索引构建完成!")
+    print(f"结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
+    except Exception as e:
+        print(f"程序运行出错: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,129 @@
+"""
+MinHash + LSH 分段（banding）生成候选用户对
+逐对计算行为相似度（Jaccard）时，绝大多数用户对没有任何共同收藏，
+先为每个用户的收藏集合计算 MinHash 签名，再把签名切成 bands 段、每段 rows 个值:
+    两个用户某一段的签名完全相同时成为候选对，Jaccard 为 s 的用户对成为候选的概率是 1 - (1 - s^rows)^bands
+    阈值约为 (1/bands)^(1/rows)，Jaccard 高于阈值的用户对大概率被找到，低于阈值的大多被过滤
+只对候选对精确计算 Jaccard，计算量随用户数近似线性增长
+"""
+import numpy as np
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def choose_bands(n_perm, threshold):
+    """选择 bands*rows <= n_perm 且阈值 (1/bands)^(1/rows) 最接近 threshold 的分段方式"""
+    best = None
+    for rows in range(1, n_perm + 1):
+        bands = n_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHashLSH():
+    def __init__(self, n_perm=128, threshold=0.1, seed=42, max_bucket_size=1000):
+        """
+        初始化
+        Args:
+            n_perm: 签名长度（哈希函数个数）
+            threshold: 希望找出的用户对的Jaccard下限，决定分段方式
+            max_bucket_size: 一个桶内只和排序后相邻的这么多个用户配对，避免只收藏了同一个热门视频的大量用户两两配对
+        """
+        self.n_perm = n_perm
+        self.threshold = threshold
+        self.max_bucket_size = max_bucket_size
+        self.bands, self.rows = choose_bands(n_perm, threshold)
+
+        # 哈希函数 h(x) = (a*x + b) mod p，列号 < 2^31，a*x 不会超出int64
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, n_perm, dtype=np.int64)
+        self.b = rng.integers(0, MERSENNE_PRIME, n_perm, dtype=np.int64)
+
+    def signatures(self, binary_matrix, chunk_size=16):
+        """
+        计算每行（用户收藏集合）的MinHash签名
+        Returns:
+            (行数, n_perm) 数组，空行的签名全部为 p，不参与配对
+        """
+        binary_matrix = binary_matrix.tocsr()
+        indptr = binary_matrix.indptr
+        indices = binary_matrix.indices.astype(np.int64)
+        n_rows = binary_matrix.shape[0]
+        nonempty = np.flatnonzero(np.diff(indptr) > 0)
+
+        signatures = np.full((n_rows, self.n_perm), MERSENNE_PRIME, dtype=np.int64)
+        if not nonempty.size:
+            return signatures
+        # 按哈希函数分批计算，避免一次生成 n_perm × 非零元个数 的数组
+        for lo in range(0, self.n_perm, chunk_size):
+            hi = min(lo + chunk_size, self.n_perm)
+            hashed = (self.a[lo:hi, None] * indices[None, :] + self.b[lo:hi, None]) % MERSENNE_PRIME
+            signatures[nonempty, lo:hi] = np.minimum.reduceat(hashed, indptr[nonempty], axis=1).T
+        return signatures
+
+    @staticmethod
+    def _band_keys(segment):
+        """把一段签名（每个值 < 2^31）合成一个int64桶编号，多项式哈希溢出时按2^64取模，冲突概率可以忽略"""
+        keys = segment[:, 0].copy()
+        with np.errstate(over='ignore'):
+            for k in range(1, segment.shape[1]):
+                keys = keys * np.int64(MERSENNE_PRIME) + segment[:, k]
+        return keys
+
+    def _bucket_pairs(self, members, buckets):
+        """
+        members 已按桶编号排序，生成同桶用户对: 每个用户与桶内排在它后面的用户配对，
+        最多配对 max_bucket_size-1 个，避免大量只收藏了同一个热门视频的用户两两配对
+        """
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        sizes = np.diff(np.r_[starts, len(buckets)])
+        positions = np.arange(len(buckets))
+        group_end = np.repeat(starts + sizes, sizes)
+        counts = np.minimum(group_end - positions - 1, self.max_bucket_size - 1)
+        total = int(counts.sum())
+        if not total:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty
+        # 第k个用户的配对对象是它后面的 1..counts[k] 个用户
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        first = np.repeat(positions, counts)
+        return members[first], members[first + offsets]
+
+    def candidate_pairs(self, signatures):
+        """
+        LSH分段: 任一段签名相同的用户成为候选对
+        Returns:
+            (i数组, j数组)，i < j，已去重
+        """
+        valid = np.flatnonzero(signatures[:, 0] < MERSENNE_PRIME)
+        n_rows = signatures.shape[0]
+        keys = []
+        for band in range(self.bands):
+            buckets = self._band_keys(signatures[valid, band * self.rows:(band + 1) * self.rows])
+            order = np.argsort(buckets, kind='stable')
+            members, buckets = valid[order], buckets[order]
+            i, j = self._bucket_pairs(members, buckets)
+            if i.size:
+                keys.append(np.minimum(i, j) * n_rows + np.maximum(i, j))
+
+        if not keys:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty
+        # 排序后去重（比 np.unique 的哈希去重快）
+        keys = np.sort(np.concatenate(keys))
+        keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+        return keys // n_rows, keys % n_rows
+
+    def similar_pairs(self, binary_matrix, min_similarity=0.0):
+        """
+        候选对的精确Jaccard相似度
+        Returns:
+            (i数组, j数组, 相似度数组)，只保留相似度大于 min_similarity 的用户对
+        """
+        from sparse_similarity import pair_jaccard
+        i, j = self.candidate_pairs(self.signatures(binary_matrix))
+        sim = pair_jaccard(binary_matrix, i, j)
+        keep = sim > min_similarity
+        return i[keep], j[keep], sim[keep]
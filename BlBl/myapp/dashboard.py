@@ -0,0 +1,237 @@
+"""
+统计页面数据缓存
+首页的用户数、视频数、点赞/评论/收藏总数、分类统计、收藏排行和每日注册统计都需要扫描整张表，
+统一在这里计算一次后放入缓存，首页只读取缓存中的结果:
+    StudyClean、User、Wishlist 有增删改时（myapp/signals.py）清除缓存，下一次访问首页时重新计算
+    爬虫/脚本直接写数据库不会触发信号，缓存最多保留 DASHBOARD_STATS_TTL 秒后过期
+可视化页面（keshihua）的统计全部在数据库中分组/排序/LIMIT 完成，结果缓存 KESHIHUA_CACHE_TTL 秒
+数据分析页面（keshihua1）的按月统计用一次条件聚合查询完成，结果按筛选条件分别缓存
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DateField, F, Min, Q, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from myapp.models import StudyClean, User, Wishlist
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_KEY = 'dashboard_stats'
+KESHIHUA_CACHE_KEY = 'keshihua_stats'
+FILTER_OPTIONS_CACHE_KEY = 'video_filter_options'
+
+# keshihua1 的数据类型 -> 字段，未知类型按弹幕数统计
+DATA_TYPE_FIELDS = {
+    'comments': 'comments_count',
+    'likes': 'likes_count',
+    'favorites': 'favorites_count',
+    'damaku': 'damaku_count',
+}
+# keshihua1 的时间范围 -> 天数，未知范围按一年统计
+TIME_RANGE_DAYS = {'month': 30, 'halfyear': 180, 'year': 365}
+# 视频时长分布的区间（分钟，左闭右开），与 data_analyzer.BiliVideoAnalyzer 一致
+DURATION_BINS = [
+    ('0-5分钟', 0, 5), ('5-10分钟', 5, 10), ('10-20分钟', 10, 20),
+    ('20-30分钟', 20, 30), ('30-60分钟', 30, 60), ('60分钟以上', 60, None),
+]
+
+
+def compute_dashboard_stats():
+    """从数据库计算首页统计数据（结果只包含基本类型，可以直接放入缓存）"""
+    # 视频数和三个总数在一次聚合查询中完成
+    video_totals = StudyClean.objects.aggregate(
+        total_video=Count('id'),
+        total_likes=Sum('likes_count'),
+        total_comments=Sum('comments_count'),
+        total_favorites=Sum('favorites_count'),
+    )
+
+    video_type_stats = list(StudyClean.objects.values('category').annotate(count=Count('id')).order_by('-count'))
+
+    wishlist_stats = list(Wishlist.objects.values(
+        'video__id',
+        'video__image_url',
+        'video__title',
+        'video__category',
+        'video__video_type',
+        'video__likes_count'
+    ).annotate(
+        collect_count=Count('id'),
+        favorites_count=F('video__favorites_count')
+    ).order_by('-collect_count')[:10])
+
+    user_creation_stats = User.objects.annotate(
+        day=Cast('addtime', DateField())
+    ).values('day').annotate(
+        count=Count('id')
+    ).order_by('day')
+
+    return {
+        'user_data': {
+            'total_user': User.objects.count(),
+            'total_video': video_totals['total_video'],
+            'total_likes': video_totals['total_likes'] or 0,
+            'total_comments': video_totals['total_comments'] or 0,
+            'total_favorites': video_totals['total_favorites'] or 0,
+            'video_type_stats': video_type_stats,
+            'user_creation_stats': [
+                {'day': stat['day'].strftime('%Y-%m-%d') if stat['day'] else '', 'count': stat['count']}
+                for stat in user_creation_stats
+            ],
+        },
+        'wishlist_stats': wishlist_stats,
+    }
+
+
+def _count_by(field):
+    """
+    按字段分组计数，返回 [(值, 数量)]，数量降序
+    数量相同的按该值第一次出现的先后排列（与原来用 Counter 逐行统计后稳定排序的结果一致）
+    """
+    rows = (StudyClean.objects.values(field)
+            .annotate(count=Count('id'), first=Min('id'))
+            .order_by('-count', 'first'))
+    return [(row[field], row['count']) for row in rows]
+
+
+def _top_videos(field, limit=10):
+    """按字段降序取前 limit 个视频的 (标题, 值)，只查询这两列"""
+    return list(StudyClean.objects.order_by(f'-{field}', 'id').values_list('title', field)[:limit])
+
+
+def compute_keshihua_stats():
+    """可视化页面的统计数据（分组计数、排行榜、热门视频数、活跃作者数）"""
+    video_types = _count_by('video_type')
+    authors = _count_by('author')
+    top_likes = _top_videos('likes_count')
+    top_favorites = _top_videos('favorites_count')
+
+    # 热门视频: 点赞≥30000 且 收藏≥10000
+    hot_video_count = StudyClean.objects.filter(likes_count__gte=30000, favorites_count__gte=10000).count()
+
+    # 活跃作者: 最近30天发过作品的作者
+    active_author_count = StudyClean.objects.filter(
+        publish_timestamp__gte=timezone.now() - timedelta(days=30)
+    ).values('author').distinct().count()
+
+    return {
+        'video_types': video_types,
+        'authors': authors,
+        'likes': [likes for _, likes in top_likes],
+        'likes_titles': [title for title, _ in top_likes],
+        'favorites': [favorites for _, favorites in top_favorites],
+        'favorites_titles': [title for title, _ in top_favorites],
+        'active_author_count': active_author_count,
+        'total_authors_count': len(authors),
+        'hot_video_count': hot_video_count,
+    }
+
+
+def filter_videos(time_range='all', video_type='all', category='all'):
+    """按 keshihua1 的筛选条件过滤视频"""
+    videos = StudyClean.objects.all()
+    if time_range != 'all':
+        days = TIME_RANGE_DAYS.get(time_range, 365)
+        videos = videos.filter(publish_timestamp__gte=timezone.now() - timedelta(days=days))
+    if video_type != 'all':
+        videos = videos.filter(video_type=video_type)
+    if category != 'all':
+        videos = videos.filter(category=category)
+    return videos
+
+
+def compute_keshihua1_stats(time_range='all', data_type='comments', video_type='all', category='all'):
+    """
+    数据分析页面的统计数据
+        publish_month_data / video_count_data: 每月（不算年份）的目标数据之和 / 视频数，
+        duration_distribution: 各时长区间的视频数（按 duration_seconds 分箱），
+        与总数一起在一条 SUM/COUNT(... FILTER/CASE WHEN ...) 查询中得到
+        video_duration_data: 每个视频的 [时长(分钟), 目标数据]（散点图），只读取 duration_seconds 和目标数据两列，
+        时长未知的视频记为0分钟
+    """
+    field = DATA_TYPE_FIELDS.get(data_type, 'damaku_count')
+    videos = filter_videos(time_range, video_type, category)
+
+    aggregates = {'data_count': Count('id')}
+    for month in range(1, 13):
+        in_month = Q(publish_timestamp__month=month)
+        aggregates[f'sum_{month}'] = Sum(field, filter=in_month)
+        aggregates[f'count_{month}'] = Count('id', filter=in_month)
+    for k, (_, low, high) in enumerate(DURATION_BINS):
+        in_bin = Q(duration_seconds__gte=low * 60)
+        if high is not None:
+            in_bin &= Q(duration_seconds__lt=high * 60)
+        aggregates[f'duration_{k}'] = Count('id', filter=in_bin)
+    totals = videos.aggregate(**aggregates)
+
+    video_duration_data = [
+        [seconds / 60 if seconds else 0, value]
+        for seconds, value in videos.order_by('id').values_list('duration_seconds', field).iterator()
+    ]
+
+    return {
+        'video_duration_data': video_duration_data,
+        'publish_month_data': [totals[f'sum_{month}'] or 0 for month in range(1, 13)],
+        'video_count_data': [totals[f'count_{month}'] for month in range(1, 13)],
+        'duration_distribution': [{'name': name, 'value': totals[f'duration_{k}']}
+                                  for k, (name, _, _) in enumerate(DURATION_BINS)],
+        'data_count': totals['data_count'],
+    }
+
+
+def compute_filter_options():
+    """keshihua1 页面可选的视频类型和类别"""
+    return {
+        'video_types': list(StudyClean.objects.values_list('video_type', flat=True).distinct()),
+        'categories': list(StudyClean.objects.values_list('category', flat=True).distinct()),
+    }
+
+
+def _cached(key, compute, timeout):
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        cache.set(key, stats, timeout)
+    return stats
+
+
+def get_dashboard_stats():
+    """读取首页统计数据，缓存中没有时重新计算"""
+    return _cached(DASHBOARD_CACHE_KEY, compute_dashboard_stats, getattr(settings, 'DASHBOARD_STATS_TTL', 300))
+
+
+def get_keshihua_stats():
+    """读取可视化页面统计数据，缓存中没有时重新计算"""
+    return _cached(KESHIHUA_CACHE_KEY, compute_keshihua_stats, getattr(settings, 'KESHIHUA_CACHE_TTL', 60))
+
+
+def get_keshihua1_stats(time_range='all', data_type='comments', video_type='all', category='all'):
+    """
+    按 (timeRange, dataType, videoType, category) 分别缓存 keshihua1 的统计数据
+    筛选值来自请求参数，缓存键使用它们的哈希值（避免特殊字符和过长的键）；
+    可选值很多，视频变化时不逐个清除，只靠 KESHIHUA_CACHE_TTL 过期
+    """
+    params = json.dumps([time_range, data_type, video_type, category], ensure_ascii=False)
+    key = 'keshihua1_stats:' + hashlib.md5(params.encode('utf-8')).hexdigest()
+    return _cached(key, lambda: compute_keshihua1_stats(time_range, data_type, video_type, category),
+                   getattr(settings, 'KESHIHUA_CACHE_TTL', 60))
+
+
+def get_filter_options():
+    """读取 keshihua1 页面的筛选选项"""
+    return _cached(FILTER_OPTIONS_CACHE_KEY, compute_filter_options, getattr(settings, 'KESHIHUA_CACHE_TTL', 60))
+
+
+def invalidate_dashboard_stats(keys=(DASHBOARD_CACHE_KEY,)):
+    """数据有变化时清除缓存"""
+    try:
+        cache.delete_many(list(keys))
+    except Exception as e:
+        # 缓存服务不可用时不影响数据写入，等待缓存过期
+        logger.warning(f"清除统计缓存失败: {e}")
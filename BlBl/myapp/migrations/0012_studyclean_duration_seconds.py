@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+
+def parse_duration_seconds(duration_str):
+    # 迁移中保留一份解析函数，不依赖之后可能修改的模型代码
+    try:
+        parts = [int(part) for part in str(duration_str).strip().split(':')]
+    except ValueError:
+        return None
+    if len(parts) == 3:
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    if len(parts) == 2:
+        return parts[0] * 60 + parts[1]
+    if len(parts) == 1:
+        return parts[0]
+    return None
+
+
+def backfill_duration_seconds(apps, schema_editor):
+    """分批读取 (id, video_duration)，解析后用 bulk_update 批量写回"""
+    StudyClean = apps.get_model('myapp', 'StudyClean')
+    batch = []
+    for video_id, duration in StudyClean.objects.order_by('id').values_list('id', 'video_duration').iterator(chunk_size=2000):
+        seconds = parse_duration_seconds(duration)
+        if seconds is not None:
+            batch.append(StudyClean(id=video_id, duration_seconds=seconds))
+        if len(batch) >= 2000:
+            StudyClean.objects.bulk_update(batch, ['duration_seconds'])
+            batch = []
+    if batch:
+        StudyClean.objects.bulk_update(batch, ['duration_seconds'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_alter_rec_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studyclean',
+            name='duration_seconds',
+            field=models.IntegerField(blank=True, db_index=True, null=True, verbose_name='视频时长（秒）'),
+        ),
+        migrations.RunPython(backfill_duration_seconds, migrations.RunPython.noop),
+    ]
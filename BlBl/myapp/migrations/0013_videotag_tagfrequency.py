@@ -0,0 +1,77 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:07
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def split_tags(tags):
+    # 迁移中保留一份拆分函数（与 myapp.tag_index.split_tags 一致，标签最长255个字符）
+    if not tags:
+        return []
+    unified = tags.replace('，', ',').replace('\n', ',').replace(';', ',').replace(' ', ',')
+    tag_list = (tag.strip()[:255].strip() for tag in unified.split(','))
+    return [tag for tag in tag_list if tag]
+
+
+def backfill_tag_index(apps, schema_editor):
+    """拆分已有视频的标签，批量写入 VideoTag 和 TagFrequency"""
+    StudyClean = apps.get_model('myapp', 'StudyClean')
+    VideoTag = apps.get_model('myapp', 'VideoTag')
+    TagFrequency = apps.get_model('myapp', 'TagFrequency')
+
+    frequencies = Counter()
+    batch = []
+    for video_id, category, tags in StudyClean.objects.order_by('id').values_list(
+            'id', 'category', 'tags').iterator(chunk_size=2000):
+        for tag, count in Counter(split_tags(tags)).items():
+            batch.append(VideoTag(video_id=video_id, tag=tag, count=count))
+            frequencies[category.rstrip(' '), tag] += count
+        if len(batch) >= 2000:
+            VideoTag.objects.bulk_create(batch)
+            batch = []
+    VideoTag.objects.bulk_create(batch)
+    TagFrequency.objects.bulk_create(
+        [TagFrequency(category=category, tag=tag, count=count) for (category, tag), count in frequencies.items()],
+        batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_studyclean_duration_seconds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagFrequency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(db_collation='utf8mb4_bin', max_length=100, verbose_name='类别')),
+                ('tag', models.CharField(db_collation='utf8mb4_bin', max_length=255, verbose_name='标签')),
+                ('count', models.IntegerField(default=0, verbose_name='出现次数')),
+            ],
+            options={
+                'verbose_name': '标签词频',
+                'verbose_name_plural': '标签词频',
+                'indexes': [models.Index(fields=['category', '-count'], name='tagfreq_category_count')],
+                'unique_together': {('category', 'tag')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VideoTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(db_collation='utf8mb4_bin', db_index=True, max_length=255, verbose_name='标签')),
+                ('count', models.IntegerField(default=1, verbose_name='出现次数')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_index', to='myapp.studyclean', verbose_name='视频')),
+            ],
+            options={
+                'verbose_name': '视频标签',
+                'verbose_name_plural': '视频标签',
+                'unique_together': {('video', 'tag')},
+            },
+        ),
+        migrations.RunPython(backfill_tag_index, migrations.RunPython.noop),
+    ]
@@ -46,6 +46,24 @@ class User(models.Model):
 
 
 
+def parse_duration_seconds(duration_str):
+    """
+    将视频时长字符串转换为秒数
+    格式可能是: "1:23:45"（时:分:秒）、"23:45"（分:秒，分钟可以超过59）或 "45"（秒），无法解析时返回None
+    """
+    try:
+        parts = [int(part) for part in str(duration_str).strip().split(':')]
+    except ValueError:
+        return None
+    if len(parts) == 3:
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    if len(parts) == 2:
+        return parts[0] * 60 + parts[1]
+    if len(parts) == 1:
+        return parts[0]
+    return None
+
+
 # Create your models here.
 class StudyClean(models.Model):
     video_id = models.CharField(max_length=255, verbose_name='视频id')
@@ -53,6 +71,8 @@ class StudyClean(models.Model):
     author = models.CharField(max_length=255, verbose_name='作者')
     video_description = models.TextField(verbose_name='视频文案')
     video_duration = models.CharField(max_length=55, verbose_name='视频时长')
+    # 由 video_duration 解析得到，保存时自动填写（queryset.update 等绕过 save 的写入需要自行同步）
+    duration_seconds = models.IntegerField(null=True, blank=True, db_index=True, verbose_name='视频时长（秒）')
     damaku_count = models.IntegerField(verbose_name='弹幕数量')
     favorites_count = models.IntegerField(verbose_name='收藏人数')
     likes_count = models.IntegerField(verbose_name='点赞人数')
@@ -71,6 +91,14 @@ class StudyClean(models.Model):
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        """保存时根据 video_duration 填写 duration_seconds"""
+        self.duration_seconds = parse_duration_seconds(self.video_duration)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'video_duration' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'duration_seconds'}
+        super().save(*args, **kwargs)
 class Comment(models.Model):
     uid = models.IntegerField()
     fid = models.IntegerField()
@@ -105,4 +133,29 @@ class Rec(models.Model):
     class Meta:
         db_table = 'myapp_rec'  # 修改为实际存在的表名
         verbose_name = '推荐记录'
-        verbose_name_plural = '推荐记录'
\ No newline at end of file
+        verbose_name_plural = '推荐记录'
+
+class VideoTag(models.Model):
+    """视频-标签索引（由 StudyClean.tags 拆分得到，见 myapp/tag_index.py）"""
+    video = models.ForeignKey(StudyClean, on_delete=models.CASCADE, related_name='tag_index', verbose_name="视频")
+    # 二进制排序规则: 大小写、重音不同的标签是不同的标签（与 Python 字符串比较一致）
+    tag = models.CharField(max_length=255, db_index=True, db_collation='utf8mb4_bin', verbose_name="标签")
+    count = models.IntegerField(default=1, verbose_name="出现次数")  # 同一视频的标签字符串中重复出现的次数
+
+    class Meta:
+        unique_together = ('video', 'tag')
+        verbose_name = '视频标签'
+        verbose_name_plural = '视频标签'
+
+
+class TagFrequency(models.Model):
+    """每个类别中每个标签出现的总次数（词云数据），视频增删改时增量更新"""
+    category = models.CharField(max_length=100, db_collation='utf8mb4_bin', verbose_name="类别")
+    tag = models.CharField(max_length=255, db_collation='utf8mb4_bin', verbose_name="标签")
+    count = models.IntegerField(default=0, verbose_name="出现次数")
+
+    class Meta:
+        unique_together = ('category', 'tag')
+        indexes = [models.Index(fields=['category', '-count'], name='tagfreq_category_count')]
+        verbose_name = '标签词频'
+        verbose_name_plural = '标签词频'
@@ -0,0 +1,117 @@
+"""
+在线推荐服务
+每个Web进程只加载一次离线训练好的模型（视频邻居索引、ALS隐向量或混合推荐模型），
+模型目录以内存映射方式打开，多个Web进程共享同一份页缓存；
+请求时根据用户当前的收藏和评论即时打分（权重与离线训练一样按时间衰减）；模型更新后自动热切换，无需重启服务
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    from rec_models import CURRENT_FILE, load_model
+except ImportError:
+    CURRENT_FILE = 'CURRENT'
+    load_model = None
+
+try:
+    from interaction_loader import user_interaction_weights
+except ImportError:
+    user_interaction_weights = None
+
+from myapp.models import Comment, Wishlist
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationService:
+    def __init__(self, model_path, check_interval=30):
+        self.model_path = model_path
+        self.check_interval = check_interval
+        self.model = None
+        self._model_stamp = None   # 模型文件的 (mtime, size) 或模型目录的当前版本，用于判断模型是否更新
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return getattr(self.model, 'version', '') if self.model is not None else ''
+
+    def _file_stamp(self):
+        if os.path.isdir(self.model_path):
+            # 模型目录每次保存都会写入新的版本子目录并替换 CURRENT
+            try:
+                with open(os.path.join(self.model_path, CURRENT_FILE), encoding='utf-8') as f:
+                    return f.read().strip()
+            except OSError:
+                return None
+        try:
+            stat = os.stat(self.model_path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def reload(self, force=False):
+        """模型有变化时加载新模型并替换；加载失败时继续使用旧模型"""
+        if load_model is None:
+            return self.model
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            stamp = self._file_stamp()
+            if stamp is None or (stamp == self._model_stamp and not force):
+                return self.model
+            try:
+                new_model = load_model(self.model_path)
+            except Exception as e:
+                logger.error(f"加载推荐模型失败: {self.model_path}: {e}", exc_info=True)
+                return self.model
+
+            # 先加载完再替换引用，正在处理的请求继续使用旧模型
+            self.model = new_model
+            self._model_stamp = stamp
+            logger.info(f"推荐模型已加载: {self.model_path} (版本 {self.version})")
+            return self.model
+
+    def get_model(self):
+        if self.model is None or time.monotonic() - self._last_check >= self.check_interval:
+            return self.reload()
+        return self.model
+
+    def recommend(self, user_id, n=9):
+        """
+        为用户实时生成推荐
+        Returns:
+            [(video_id, score)]，模型不可用时返回空列表
+        """
+        model = self.get_model()
+        if model is None:
+            return []
+        wishlist = list(Wishlist.objects.filter(user_id=user_id).values_list('video_id', 'added_time'))
+        if user_interaction_weights is None:
+            return model.recommend([video for video, _ in wishlist], n, user_id=user_id)
+
+        # 与离线训练一样: 收藏和评论过的视频都是交互，权重按时间衰减
+        comments = Comment.objects.filter(uid=user_id).values_list('fid', 'ctime')
+        weights = user_interaction_weights(wishlist, comments)
+        return model.recommend(list(weights), n, user_id=user_id, ratings=list(weights.values()))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_recommendation_service():
+    """获取当前进程的推荐服务（单例）"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RecommendationService(
+                    getattr(settings, 'REC_MODEL_PATH', os.path.join(settings.BASE_DIR, 'item_index')),
+                    getattr(settings, 'REC_MODEL_CHECK_INTERVAL', 30),
+                )
+    return _service
@@ -0,0 +1,43 @@
+"""
+模型变化时清除依赖它们的缓存、同步标签索引（在 MyappConfig.ready 中导入注册）
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from myapp.dashboard import (DASHBOARD_CACHE_KEY, FILTER_OPTIONS_CACHE_KEY, KESHIHUA_CACHE_KEY,
+                             invalidate_dashboard_stats)
+from myapp.models import StudyClean, User, Wishlist
+from myapp.tag_index import remove_video_tags, update_video_tags
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Wishlist)
+def clear_dashboard_stats(sender, **kwargs):
+    invalidate_dashboard_stats()
+
+
+@receiver([post_save, post_delete], sender=StudyClean)
+def clear_video_stats(sender, **kwargs):
+    invalidate_dashboard_stats([DASHBOARD_CACHE_KEY, KESHIHUA_CACHE_KEY, FILTER_OPTIONS_CACHE_KEY])
+
+
+@receiver(pre_save, sender=StudyClean)
+def remember_video_tags(sender, instance, **kwargs):
+    """修改视频前记下原来的类别和标签，保存后只更新变化的标签词频"""
+    instance._old_category_tags = None
+    if instance.pk:
+        instance._old_category_tags = (StudyClean.objects.filter(pk=instance.pk)
+                                       .values_list('category', 'tags').first())
+
+
+@receiver(post_save, sender=StudyClean)
+def sync_video_tags(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_category, old_tags = getattr(instance, '_old_category_tags', None) or (None, None)
+    update_video_tags(instance, old_category, old_tags)
+
+
+@receiver(post_delete, sender=StudyClean)
+def drop_video_tags(sender, instance, **kwargs):
+    remove_video_tags(instance)
@@ -0,0 +1,147 @@
+"""
+词云数据的标签索引
+原来每次请求词云都要读出全部（或某一类别的）视频，在Python中拆分 tags 字符串再计数，
+现在把拆分结果保存下来:
+    VideoTag: 每个视频拆分后的标签（视频入库/修改时写入）
+    TagFrequency: 每个类别中每个标签的出现次数，视频增删改时只加减变化的标签（myapp/signals.py）
+词云接口只需按 count 降序读取 TagFrequency（"全部" 时按标签求和），结果按类别缓存 WORDCLOUD_CACHE_TTL 秒
+爬虫/脚本直接写数据库时由 spiders/csv_to_sql.py 同步写入索引；数据不一致时调用 rebuild_tag_index() 全量重建
+标签和类别列使用二进制排序规则（utf8mb4_bin），数据库按原样比较标签，大小写或重音不同的标签分别计数，
+与原来在Python中用 Counter 计数的结果一致；该排序规则比较时忽略末尾空格，类别统一去掉末尾空格后再计数
+"""
+import hashlib
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+
+from myapp.models import StudyClean, TagFrequency, VideoTag
+
+logger = logging.getLogger(__name__)
+
+ALL_CATEGORIES = '全部'
+MAX_TAG_LENGTH = VideoTag._meta.get_field('tag').max_length
+
+
+def split_tags(tags):
+    """
+    拆分视频的标签字符串（中文逗号、换行、分号、空格都作为分隔符），返回标签列表（可能有重复）
+    超过 MAX_TAG_LENGTH 的标签截断后计数
+    """
+    if not tags:
+        return []
+    unified_tags = tags.replace('，', ',').replace('\n', ',').replace(';', ',').replace(' ', ',')
+    tag_list = (tag.strip()[:MAX_TAG_LENGTH].strip() for tag in unified_tags.split(','))
+    return [tag for tag in tag_list if tag]
+
+
+def category_key(category):
+    """词频表中的类别: 去掉末尾空格（数据库比较时 '音乐 ' 与 '音乐' 是同一个类别）"""
+    return category.rstrip(' ') if category is not None else None
+
+
+def _cache_key(category):
+    # 类别来自请求参数，缓存键使用哈希值
+    return 'wordcloud:' + hashlib.md5(category_key(category).encode('utf-8')).hexdigest()
+
+
+def invalidate_wordcloud(categories):
+    """清除这些类别以及"全部"的词云缓存"""
+    keys = {_cache_key(ALL_CATEGORIES)} | {_cache_key(c) for c in categories if c is not None}
+    try:
+        cache.delete_many(list(keys))
+    except Exception as e:
+        logger.warning(f"清除词云缓存失败: {e}")
+
+
+def _apply_frequency(category, counts, sign):
+    """把 counts 中各标签的次数乘以 sign 加到该类别的词频上，次数减到0的记录删除"""
+    for tag, count in counts.items():
+        delta = sign * count
+        updated = TagFrequency.objects.filter(category=category, tag=tag).update(count=F('count') + delta)
+        if not updated and delta > 0:
+            TagFrequency.objects.create(category=category, tag=tag, count=delta)
+    if sign < 0 and counts:
+        TagFrequency.objects.filter(category=category, tag__in=list(counts), count__lte=0).delete()
+
+
+def update_video_tags(video, old_category=None, old_tags=None):
+    """
+    视频新增或修改后同步标签索引
+    Args:
+        old_category / old_tags: 修改前的类别和标签（新增视频时为 None）
+    """
+    old_category, new_category = category_key(old_category), category_key(video.category)
+    old_counts = Counter(split_tags(old_tags))
+    new_counts = Counter(split_tags(video.tags))
+    if old_category == new_category and old_counts == new_counts:
+        return
+
+    with transaction.atomic():
+        VideoTag.objects.filter(video=video).delete()
+        VideoTag.objects.bulk_create(
+            [VideoTag(video=video, tag=tag, count=count) for tag, count in new_counts.items()])
+        if old_category is not None:
+            _apply_frequency(old_category, old_counts, -1)
+        _apply_frequency(new_category, new_counts, 1)
+    invalidate_wordcloud([old_category, new_category])
+
+
+def remove_video_tags(video):
+    """视频删除后从词频中减去它的标签（VideoTag 随视频级联删除）"""
+    counts = Counter(split_tags(video.tags))
+    if not counts:
+        return
+    with transaction.atomic():
+        _apply_frequency(category_key(video.category), counts, -1)
+    invalidate_wordcloud([video.category])
+
+
+def rebuild_tag_index():
+    """根据 StudyClean 全量重建 VideoTag 和 TagFrequency"""
+    frequencies = Counter()
+    video_tags = []
+    for video_id, category, tags in StudyClean.objects.order_by('id').values_list(
+            'id', 'category', 'tags').iterator(chunk_size=2000):
+        for tag, count in Counter(split_tags(tags)).items():
+            video_tags.append(VideoTag(video_id=video_id, tag=tag, count=count))
+            frequencies[category_key(category), tag] += count
+
+    categories = set(TagFrequency.objects.values_list('category', flat=True).distinct())
+    categories.update(category for category, _ in frequencies)
+    with transaction.atomic():
+        VideoTag.objects.all().delete()
+        TagFrequency.objects.all().delete()
+        VideoTag.objects.bulk_create(video_tags, batch_size=2000)
+        TagFrequency.objects.bulk_create(
+            [TagFrequency(category=category, tag=tag, count=count)
+             for (category, tag), count in frequencies.items()],
+            batch_size=2000)
+    invalidate_wordcloud(categories)
+    print(f"标签索引重建完成: {len(video_tags)} 条视频标签, {len(frequencies)} 条类别词频")
+
+
+def compute_wordcloud_data(category=ALL_CATEGORIES):
+    """某一类别（或全部）的标签词频，按次数降序、次数相同按标签排序"""
+    if category == ALL_CATEGORIES:
+        rows = (TagFrequency.objects.values('tag')
+                .annotate(total=Sum('count'))
+                .order_by('-total', 'tag')
+                .values_list('tag', 'total'))
+    else:
+        rows = (TagFrequency.objects.filter(category=category_key(category))
+                .order_by('-count', 'tag')
+                .values_list('tag', 'count'))
+    return [{'name': tag, 'value': count} for tag, count in rows]
+
+
+def get_wordcloud_data(category=ALL_CATEGORIES, limit=None):
+    """读取词云数据（按类别缓存完整列表），limit 为正整数时只返回前 limit 个标签"""
+    data = cache.get(_cache_key(category))
+    if data is None:
+        data = compute_wordcloud_data(category)
+        cache.set(_cache_key(category), data, getattr(settings, 'WORDCLOUD_CACHE_TTL', 600))
+    return data[:limit] if limit else data
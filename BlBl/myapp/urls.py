@@ -19,6 +19,7 @@ urlpatterns = [
     # path('get_wordcloud_data/',views.wordcloud_view,name='get_wordcloud_data'),
     path('wordcloud/data/', views.wordcloud_view, name='wordcloud_data'),
     path('video_rec/',views.video_rec, name='video_rec'),
+    path('api/recommend/', views.recommend_api, name='recommend_api'),
     path('user_view/',views.user_view, name='user_view'),
     path('change_password/', views.change_password_view, name='change_password'),
     path('logout/', views.logout, name='logout'),
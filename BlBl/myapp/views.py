@@ -1,6 +1,7 @@
 import json
 import os
 import re
+import time
 from calendar import month
 from functools import wraps
 
@@ -13,22 +14,21 @@ from attr.setters import convert
 from django.conf import settings
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db import transaction
-from django.db.models import Count, Sum, DateField, F  # DateField在这里导入
-from django.db.models.functions import Cast  # Cast从functions导入
 from django.contrib.auth.hashers import make_password, check_password
 from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
-from django.utils.timezone import now
 from unicodedata import category
 try:
     from Instruct import generate_chat_reply
 except ImportError:
     generate_chat_reply = None
 from myapp.models import User, StudyClean, Comment, Wishlist,Rec
-from collections import Counter
+from myapp.dashboard import get_dashboard_stats, get_filter_options, get_keshihua1_stats, get_keshihua_stats
+from myapp.tag_index import get_wordcloud_data
+from myapp.rec_service import get_recommendation_service
 import numpy
-from datetime import datetime, timedelta
+from datetime import datetime
 TEMPLATE_PATH = 'templates/'
 
 
@@ -182,67 +182,21 @@ def register(request):
 
 @optional_login
 def index(request):
-    # 基础统计
-    total_user = User.objects.count()
-    total_video = StudyClean.objects.count()
-
-    # 视频分类统计
-    video_type_stats = list(StudyClean.objects.values('category').annotate(count=Count('id')).order_by('-count'))
-
-    # 点赞、评论、收藏统计（处理None值）
-    total_likes = StudyClean.objects.aggregate(total_likes=Sum('likes_count'))['total_likes'] or 0
-    total_comments = StudyClean.objects.aggregate(total_comments=Sum('comments_count'))['total_comments'] or 0
-    total_favorites = StudyClean.objects.aggregate(total_favorites=Sum('favorites_count'))['total_favorites'] or 0
+    # 统计数据（用户数、视频数、总数、分类统计、收藏排行、注册统计）从缓存读取，数据变化时自动刷新
+    stats = get_dashboard_stats()
 
     # 最新评论
     latest_comments = Comment.objects.order_by('-ctime')[:3]
 
-    # 收藏统计（修复字段名错误）
-    wishlist_stats = Wishlist.objects.values(
-        'video__id',
-        'video__image_url',
-        'video__title',
-        'video__category',
-        'video__video_type',
-        'video__likes_count'
-    ).annotate(
-        collect_count=Count('id'),
-        favorites_count=F('video__favorites_count')
-    ).order_by('-collect_count')[:10]
-
-    # 用户注册统计（修复字段名和语法）
-    user_creation_stats = User.objects.annotate(
-        day=Cast('addtime', DateField())  # 确保User模型有addtime字段
-    ).values('day').annotate(
-        count=Count('id')
-    ).order_by('day')
-
-    # 格式化日期（处理None值）
-    user_creation_stats = [
-        {'day': stat['day'].strftime('%Y-%m-%d') if stat['day'] else '', 'count': stat['count']}
-        for stat in user_creation_stats
-    ]
-
-    # 组装上下文数据
-    user_data = {
-        'total_user': total_user,
-        'total_video': total_video,
-        'total_likes': total_likes,
-        'total_comments': total_comments,
-        'total_favorites': total_favorites,
-        'video_type_stats': video_type_stats,
-        'user_creation_stats': user_creation_stats,
-    }
-
     # 获取当前登录用户
     current_user = None
     if 'user_id' in request.session:
         current_user = User.objects.filter(id=request.session['user_id']).first()
 
     context = {
-        'user_data': user_data,
+        'user_data': stats['user_data'],
         'latest_comments': latest_comments,
-        'wishlist_stats': wishlist_stats,
+        'wishlist_stats': stats['wishlist_stats'],
         'current_user': current_user,
 
     }
@@ -424,94 +378,23 @@ def comment(request, videoid):
 
 
 def keshihua(request):
-    study_data = StudyClean.objects.all()
-    video_types = Counter()
-    authors = Counter()
-
-    # 收集视频信息
-    video_info = []
-    for video in study_data:
-        video_types[video.video_type] += 1
-        authors[video.author] += 1
-        video_info.append({
-            'title': video.title,
-            'likes': video.likes_count,
-            'favorites': video.favorites_count,
-            'comments': video.comments_count
-        })
-
-    # 处理排序数据
-    sorted_video_types = sorted(video_types.items(), key=lambda x: x[1], reverse=True)
-    sorted_authors = sorted(authors.items(), key=lambda x: x[1], reverse=True)
-
-    # 点赞排行
-    sorted_by_likes = sorted(video_info, key=lambda x: x['likes'], reverse=True)[:10]
-    likes_titles = [item['title'] for item in sorted_by_likes]
-    likes_values = [item['likes'] for item in sorted_by_likes]
-
-    # 收藏排行
-    sorted_by_favorites = sorted(video_info, key=lambda x: x['favorites'], reverse=True)[:10]
-    favorites_titles = [item['title'] for item in sorted_by_favorites]
-    favorites_values = [item['favorites'] for item in sorted_by_favorites]
-    total_authors_count = StudyClean.objects.values('author').distinct().count()
-
-    # views.py 中新增
-    # 统计热门视频数（自定义规则：点赞≥1000 且 收藏≥500）
-    hot_video_count = 0
-    for video in study_data:
-        if video.likes_count >= 30000 and video.favorites_count >= 10000:
-            hot_video_count += 1
-
-    # 新增：统计活跃作者（半年内发过作品的作者）
-    # 计算半年前的时间点
-    half_year_ago = timezone.now() - timedelta(days=30)
-
-    # 修改这里：将 'created_at' 替换为 'publish_timestamp'
-    active_authors = StudyClean.objects.filter(
-        publish_timestamp__gte=half_year_ago  # 关键修改
-    ).values('author').distinct()
-
-    # 统计活跃作者数量
-    active_author_count = active_authors.count()
+    # 分组计数、排行榜等都在数据库中完成（不再把整张表读入内存），结果短时间缓存
+    stats = get_keshihua_stats()
 
     context = {
-        'video_types': json.dumps(sorted_video_types),
-        'authors': json.dumps(sorted_authors),
-        'likes': json.dumps(likes_values),
-        'likes_titles': json.dumps(likes_titles),  # 新增
-        'favorites': json.dumps(favorites_values),
-        'favorites_titles': json.dumps(favorites_titles),  # 新增
-        'active_author_count': active_author_count,
-        'total_authors_count': total_authors_count,  # 新增的总作者数
-
-        'hot_video_count' :hot_video_count
-
+        'video_types': json.dumps(stats['video_types']),
+        'authors': json.dumps(stats['authors']),
+        'likes': json.dumps(stats['likes']),
+        'likes_titles': json.dumps(stats['likes_titles']),
+        'favorites': json.dumps(stats['favorites']),
+        'favorites_titles': json.dumps(stats['favorites_titles']),
+        'active_author_count': stats['active_author_count'],
+        'total_authors_count': stats['total_authors_count'],
+        'hot_video_count': stats['hot_video_count'],
     }
 
     return render(request, 'keshihua.html', context)
 
-def convert_duration_to_minutes(duration_str):
-    """
-    将视频时长字符串转换为分钟
-    格式可能是: "1:23:45" 或 "23:45" 或 "45"
-    """
-    try:
-        parts = duration_str.split(':')
-        if len(parts) == 3:  # 时:分:秒
-            hours, minutes, seconds = int(parts[0]), int(parts[1]), int(parts[2])
-            return hours * 60 + minutes + seconds / 60
-        elif len(parts) == 2:  # 分:秒
-            minutes, seconds = int(parts[0]), int(parts[1])
-            return minutes + seconds / 60
-        elif len(parts) == 1:  # 只有秒
-            seconds = int(parts[0])
-            return seconds / 60
-        else:
-            return 0
-    except (ValueError, AttributeError):
-        return 0
-
-
 def keshihua1(request):
     # 获取筛选参数
     time_range = request.GET.get('timeRange', 'all')  # all, month, halfyear, year
@@ -519,104 +402,22 @@ def keshihua1(request):
     video_type = request.GET.get('videoType', 'all')  # 视频类型
     category = request.GET.get('category', 'all')  # 类别
 
-    # 获取所有数据
-    study_data = StudyClean.objects.all()
-
-    # 应用时间范围筛选
-    if time_range != 'all':
-        now = datetime.now()
-        if time_range == 'month':
-            start_date = now - timedelta(days=30)
-        elif time_range == 'halfyear':
-            start_date = now - timedelta(days=180)
-        elif time_range == 'year':
-            start_date = now - timedelta(days=365)
-        else:
-            start_date = now - timedelta(days=365)  # 默认一年
-
-        study_data = study_data.filter(publish_timestamp__gte=start_date)
-
-    # 应用视频类型筛选
-    if video_type != 'all':
-        study_data = study_data.filter(video_type=video_type)
-
-    # 应用类别筛选
-    if category != 'all':
-        study_data = study_data.filter(category=category)
-
-    # 视频时长和各项数据
-    video_durations = []
-    likes_counts = []
-    favorites_counts = []
-    damaku_counts = []
-    comments_counts = []
-
-    for video in study_data:
-        duration_in_minutes = convert_duration_to_minutes(video.video_duration)
-        video_durations.append(duration_in_minutes)
-        likes_counts.append(video.likes_count)
-        favorites_counts.append(video.favorites_count)
-        damaku_counts.append(video.damaku_count)
-        comments_counts.append(video.comments_count)
-
-    # 根据数据类型选择要展示的数据
-    if data_type == 'comments':
-        target_counts = comments_counts
-    elif data_type == 'likes':
-        target_counts = likes_counts
-    elif data_type == 'favorites':
-        target_counts = favorites_counts
-    else:  # damaku
-        target_counts = damaku_counts
-
-    # 每月（不算年份）与目标数据
-    publish_months = Counter()
-    for video in study_data:
-        month = video.publish_timestamp.month
-        if data_type == 'comments':
-            publish_months[month] += video.comments_count
-        elif data_type == 'likes':
-            publish_months[month] += video.likes_count
-        elif data_type == 'favorites':
-            publish_months[month] += video.favorites_count
-        else:  # damaku
-            publish_months[month] += video.damaku_count
-
-    # 视频时长与目标数据
-    video_duration_data = list(zip(video_durations, target_counts))
-
-    # 将publish_month_data转换为列表
-    publish_month_data = [publish_months.get(month, 0) for month in range(1, 13)]
-
-    # 计算每月视频数量
-    video_count_per_month = Counter()
-    for video in study_data:
-        month = video.publish_timestamp.month
-        video_count_per_month[month] += 1
-
-    video_count_data = [video_count_per_month.get(month, 0) for month in range(1, 13)]
-
-    # 获取可筛选的选项
-    video_types = StudyClean.objects.values_list('video_type', flat=True).distinct()
-    categories = StudyClean.objects.values_list('category', flat=True).distinct()
+    # 按月求和/计数在一次条件聚合查询中完成，结果按筛选条件缓存，切换筛选条件时通常只读一次缓存
+    stats = get_keshihua1_stats(time_range, data_type, video_type, category)
 
     # 如果是AJAX请求，返回JSON
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'video_duration_data': video_duration_data,
-            'publish_month_data': publish_month_data,
-            'video_count_data': video_count_data,
-            'data_count': study_data.count()
-        })
+        return JsonResponse(stats)
 
     # 如果是普通请求，渲染页面
+    options = get_filter_options()
     context = {
-        'video_duration_data': json.dumps(video_duration_data),
-        'publish_month_data': json.dumps(publish_month_data),
-        'video_count_data': json.dumps(video_count_data),
-        'data_count': study_data.count(),
-        'video_types': list(video_types),
-        'categories': list(categories)
+        'video_duration_data': json.dumps(stats['video_duration_data']),
+        'publish_month_data': json.dumps(stats['publish_month_data']),
+        'video_count_data': json.dumps(stats['video_count_data']),
+        'data_count': stats['data_count'],
+        'video_types': options['video_types'],
+        'categories': options['categories']
     }
     return render(request, 'keshihua1.html', context)
 
@@ -629,42 +430,14 @@ def wordcloud(request):
 
 @optional_login
 def wordcloud_view(request):
+    """词云数据：从预先统计好的标签词频表读取（见 myapp/tag_index.py），limit 为返回的标签个数，不传时返回全部"""
     video_type = request.GET.get('type', '全部')
+    try:
+        limit = max(int(request.GET.get('limit', 0)), 0)
+    except ValueError:
+        limit = 0
 
-    if video_type == '全部':
-        videos = StudyClean.objects.all()
-    else:
-        videos = StudyClean.objects.filter(category=video_type)
-
-    # 准备词云数据 - 修复标签处理逻辑
-    tags_counter = Counter()
-    for video in videos:
-        tags = video.tags
-        if tags:  # 防止tags字段为None
-            # 更健壮的分割方式
-            # 1. 替换中文逗号为英文逗号
-            # 2. 处理多个连续分隔符
-            # 3. 处理换行符等其他分隔符
-
-            # 先统一分隔符
-            unified_tags = tags.replace('，', ',')  # 中文逗号转英文逗号
-            unified_tags = unified_tags.replace('\n', ',')  # 换行符转逗号
-            unified_tags = unified_tags.replace(';', ',')  # 分号转逗号
-            unified_tags = unified_tags.replace(' ', ',')  # 空格转逗号（谨慎使用）
-
-            # 分割并清理
-            tag_list = [tag.strip() for tag in unified_tags.split(',') if tag.strip()]
-
-            for tag in tag_list:
-                tags_counter[tag] += 1
-
-    # 将统计结果转换为列表格式
-    data_list = [{'name': tag, 'value': count} for tag, count in tags_counter.items()]
-
-    # 按词频排序（从高到低）
-    data_list.sort(key=lambda x: x['value'], reverse=True)
-
-    return JsonResponse({"data": data_list})
+    return JsonResponse({"data": get_wordcloud_data(video_type, limit)})
 
 
 @login_required
@@ -724,9 +497,13 @@ def video_rec(request):
                 'score': float(rec.score) if rec.score else 0.0,
             })
 
-        # 如果没有推荐记录，使用备用方案
+        # 如果没有推荐记录，先尝试在线推荐服务，再使用备用方案
         if not video_details:
-            print(f"DEBUG: 用户 {user_id} 没有推荐记录，尝试备用方案")
+            print(f"DEBUG: 用户 {user_id} 没有推荐记录，尝试在线推荐")
+            video_details = get_online_recommendations(user_id)
+
+        if not video_details:
+            print(f"DEBUG: 用户 {user_id} 没有在线推荐结果，尝试备用方案")
             video_details = get_fallback_recommendations(user_id)
 
         context = {
@@ -754,6 +531,59 @@ def video_rec(request):
     return render(request, 'video_rec.html', context)
 
 
+def get_online_recommendations(user_id, n=9):
+    """使用在线推荐服务实时生成推荐"""
+    try:
+        recommendations = get_recommendation_service().recommend(user_id, n)
+        if not recommendations:
+            return []
+
+        videos = StudyClean.objects.in_bulk([video_id for video_id, _ in recommendations])
+        video_details = []
+        for video_id, score in recommendations:
+            video = videos.get(video_id)
+            if not video:
+                continue
+            video_details.append({
+                'id': video.id,
+                'imgurl': video.image_url or '/static/default.jpg',
+                'videoname': video.title or '未命名视频',
+                'category': video.category or '未分类',
+                'recommend': timezone.now(),
+                'score': round(score, 2),
+            })
+        return video_details
+    except Exception as e:
+        logger.error(f"在线推荐失败: {str(e)}", exc_info=True)
+        return []
+
+
+@login_required
+def recommend_api(request):
+    """在线推荐接口: 返回当前用户的实时推荐（JSON）"""
+    user_id = request.session.get('user_id')
+    try:
+        n = min(max(int(request.GET.get('n', 9)), 1), 50)
+    except ValueError:
+        n = 9
+
+    service = get_recommendation_service()
+    start = time.perf_counter()
+    video_details = get_online_recommendations(user_id, n)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for item in video_details:
+        item['recommend'] = item['recommend'].strftime('%Y-%m-%d %H:%M:%S')
+
+    return JsonResponse({
+        'status': 'success',
+        'user_id': user_id,
+        'model_version': service.version,
+        'elapsed_ms': round(elapsed_ms, 2),
+        'data': video_details,
+    })
+
+
 def get_fallback_recommendations(user_id):
     """备用推荐方案"""
     try:
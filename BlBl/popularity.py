@@ -0,0 +1,101 @@
+"""
+热门视频索引
+每次训练只统计一次视频流行度并排好序，冷启动或没有推荐结果的用户走热门后备时，
+只需沿着排好序的列表跳过已收藏的视频，不再为每个用户重新扫描整个训练集
+    全局热门: 按收藏次数降序，次数相同的按首次被收藏的先后排列（与原来按字典统计再排序一致）
+    分类热门: 每个分类一份排好序的列表（从全局列表中按分类拆出，顺序不变），不足N个时用全局热门补足
+    时间衰减热门: 按训练集中的交互权重求和；run_recommendation 从数据库加载的权重已按收藏/评论时间衰减
+        （interaction_loader.decay_weights），近期被收藏的视频排名更靠前
+"""
+from collections import defaultdict
+
+import numpy as np
+
+
+class PopularityIndex():
+    def __init__(self, trainSet, video_categories=None):
+        """
+        Args:
+            trainSet: {user_id: {video_id: rating}} 或 InteractionStore
+            video_categories: {video_id: category}，为空时不建立分类热门
+        """
+        self.source = trainSet  # 构建时的训练集，训练集被替换后需要重建
+        counts, weights = self._count(trainSet)
+        self.ranking = self._rank(counts)  # [(video_id, 收藏次数)]
+        self.category_rankings = self._by_category(self.ranking, video_categories)
+        self.decayed_ranking = self._rank(weights)  # [(video_id, 交互权重之和)]
+        self.decayed_category_rankings = self._by_category(self.decayed_ranking, video_categories)
+
+    @staticmethod
+    def _count(trainSet):
+        """
+        每个视频被收藏的次数和交互权重之和
+        Returns:
+            ({video_id: count}, {video_id: weight})，都按首次被收藏的先后排列
+        """
+        if hasattr(trainSet, 'video_counts'):
+            counts = trainSet.video_counts()
+            weights = np.bincount(trainSet.indices, weights=trainSet.data, minlength=trainSet.n_videos)
+            videos, first = np.unique(trainSet.indices, return_index=True)
+            videos = videos[np.argsort(first)]
+            keys = [trainSet.video_keys[j] for j in videos.tolist()]
+            return dict(zip(keys, counts[videos].tolist())), dict(zip(keys, weights[videos].tolist()))
+
+        counts = {}
+        weights = {}
+        for user_videos in trainSet.values():
+            for video, rating in user_videos.items():
+                counts[video] = counts.get(video, 0) + 1
+                weights[video] = weights.get(video, 0.0) + float(rating)
+        return counts, weights
+
+    @staticmethod
+    def _rank(weights):
+        # sorted 是稳定排序，权重相同的视频保持首次出现的先后
+        return sorted(weights.items(), key=lambda x: x[1], reverse=True)
+
+    @staticmethod
+    def _by_category(ranking, video_categories):
+        if not video_categories:
+            return {}
+        rankings = defaultdict(list)
+        for video, weight in ranking:
+            category = video_categories.get(video)
+            if category is not None:
+                rankings[category].append((video, weight))
+        return dict(rankings)
+
+    @staticmethod
+    def _pick(ranking, N, exclude, picked):
+        for video, weight in ranking:
+            if len(picked) >= N:
+                break
+            if video not in exclude:
+                picked[video] = weight
+
+    def top(self, N, exclude=(), category=None, decayed=False):
+        """
+        取前N个不在 exclude 中的热门视频
+        Args:
+            exclude: 需要跳过的视频（用户已收藏的视频）
+            category: 优先取该分类的热门视频，不足N个时用全局热门补足
+            decayed: 使用时间衰减后的流行度
+        Returns:
+            [(video_id, score)]，得分按其中最热门的视频归一化到0-5分
+        """
+        ranking = self.decayed_ranking if decayed else self.ranking
+        picked = {}
+        if category is not None:
+            category_rankings = self.decayed_category_rankings if decayed else self.category_rankings
+            self._pick(category_rankings.get(category, []), N, exclude, picked)
+        if len(picked) < N:
+            self._pick(ranking, N, set(exclude) | set(picked) if picked else exclude, picked)
+
+        if not picked:
+            return []
+        max_weight = max(picked.values())
+        return [(video, float(weight / max_weight * 5.0) if max_weight > 0 else 3.0)
+                for video, weight in picked.items()]
+
+    def __len__(self):
+        return len(self.ranking)
@@ -0,0 +1,517 @@
+"""
+在线推荐使用的模型文件格式
+只依赖numpy，Django进程加载后即可按需为用户打分：
+    ItemNeighborIndex: 基于物品的协同过滤的视频邻居索引
+    FactorModel: ALS训练得到的用户/视频隐向量
+    HybridModel: run_recommendation.py 的混合推荐模型（相似用户 + 视频标签 + 热门视频）
+
+模型保存为一个目录，每个数组一个 .npy 文件，manifest.json 记录模型类型、版本、数组清单和参数:
+    item_index/
+        CURRENT                 当前版本的子目录名
+        20250101120000/
+            manifest.json
+            video_ids.npy
+            ...
+读取时用 mmap_mode='r' 内存映射打开，不需要把数组读进进程内存，
+多个Web进程和离线任务共享同一份页缓存，加载几乎不耗时
+每次保存写入新的版本子目录，最后替换 CURRENT，正在使用旧版本的进程不受影响
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+ARTIFACT_FORMAT = 1
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+DEFAULT_RATING = 5.0  # 未衰减的收藏权重（interaction_loader.WISHLIST_WEIGHT）
+SCORE_DECIMALS = 9  # 内容推荐得分保留的小数位数
+
+
+def top_n(scores, N):
+    """部分排序取得分最高的N个下标（按得分降序），忽略 -inf"""
+    n_candidates = min(N, int(np.isfinite(scores).sum()))
+    if n_candidates <= 0:
+        return np.array([], dtype=np.int64)
+    top = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def content_scores(scores):
+    """
+    内容推荐得分归一化到0-5分，保留 SCORE_DECIMALS 位小数
+    离线（稀疏矩阵乘法）和在线（按收藏累加）的累加顺序不同，理论上同分的视频只差舍入误差，
+    取整后两边同分，再统一按视频顺序排列
+    """
+    return np.round(scores / scores.max() * 5.0, SCORE_DECIMALS)
+
+
+def top_n_ordered(ids, scores, N):
+    """取得分最高的N个，同分的按 ids 从小到大排列"""
+    if ids.size > N:
+        kth = scores[np.argpartition(-scores, N - 1)[:N]].min()
+        candidates = scores >= kth
+        ids, scores = ids[candidates], scores[candidates]
+    order = np.lexsort((ids, -scores))[:N]
+    return ids[order], scores[order]
+
+
+def save_artifact(path, model_type, arrays, keep=2, **meta):
+    """
+    保存模型目录
+    Args:
+        arrays: {名称: numpy数组}，每个数组保存为一个 .npy 文件
+        keep: 保留的版本数（当前版本和上一个版本）
+        meta: 写入 manifest.json 的其它参数（需要能转换为JSON）
+    Returns:
+        版本号
+    """
+    os.makedirs(path, exist_ok=True)
+    version = time.strftime('%Y%m%d%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(path, version)):
+        version = f"{time.strftime('%Y%m%d%H%M%S')}_{suffix}"
+        suffix += 1
+
+    # 先写到临时目录，全部写完后再改名为版本目录
+    tmp_dir = os.path.join(path, f'{version}.tmp')
+    os.makedirs(tmp_dir)
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'model_type': model_type,
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'arrays': {},
+        'meta': meta,
+    }
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), array, allow_pickle=False)
+        manifest['arrays'][name] = {'file': f'{name}.npy', 'dtype': array.dtype.str, 'shape': list(array.shape)}
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_dir, os.path.join(path, version))
+
+    tmp_current = os.path.join(path, f'{CURRENT_FILE}.tmp')
+    with open(tmp_current, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_current, os.path.join(path, CURRENT_FILE))
+
+    # 清理旧版本（Windows下仍被其它进程映射的文件删不掉，留到下次再清理）
+    versions = sorted(name for name in os.listdir(path)
+                      if name != CURRENT_FILE and os.path.isdir(os.path.join(path, name)))
+    for name in versions:
+        if name != version and (name.endswith('.tmp') or name in versions[:-keep]):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    return version
+
+
+def artifact_dir(path):
+    """模型目录中当前版本的子目录（path 本身就是版本目录时直接返回）"""
+    if os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+        return path
+    with open(os.path.join(path, CURRENT_FILE), encoding='utf-8') as f:
+        return os.path.join(path, f.read().strip())
+
+
+def load_artifact(path, mmap_mode='r'):
+    """
+    打开模型目录
+    Returns:
+        (manifest, {名称: 数组})，mmap_mode 不为None时数组为只读的内存映射
+    """
+    version_dir = artifact_dir(path)
+    with open(os.path.join(version_dir, MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"不支持的模型格式: {manifest.get('format')}")
+
+    arrays = {}
+    for name, info in manifest['arrays'].items():
+        arrays[name] = np.load(os.path.join(version_dir, info['file']), mmap_mode=mmap_mode, allow_pickle=False)
+    return manifest, arrays
+
+
+def load_model(path, mmap_mode='r'):
+    """根据模型类型加载 ItemNeighborIndex / FactorModel / HybridModel（兼容旧的 .npz 文件）"""
+    if os.path.isdir(path):
+        manifest, arrays = load_artifact(path, mmap_mode)
+    else:
+        data = np.load(path)
+        arrays = {name: data[name] for name in data.files}
+        manifest = {
+            'model_type': str(arrays.pop('model_type', 'item_cf')),
+            'version': str(arrays.pop('version', '')),
+            'meta': {name: arrays.pop(name).item() for name in ('regularization', 'alpha') if name in arrays},
+        }
+
+    model_class = MODEL_TYPES.get(manifest['model_type'])
+    if model_class is None:
+        raise ValueError(f"未知的模型类型: {manifest['model_type']}")
+    return model_class.from_arrays(arrays, manifest)
+
+
+class IdIndex():
+    """
+    ID -> 行号 的查找表
+    在按ID排序的下标上二分查找，加载模型时不需要逐个ID构建字典
+    """
+
+    def __init__(self, ids, sorter=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.sorter = np.argsort(self.ids, kind='stable') if sorter is None else np.asarray(sorter)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, ids):
+        """返回每个ID对应的行号（与输入一一对应），不存在的ID为-1"""
+        ids = np.array([int(i) for i in ids], dtype=np.int64)
+        if ids.size == 0 or self.ids.size == 0:
+            return np.full(ids.size, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.ids, ids, sorter=self.sorter), len(self.ids) - 1)
+        rows = self.sorter[pos].astype(np.int64)
+        return np.where(self.ids[rows] == ids, rows, -1)
+
+    def rows(self, ids):
+        """返回存在的ID对应的行号（保持输入顺序，不存在的ID跳过）"""
+        rows = self.positions(ids)
+        return rows[rows >= 0]
+
+    def get(self, id_, default=None):
+        rows = self.rows([id_])
+        return int(rows[0]) if rows.size else default
+
+    def __contains__(self, id_):
+        return self.get(id_) is not None
+
+    def __getitem__(self, id_):
+        row = self.get(id_)
+        if row is None:
+            raise KeyError(id_)
+        return row
+
+
+class ItemNeighborIndex():
+    """视频邻居索引"""
+    model_type = 'item_cf'
+
+    def __init__(self, video_ids, neighbors, sims, counts, version='', video_sorter=None):
+        self.video_index = IdIndex(video_ids, video_sorter)
+        self.video_ids = self.video_index.ids
+        self.neighbors = neighbors  # (视频数, K) 邻居行号，不足K个的位置为-1
+        self.sims = sims            # (视频数, K) 相似度，按降序排列
+        self.counts = counts        # 每个视频的有效邻居数
+        self.version = version
+
+    @classmethod
+    def from_store(cls, store):
+        return cls([int(video_id) for video_id in store.user_keys], store.neighbors, store.sims, store.counts)
+
+    def save(self, path):
+        save_artifact(path, self.model_type, {
+            'video_ids': self.video_ids, 'video_sorter': self.video_index.sorter,
+            'neighbors': self.neighbors, 'sims': self.sims, 'counts': self.counts,
+        })
+        print(f"视频邻居索引已保存到 {path}（{len(self.video_ids)} 个视频）")
+
+    @classmethod
+    def from_arrays(cls, arrays, manifest):
+        return cls(arrays['video_ids'], arrays['neighbors'], arrays['sims'], arrays['counts'],
+                   manifest.get('version', ''), arrays.get('video_sorter'))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        return load_model(path, mmap_mode)
+
+    def similar_videos(self, video_id, n=10):
+        """返回 [(视频ID, 相似度)]"""
+        row = self.video_index.get(video_id)
+        if row is None:
+            return []
+        count = min(int(self.counts[row]), n)
+        return [(int(self.video_ids[j]), float(sim))
+                for j, sim in zip(self.neighbors[row, :count], self.sims[row, :count])]
+
+    def recommend(self, watched_videos, N=9, user_id=None, ratings=None):
+        """
+        根据用户已收藏的视频生成推荐（不使用交互权重 ratings）
+        得分 = 已收藏视频与候选视频的相似度之和，归一化到0-5分
+        Returns:
+            [(视频ID, 得分)]
+        """
+        rows = self.video_index.rows(watched_videos)
+        if not rows.size or self.neighbors.shape[1] == 0:
+            return []
+
+        candidates = self.neighbors[rows].ravel()
+        weights = self.sims[rows].ravel()
+        valid = candidates >= 0
+        valid &= ~np.isin(candidates, rows)
+        candidates, weights = candidates[valid], weights[valid]
+        if candidates.size == 0:
+            return []
+
+        unique, inverse = np.unique(candidates, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        top = top_n(scores, N)
+        if top.size == 0:
+            return []
+
+        max_score = scores[top[0]]
+        return [(int(self.video_ids[unique[i]]),
+                 float(scores[i] / max_score * 5.0) if max_score > 0 else 3.0)
+                for i in top]
+
+
+class FactorModel():
+    """ALS隐向量模型"""
+    model_type = 'als'
+
+    def __init__(self, user_ids, video_ids, user_factors, item_factors,
+                 regularization=0.1, alpha=8.0, version='', user_sorter=None, video_sorter=None, gram=None):
+        self.user_index = IdIndex(user_ids, user_sorter)
+        self.video_index = IdIndex(video_ids, video_sorter)
+        self.user_ids = self.user_index.ids
+        self.video_ids = self.video_index.ids
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.regularization = float(regularization)
+        self.alpha = float(alpha)
+        self.version = version
+        self._gram = gram  # Yᵀ·Y，保存模型时一并计算好
+
+    def save(self, path):
+        Y = self.item_factors.astype(np.float64)
+        save_artifact(path, self.model_type, {
+            'user_ids': self.user_ids, 'user_sorter': self.user_index.sorter,
+            'video_ids': self.video_ids, 'video_sorter': self.video_index.sorter,
+            'user_factors': self.user_factors, 'item_factors': self.item_factors,
+            'gram': Y.T @ Y,
+        }, regularization=self.regularization, alpha=self.alpha)
+        print(f"ALS模型已保存到 {path}（用户 {len(self.user_ids)} 个, 视频 {len(self.video_ids)} 个）")
+
+    @classmethod
+    def from_arrays(cls, arrays, manifest):
+        meta = manifest.get('meta', {})
+        return cls(arrays['user_ids'], arrays['video_ids'], arrays['user_factors'], arrays['item_factors'],
+                   meta.get('regularization', 0.1), meta.get('alpha', 8.0), manifest.get('version', ''),
+                   arrays.get('user_sorter'), arrays.get('video_sorter'), arrays.get('gram'))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        return load_model(path, mmap_mode)
+
+    def fold_in(self, watched_videos, ratings=None):
+        """
+        根据用户当前的收藏现算用户向量（固定视频向量求解一次最小二乘），
+        新收藏不用等下一次离线训练就能生效
+        Args:
+            ratings: 每个视频的交互权重（与 watched_videos 一一对应），应与训练时一样按
+                     interaction_loader 的时间衰减公式计算；为空时按未衰减的收藏权重计算
+        """
+        pos = self.video_index.positions(watched_videos)
+        ratings = np.full(len(pos), DEFAULT_RATING) if ratings is None else np.asarray(ratings, dtype=np.float64)
+        known = pos >= 0
+        if not known.any():
+            return None
+        if self._gram is None:
+            Y = self.item_factors.astype(np.float64)
+            self._gram = Y.T @ Y
+        Y_u = self.item_factors[pos[known]].astype(np.float64)
+        c_minus_1 = self.alpha * ratings[known]
+        A = self._gram + (Y_u.T * c_minus_1) @ Y_u + self.regularization * np.eye(Y_u.shape[1])
+        b = Y_u.T @ (c_minus_1 + 1.0)
+        return np.linalg.solve(A, b)
+
+    def recommend(self, watched_videos, N=9, user_id=None, ratings=None):
+        """
+        为用户打分: 有收藏时用收藏现算用户向量，否则使用训练得到的用户向量
+        Args:
+            ratings: 每个视频的交互权重，见 fold_in
+        Returns:
+            [(视频ID, 得分)]，得分归一化到0-5分
+        """
+        user_vector = self.fold_in(watched_videos, ratings) if watched_videos else None
+        if user_vector is None and user_id is not None and user_id in self.user_index:
+            user_vector = self.user_factors[self.user_index[user_id]]
+        if user_vector is None:
+            return []
+
+        scores = (self.item_factors @ user_vector).astype(np.float64)
+        scores[self.video_index.rows(watched_videos)] = -np.inf
+
+        top = top_n(scores, N)
+        top = top[scores[top] > 0]
+        if top.size == 0:
+            return []
+        max_score = scores[top[0]]
+        return [(int(self.video_ids[j]), float(scores[j] / max_score * 5.0)) for j in top]
+
+
+class HybridModel():
+    """
+    混合推荐模型，推荐流程与 run_recommendation.UserBasedCF.recommend_for_user 一致:
+        前K个相似用户收藏的视频（相似度 * 评分累加）+ 与用户兴趣标签匹配的视频，没有结果时推荐热门视频
+    兴趣标签按请求时用户的收藏和交互权重现算，新收藏不用等下一次离线训练就能生效
+    """
+    model_type = 'hybrid'
+
+    def __init__(self, arrays, n_sim_user=0, version=''):
+        # 训练集（CSR）: 行为用户，列为视频
+        self.user_index = IdIndex(arrays['user_ids'], arrays.get('user_sorter'))
+        self.video_index = IdIndex(arrays['video_ids'], arrays.get('video_sorter'))
+        self.user_ids = self.user_index.ids
+        self.video_ids = self.video_index.ids
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        self.data = arrays['data']
+
+        # 相似用户（行号与训练集的用户行号一致，不足K个的位置为-1）
+        self.neighbors = arrays['neighbors']
+        self.sims = arrays['sims']
+
+        # 视频×标签、标签×视频 权重矩阵（CSR），行号对应 content_video_ids
+        self.content_index = IdIndex(arrays['content_video_ids'], arrays.get('content_video_sorter'))
+        self.content_video_ids = self.content_index.ids
+        self.tag_names = arrays['tag_names']
+        self.video_tag = (arrays['video_tag_indptr'], arrays['video_tag_indices'], arrays['video_tag_data'])
+        self.tag_video = (arrays['tag_video_indptr'], arrays['tag_video_indices'], arrays['tag_video_data'])
+
+        # 热门视频（训练集列号，按收藏次数降序）
+        self.popular_videos = arrays['popular_videos']
+        self.popular_counts = arrays['popular_counts']
+
+        self.n_sim_user = int(n_sim_user)
+        self.version = version
+
+    @classmethod
+    def from_arrays(cls, arrays, manifest):
+        return cls(arrays, manifest.get('meta', {}).get('n_sim_user', 0), manifest.get('version', ''))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        return load_model(path, mmap_mode)
+
+    @staticmethod
+    def _gather(csr, rows, weights=None):
+        """取CSR矩阵若干行的 (列号, 值)，weights 不为空时每行乘以对应的权重"""
+        indptr, indices, data = csr
+        if len(rows) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        cols = np.concatenate([indices[indptr[i]:indptr[i + 1]] for i in rows])
+        if weights is None:
+            values = np.concatenate([data[indptr[i]:indptr[i + 1]] for i in rows]).astype(np.float64)
+        else:
+            values = np.concatenate([data[indptr[i]:indptr[i + 1]].astype(np.float64) * w
+                                     for i, w in zip(rows, weights)])
+        return cols.astype(np.int64), values
+
+    def _collaborative_recommend(self, row, watched_cols, N):
+        others, sims = self.neighbors[row], self.sims[row]
+        keep = (others >= 0) & (sims > 0)
+        others, sims = others[keep][:self.n_sim_user], sims[keep][:self.n_sim_user]
+        if others.size == 0:
+            return []
+
+        videos, scores = self._gather((self.indptr, self.indices, self.data), others.tolist(), sims.tolist())
+        keep = ~np.isin(videos, watched_cols)
+        videos, scores = videos[keep], scores[keep]
+        if videos.size == 0:
+            return []
+
+        # 按视频累加得分，同分的按首次出现的先后排列
+        unique, first, inverse = np.unique(videos, return_index=True, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+        if totals.max() > 0:
+            totals = totals / totals.max() * 5.0
+        order = np.lexsort((first, -totals))[:N]
+        return [(int(self.video_ids[j]), score) for j, score in zip(unique[order].tolist(), totals[order].tolist())]
+
+    def _content_recommend(self, watched, N, ratings=None):
+        """
+        基于内容的推荐
+        Args:
+            ratings: 每个视频的交互权重（与 watched 一一对应），为空时按未衰减的收藏权重计算
+        """
+        pos = self.content_index.positions(watched)
+        ratings = np.full(len(pos), DEFAULT_RATING) if ratings is None else np.asarray(ratings, dtype=np.float64)
+        known = pos >= 0
+        watched_rows = pos[known]
+        if watched_rows.size == 0 or N <= 0:
+            return []
+
+        # 用户兴趣标签: 已收藏视频的 标签权重 * 交互权重 之和，除以最大值（与离线的 build_user_profiles 一致）
+        tags, weights = self._gather(self.video_tag, watched_rows.tolist(), ratings[known].tolist())
+        profile = np.bincount(tags, weights=weights, minlength=len(self.tag_names))
+        if profile.max() <= 0:
+            return []
+        profile /= profile.max()
+
+        tag_rows = np.flatnonzero(profile > 0)
+        videos, scores = self._gather(self.tag_video, tag_rows.tolist(), profile[tag_rows].tolist())
+        scores = np.bincount(videos, weights=scores, minlength=len(self.content_video_ids))
+        scores[watched_rows] = 0
+        videos = np.flatnonzero(scores > 0)
+        if videos.size == 0:
+            return []
+        scores = content_scores(scores[videos])
+
+        videos, scores = top_n_ordered(videos, scores, N)
+        return [(int(self.content_video_ids[j]), score) for j, score in zip(videos.tolist(), scores.tolist())]
+
+    def _popular(self, watched_cols, N):
+        # 最多跳过 len(watched_cols) 个已收藏的视频
+        head = self.popular_videos[:N + len(watched_cols)]
+        keep = ~np.isin(head, watched_cols)
+        videos, counts = head[keep][:N], self.popular_counts[:len(head)][keep][:N]
+        if videos.size == 0:
+            return []
+        return [(int(self.video_ids[j]), float(count / counts[0] * 5.0))
+                for j, count in zip(videos.tolist(), counts.tolist())]
+
+    def recommend(self, watched_videos, N=9, user_id=None, ratings=None):
+        """
+        为用户生成推荐
+        Args:
+            watched_videos: 用户当前的收藏，为空时使用训练集中该用户的收藏和交互权重（与离线推荐一致）
+            ratings: 每个视频的交互权重（与 watched_videos 一一对应），用于计算兴趣画像，
+                     应与训练时一样按 interaction_loader 的时间衰减公式计算；为空时按未衰减的收藏权重计算
+        Returns:
+            [(视频ID, 得分)]
+        """
+        row = self.user_index.get(user_id) if user_id is not None else None
+        watched = [int(v) for v in watched_videos]
+        weights = ratings if watched else None
+        if not watched and row is not None:
+            # 训练集中的收藏和交互权重（离线训练时已按时间衰减）
+            lo, hi = self.indptr[row], self.indptr[row + 1]
+            watched = self.video_ids[self.indices[lo:hi]].tolist()
+            weights = self.data[lo:hi]
+
+        # 不在训练集中的用户只使用基于内容的推荐
+        if row is None:
+            return self._content_recommend(watched, N, weights)
+
+        watched_cols = self.video_index.rows(watched)
+        recommendations = dict(self._collaborative_recommend(row, watched_cols, N))
+        for video, score in self._content_recommend(watched, N, weights):
+            if video in recommendations:
+                recommendations[video] = max(recommendations[video], score)
+            else:
+                recommendations[video] = score * 0.5  # 降低内容推荐的权重
+        for video in watched:
+            recommendations.pop(video, None)
+
+        if not recommendations:
+            return self._popular(watched_cols, N)
+        return sorted(recommendations.items(), key=lambda x: x[1], reverse=True)[:N]
+
+
+MODEL_TYPES = {
+    ItemNeighborIndex.model_type: ItemNeighborIndex,
+    FactorModel.model_type: FactorModel,
+    HybridModel.model_type: HybridModel,
+}
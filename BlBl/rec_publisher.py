@@ -0,0 +1,244 @@
+"""
+推荐结果发布
+新的推荐结果先写入暂存表，写完校验后用一条 RENAME TABLE 原子地替换线上的 myapp_rec，
+推荐页面在整个过程中只会读到完整的旧版本或新版本，不会读到空表或写了一半的数据；
+替换下来的旧版本保留在 myapp_rec_prev 中，可随时回滚
+增量更新（incremental_update）通过 update_user_recommendations 在线上当前版本中重写部分用户，
+写入的记录沿用该版本的 created_at；回滚时这些修改随当前版本一起撤下，
+之后线上版本与增量检查点记录的版本不一致，增量更新会拒绝写入，由全量计算重新发布
+暂存表按线上表的 SHOW CREATE TABLE 建立（CREATE TABLE ... LIKE 不会复制外键），
+替换后线上表仍带有 Rec 模型声明的 user_id、video_id 外键；外键都是 ON DELETE CASCADE，
+Django 的级联删除只处理线上表，删除用户或视频时数据库同时删除 myapp_rec_prev 中引用它们的记录
+"""
+import re
+from datetime import datetime, timedelta
+
+REC_TABLE = 'myapp_rec'
+STAGING_TABLE = 'myapp_rec_staging'
+PREVIOUS_TABLE = 'myapp_rec_prev'
+
+# Rec 模型（myapp/migrations/0008_rec.py）声明的外键: (列, 引用表, 引用列)
+REC_FOREIGN_KEYS = (('user_id', 'users', 'id'), ('video_id', 'study_clean', 'id'))
+MAX_IDENTIFIER_LENGTH = 64  # MySQL 标识符长度上限
+# 外键定义及其删除规则
+FOREIGN_KEY_RE = re.compile(
+    r"(FOREIGN KEY \(`[^`]+`\) REFERENCES `[^`]+` \(`[^`]+`\))(?: ON DELETE (?:RESTRICT|CASCADE|SET NULL|NO ACTION))?")
+
+
+def _constraint_name(name, suffix):
+    """约束名在整个数据库内唯一，去掉上一次发布加的后缀后加上本次的后缀"""
+    base = re.sub(r'_v\d+$', '', name)
+    return base[:MAX_IDENTIFIER_LENGTH - len(suffix) - 2] + '_v' + suffix
+
+
+def staging_table_sql(create_sql, suffix):
+    """
+    把线上表的建表语句（SHOW CREATE TABLE 的结果）改写为暂存表的建表语句
+    Args:
+        create_sql: 线上推荐表的建表语句
+        suffix: 本次发布的约束名后缀，暂存表的外键不能与线上表、上一版本表的外键重名
+    Returns:
+        建表语句，缺少的模型外键也会补上（之前用 CREATE TABLE ... LIKE 发布过的线上表没有外键）
+    """
+    sql = create_sql.replace(f"CREATE TABLE `{REC_TABLE}`", f"CREATE TABLE `{STAGING_TABLE}`", 1)
+    sql = re.sub(r"CONSTRAINT `([^`]+)`", lambda m: f"CONSTRAINT `{_constraint_name(m.group(1), suffix)}`", sql)
+    # 原有的删除规则（默认 RESTRICT）统一改为级联删除
+    sql = FOREIGN_KEY_RE.sub(r"\1 ON DELETE CASCADE", sql)
+
+    missing = [
+        f"  CONSTRAINT `{_constraint_name(f'{REC_TABLE}_{column}_fk_{table}_{ref}', suffix)}` "
+        f"FOREIGN KEY (`{column}`) REFERENCES `{table}` (`{ref}`) ON DELETE CASCADE"
+        for column, table, ref in REC_FOREIGN_KEYS
+        if not re.search(rf"FOREIGN KEY \(`{column}`\)", sql)
+    ]
+    if missing:
+        # 插在列/索引定义的右括号之前
+        head, tail = sql.rsplit(')', 1)
+        sql = head.rstrip() + ',\n' + ',\n'.join(missing) + '\n)' + tail
+    return sql
+
+
+def _foreign_keys(cursor, table):
+    """表上的外键 {列: (约束名, 删除规则)}"""
+    cursor.execute("""
+        SELECT k.COLUMN_NAME, k.CONSTRAINT_NAME, r.DELETE_RULE
+        FROM information_schema.KEY_COLUMN_USAGE k
+        JOIN information_schema.REFERENTIAL_CONSTRAINTS r
+          ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA AND r.TABLE_NAME = k.TABLE_NAME
+         AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME
+        WHERE k.TABLE_SCHEMA = DATABASE() AND k.TABLE_NAME = %s AND k.REFERENCED_TABLE_NAME IS NOT NULL
+    """, (table,))
+    return {column: (name, rule) for column, name, rule in cursor.fetchall()}
+
+
+def publish_recommendations(db_connection, all_recommendations, batch_size=5000):
+    """
+    把推荐结果写入暂存表并原子替换线上推荐表
+    Args:
+        all_recommendations: [(user_id, video_id, score)]
+        batch_size: 每条INSERT语句写入的记录数
+    Returns:
+        本次发布的版本（推荐记录的 created_at），未发布时返回None
+    """
+    if not all_recommendations:
+        print("没有推荐结果，保留线上推荐表不变")
+        return None
+
+    # 同一批推荐使用同一个创建时间，作为这一版推荐结果的版本号（created_at 是 datetime(6)，保留微秒）；
+    # 版本必须比线上版本新，否则增量更新和回滚无法区分两个版本
+    version = datetime.now()
+    live_version = current_version(db_connection)
+    if live_version is not None and version <= live_version:
+        version = live_version + timedelta(microseconds=1)
+    rows = [(user_id, video_id, score, version) for user_id, video_id, score in all_recommendations]
+
+    # VALUES 中只有占位符时，pymysql 的 executemany 会把整批记录合并成一条多行INSERT
+    insert_sql = f"""
+        INSERT INTO {STAGING_TABLE} (user_id, video_id, score, created_at)
+        VALUES (%s, %s, %s, %s)
+    """
+
+    cursor = db_connection.cursor()
+    try:
+        # 1. 按线上表结构（包括外键）新建暂存表
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        cursor.execute(f"SHOW CREATE TABLE {REC_TABLE}")
+        create_sql = cursor.fetchone()[1]
+        cursor.execute(staging_table_sql(create_sql, datetime.now().strftime('%Y%m%d%H%M%S%f')))
+
+        # 2. 分批写入暂存表
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(insert_sql, rows[start:start + batch_size])
+        db_connection.commit()
+
+        # 3. 校验暂存表，条数不对时不替换线上表
+        cursor.execute(f"SELECT COUNT(*) FROM {STAGING_TABLE}")
+        staged_count = cursor.fetchone()[0]
+        if staged_count != len(rows):
+            raise RuntimeError(f"暂存表记录数 {staged_count} 与待写入记录数 {len(rows)} 不一致")
+        staged_keys = _foreign_keys(cursor, STAGING_TABLE)
+        missing_keys = [column for column, _, _ in REC_FOREIGN_KEYS
+                        if staged_keys.get(column, (None, None))[1] != 'CASCADE']
+        if missing_keys:
+            raise RuntimeError(f"暂存表缺少级联删除的外键: {', '.join(missing_keys)}")
+
+        # 4. 原子替换: 一条 RENAME TABLE 同时完成旧表归档和新表上线
+        cursor.execute(f"DROP TABLE IF EXISTS {PREVIOUS_TABLE}")
+        cursor.execute(
+            f"RENAME TABLE {REC_TABLE} TO {PREVIOUS_TABLE}, {STAGING_TABLE} TO {REC_TABLE}"
+        )
+        # 修复前发布的旧表外键不是级联删除，会挡住用户/视频的删除，去掉这些外键（下次发布时补上）
+        for name, rule in _foreign_keys(cursor, PREVIOUS_TABLE).values():
+            if rule != 'CASCADE':
+                cursor.execute(f"ALTER TABLE {PREVIOUS_TABLE} DROP FOREIGN KEY `{name}`")
+        print(f"已发布推荐结果版本 {version:%Y-%m-%d %H:%M:%S.%f}，共 {len(rows)} 条记录")
+        return version
+
+    except Exception as e:
+        print(f"发布推荐结果失败，线上推荐表保持不变: {e}")
+        db_connection.rollback()
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        raise
+    finally:
+        cursor.close()
+
+
+def current_version(db_connection):
+    """线上推荐表当前的版本（所有记录共同的 created_at），表为空时返回None"""
+    cursor = db_connection.cursor()
+    try:
+        cursor.execute(f"SELECT MAX(created_at) FROM {REC_TABLE}")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+
+
+def update_user_recommendations(db_connection, version, user_recommendations):
+    """
+    在线上当前版本中重写部分用户的推荐（增量更新使用）
+    Args:
+        version: 增量更新所基于的版本（上一次全量发布时 publish_recommendations 的返回值）
+        user_recommendations: {user_id: [(video_id, score)]}
+    Raises:
+        RuntimeError: 线上版本已经不是 version（之后重新发布或回滚过），不写入任何记录
+    """
+    if not user_recommendations:
+        return
+    if version is None:
+        raise RuntimeError("没有已发布的推荐版本，需要全量计算")
+
+    user_ids = [int(user) for user in user_recommendations]
+    rows = [(int(user), int(video), float(score), version)
+            for user, recommendations in user_recommendations.items()
+            for video, score in recommendations]
+
+    cursor = db_connection.cursor()
+    try:
+        # 同一事务内先确认版本: 读表后持有元数据锁，提交前 RENAME TABLE 不会换掉这张表
+        cursor.execute(f"SELECT MAX(created_at) FROM {REC_TABLE}")
+        live_version = cursor.fetchone()[0]
+        if live_version != version:
+            raise RuntimeError(f"线上推荐版本 {live_version} 与增量检查点的版本 {version} 不一致，需要全量计算")
+
+        cursor.execute(
+            f"DELETE FROM {REC_TABLE} WHERE user_id IN (" + ", ".join(["%s"] * len(user_ids)) + ")",
+            user_ids
+        )
+        if rows:
+            cursor.executemany(f"""
+                INSERT INTO {REC_TABLE} (user_id, video_id, score, created_at)
+                VALUES (%s, %s, %s, %s)
+            """, rows)
+        db_connection.commit()
+        print(f"已在版本 {version:%Y-%m-%d %H:%M:%S.%f} 中重写 {len(user_ids)} 个用户的推荐，共 {len(rows)} 条记录")
+    except Exception:
+        db_connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def rollback_recommendations(db_connection):
+    """
+    回滚到上一版推荐结果（与当前版本互换，再次调用即可恢复）
+    在当前版本上做过的增量修改随当前版本一起撤下；增量检查点记录的仍是当前版本，
+    下一次增量更新会发现版本不一致并改为全量计算
+    """
+    cursor = db_connection.cursor()
+    try:
+        cursor.execute("SHOW TABLES LIKE %s", (PREVIOUS_TABLE,))
+        if cursor.fetchone() is None:
+            print("没有可回滚的历史版本")
+            return False
+
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        cursor.execute(
+            f"RENAME TABLE {REC_TABLE} TO {STAGING_TABLE}, "
+            f"{PREVIOUS_TABLE} TO {REC_TABLE}, "
+            f"{STAGING_TABLE} TO {PREVIOUS_TABLE}"
+        )
+        print("已回滚到上一版推荐结果（该版本之后的增量更新已一并撤下，下一次增量更新将执行全量计算）")
+        return True
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    # python rec_publisher.py rollback 回滚到上一版推荐结果
+    import sys
+
+    import pymysql
+
+    if sys.argv[1:] == ['rollback']:
+        db = pymysql.connect(
+            host="localhost",
+            user='root',
+            password='li974521',
+            database='bill_video',
+            charset='utf8'
+        )
+        rollback_recommendations(db)
+        db.close()
+    else:
+        print("用法: python rec_publisher.py rollback")
@@ -4,32 +4,109 @@
 """
 import csv
 import random
+import sys
 import pymysql
 import math
+import numpy as np
+import multiprocessing
+import os
+import time
 from collections import defaultdict
 from operator import itemgetter
 from datetime import datetime
 
+from interaction_loader import load_weighted_interactions
+from interaction_store import InteractionStore, InteractionStoreBuilder
+from popularity import PopularityIndex
+from rec_models import SCORE_DECIMALS, HybridModel, save_artifact
+from rec_publisher import publish_recommendations
+from topk_neighbors import TopKNeighbors
+
+# 可选模块分别导入，某一个不可用时只关闭对应的功能
+try:
+    import sparse_similarity
+    from scipy import sparse
+except ImportError:
+    sparse_similarity = None
+    sparse = None
+
+try:
+    from ann_index import RandomProjectionIndex, normalize_rows
+except ImportError:
+    RandomProjectionIndex = None
+
+try:
+    from minhash_lsh import MinHashLSH
+except ImportError:
+    MinHashLSH = None
+
+try:
+    from content_engine import ContentEngine
+except ImportError:
+    ContentEngine = None
+
+try:
+    from incremental_update import IncrementalUpdater
+except ImportError:
+    IncrementalUpdater = None
+
 
 class UserBasedCF():
-    def __init__(self, n_sim_user=0, n_rec_video=9):
+    def __init__(self, n_sim_user=0, n_rec_video=9, sim_backend='sparse', behavior_backend='exact'):
         self.n_sim_user = n_sim_user
         self.n_rec_video = n_rec_video
 
+        # 相似度计算方式: 'sparse' 使用SciPy稀疏矩阵, 'python' 使用逐对循环,
+        # 'ann' 先用用户向量（收藏+兴趣画像）的近似最近邻索引找候选用户，只对候选用户计算相似度（用户很多时使用）
+        # 行为相似度: 'exact' 计算全部用户对的Jaccard, 'minhash' 只对 MinHash+LSH 找出的候选用户对计算
+        # （候选之外的用户对不再作为相似用户，只是兴趣画像相近、几乎没有共同收藏的用户会被漏掉）
+        # 两种方式都是找候选用户，不能同时使用
+        if sim_backend == 'ann' and behavior_backend == 'minhash':
+            raise ValueError("sim_backend='ann' 不能与 behavior_backend='minhash' 同时使用，"
+                             "请改用 sim_backend='sparse' 搭配 minhash")
+        if sim_backend == 'ann' and RandomProjectionIndex is None:
+            print("无法导入ann_index，相似度计算回退为sparse实现")
+            sim_backend = 'sparse'
+        if sim_backend in ('sparse', 'ann') and sparse_similarity is None:
+            print("未安装scipy，相似度计算回退为python实现")
+            sim_backend = 'python'
+        self.sim_backend = sim_backend
+
+        if behavior_backend == 'minhash' and (MinHashLSH is None or sparse is None):
+            if sparse is None:
+                print("未安装scipy，行为相似度回退为精确计算")
+            else:
+                print("无法导入minhash_lsh，行为相似度回退为精确计算")
+            behavior_backend = 'exact'
+        self.behavior_backend = behavior_backend
+        self.minhash_threshold = 0.2  # LSH分段的Jaccard阈值，高于它的用户对大概率成为候选
+        self.minhash_perm = 128       # MinHash签名长度
+
         # 数据存储
-        self.trainSet = {}  # {user_id: {video_id: rating}}
+        self.trainSet = {}  # {user_id: {video_id: rating}}，加载后为 InteractionStore
         self.testSet = {}   # {user_id: {video_id: rating}}
-        self.user_sim_matrix = {}  # {user_id: {other_user_id: similarity}}
+        # 每个用户只保留前K个相似用户（至少保留5个用于相似用户分析输出）
+        self.n_keep_sim = max(self.n_sim_user, 5)
+        self.user_sim_matrix = TopKNeighbors([], self.n_keep_sim)  # 兼容 {user_id: {other_user_id: similarity}}
+        self.user_ann = None  # 用户向量的近似最近邻索引（sim_backend='ann'）
 
         # 新增：视频标签/分类信息
         self.video_tags = {}  # {video_id: {tag: weight}}
         self.user_profiles = {}  # {user_id: {tag: weight}}
+        self._content = None  # ContentEngine，视频标签或训练集变化后重建
+        self._popularity = None  # PopularityIndex，训练集变化后重建
+
+        # 是否输出每个用户的推荐详情（多进程批量生成时关闭）
+        self.verbose = True
+
+        # 最近一次保存的推荐结果，增量更新时用于判断哪些用户的推荐发生了变化
+        self.last_recommendations = {}  # {user_id: [(video_id, score)]}
 
         print(f'相似用户数 = {self.n_sim_user}')
         print(f'推荐视频数 = {self.n_rec_video}')
 
-    def load_video_tags(self, db_connection):
-        """加载视频标签信息"""
+    def load_video_tags(self, db_connection, video_ids=None):
+        """加载视频标签信息（video_ids 不为空时只加载这些视频）"""
         print("加载视频标签信息...")
         try:
             cursor = db_connection.cursor()
@@ -40,40 +117,16 @@ class UserBasedCF():
             FROM study_clean 
             WHERE category IS NOT NULL
             """
-            cursor.execute(query)
-
-            for video_id, category, video_type, title in cursor.fetchall():
-                video_id = str(video_id)
-                self.video_tags[video_id] = {}
-
-                # 添加类别作为标签
-                if category:
-                    # 将类别转换为多个标签
-                    categories = str(category).split('/')
-                    for cat in categories:
-                        cat = cat.strip()
-                        if cat:
-                            self.video_tags[video_id][cat] = 1.0
-
-                # 添加子类别作为标签
-                if video_type:
-                    subcategories = str(video_type).split('/')
-                    for subcat in subcategories:
-                        subcat = subcat.strip()
-                        if subcat:
-                            self.video_tags[video_id][subcat] = 0.8
-
-                # 从标题中提取关键词
-                if title:
-                    title = str(title).lower()
-                    # 检查是否是Python相关
-                    if 'python' in title or 'pandas' in title or 'numpy' in title:
-                        self.video_tags[video_id]['python'] = 1.0
-                        self.video_tags[video_id]['编程'] = 0.8
-                    # 检查是否是二次元相关
-                    elif '二次元' in title or '动漫' in title or '漫展' in title or 'cos' in title:
-                        self.video_tags[video_id]['二次元'] = 1.0
-                        self.video_tags[video_id]['动漫'] = 0.8
+            params = ()
+            if video_ids is not None:
+                video_ids = [int(video_id) for video_id in video_ids]
+                if not video_ids:
+                    cursor.close()
+                    return
+                query += " AND id IN (" + ", ".join(["%s"] * len(video_ids)) + ")"
+                params = tuple(video_ids)
+            cursor.execute(query, params)
+            self.set_video_tags(cursor.fetchall())
 
             print(f"已加载 {len(self.video_tags)} 个视频的标签信息")
             cursor.close()
@@ -83,17 +136,71 @@ class UserBasedCF():
             import traceback
             traceback.print_exc()
 
-    def build_user_profiles(self):
-        """构建用户兴趣画像"""
+    def set_video_tags(self, rows):
+        """根据 study_clean 的 (id, category, video_type, title) 记录生成视频标签"""
+        self._content = None
+        for video_id, category, video_type, title in rows:
+            video_id = str(video_id)
+            self.video_tags[video_id] = {}
+
+            # 添加类别作为标签
+            if category:
+                # 将类别转换为多个标签
+                categories = str(category).split('/')
+                for cat in categories:
+                    cat = cat.strip()
+                    if cat:
+                        self.video_tags[video_id][cat] = 1.0
+
+            # 添加子类别作为标签
+            if video_type:
+                subcategories = str(video_type).split('/')
+                for subcat in subcategories:
+                    subcat = subcat.strip()
+                    if subcat:
+                        self.video_tags[video_id][subcat] = 0.8
+
+            # 从标题中提取关键词
+            if title:
+                title = str(title).lower()
+                # 检查是否是Python相关
+                if 'python' in title or 'pandas' in title or 'numpy' in title:
+                    self.video_tags[video_id]['python'] = 1.0
+                    self.video_tags[video_id]['编程'] = 0.8
+                # 检查是否是二次元相关
+                elif '二次元' in title or '动漫' in title or '漫展' in title or 'cos' in title:
+                    self.video_tags[video_id]['二次元'] = 1.0
+                    self.video_tags[video_id]['动漫'] = 0.8
+
+    def build_user_profiles(self, users=None):
+        """构建用户兴趣画像（users 不为空时只重建这些用户）"""
         print("构建用户兴趣画像...")
-        for user_id, videos in self.trainSet.items():
+        store = self._train_store()
+        video_keys = store.video_keys
+        if users is None:
+            users = store.user_keys
+
+        # 有scipy时用矩阵乘法一次算出全部用户的画像
+        self._content = None
+        content = self._content_engine()
+
+        for user_id in users:
+            if content is not None:
+                self.user_profiles[user_id] = content.profile_dict(user_id)
+                self._print_user_profile(user_id)
+                continue
+
             user_profile = defaultdict(float)
 
-            for video_id, rating in videos.items():
-                if video_id in self.video_tags:
-                    for tag, weight in self.video_tags[video_id].items():
-                        # 用户兴趣 = 标签权重 * 评分
-                        user_profile[tag] += weight * rating
+            i = store.user_index.get(user_id)
+            if i is not None:
+                videos, ratings = store.row(i)
+                for j, rating in zip(videos.tolist(), ratings.tolist()):
+                    video_id = video_keys[j]
+                    if video_id in self.video_tags:
+                        for tag, weight in self.video_tags[video_id].items():
+                            # 用户兴趣 = 标签权重 * 评分
+                            user_profile[tag] += weight * rating
 
             # 归一化
             if user_profile:
@@ -102,18 +209,33 @@ class UserBasedCF():
                     user_profile[tag] /= max_weight
 
             self.user_profiles[user_id] = user_profile
-
-            # 显示用户兴趣
-            if user_id in ['25', '27']:
-                print(f"\n用户{user_id}的兴趣标签:")
-                sorted_tags = sorted(user_profile.items(), key=lambda x: x[1], reverse=True)[:5]
-                for tag, weight in sorted_tags:
-                    print(f"  {tag}: {weight:.3f}")
+            self._print_user_profile(user_id)
+
+    def _print_user_profile(self, user_id):
+        """显示用户兴趣"""
+        if user_id in ['25', '27']:
+            print(f"\n用户{user_id}的兴趣标签:")
+            sorted_tags = sorted(self.user_profiles[user_id].items(), key=lambda x: x[1], reverse=True)[:5]
+            for tag, weight in sorted_tags:
+                print(f"  {tag}: {weight:.3f}")
+
+    def _content_engine(self):
+        """返回基于内容推荐的矩阵引擎（没有scipy或没有视频标签时返回None）"""
+        if self._content is None and ContentEngine is not None and self.video_tags:
+            self._content = ContentEngine(self.video_tags, self._train_store())
+        return self._content
+
+    def _popularity_index(self):
+        """返回热门视频索引（训练集被替换后重建）"""
+        store = self._train_store()
+        if self._popularity is None or self._popularity.source is not store:
+            self._popularity = PopularityIndex(store)
+        return self._popularity
 
     def get_dataset(self, filename, pivot=0.85):
         """从CSV文件加载数据集"""
-        trainSet_len = 0
-        testSet_len = 0
+        train = InteractionStoreBuilder()
+        test = InteractionStoreBuilder()
 
         for line in self.load_file(filename):
             try:
@@ -129,22 +251,39 @@ class UserBasedCF():
                     continue
 
                 if random.random() < pivot:
-                    self.trainSet.setdefault(user, {})
-                    self.trainSet[user][video] = int(rating)
-                    trainSet_len += 1
+                    train.add(user, video, int(rating))
                 else:
-                    self.testSet.setdefault(user, {})
-                    self.testSet[user][video] = int(rating)
-                    testSet_len += 1
+                    test.add(user, video, int(rating))
 
             except Exception as e:
                 print(f"解析行时出错: {line}, 错误: {e}")
                 continue
 
+        self.trainSet = train.build()
+        self.testSet = test.build()
+        self._content = None
+        trainSet_len = len(train)
+        testSet_len = len(test)
+
         print('训练集和测试集划分成功!')
         print(f'训练集大小 = {trainSet_len}, 用户数: {len(self.trainSet)}')
         print(f'测试集大小 = {testSet_len}, 用户数: {len(self.testSet)}')
 
+    def load_dataset(self, data, pivot=0.85, seed=None):
+        """
+        从 InteractionData 加载数据集（数据库直接加载，不经过 rating.csv）
+        Args:
+            data: interaction_loader.InteractionData
+        """
+        train, test = data.split(pivot, seed)
+        self.trainSet = train.to_store()
+        self.testSet = test.to_store()
+        self._content = None
+
+        print('训练集和测试集划分成功!')
+        print(f'训练集大小 = {len(train)}, 用户数: {len(self.trainSet)}')
+        print(f'测试集大小 = {len(test)}, 用户数: {len(self.testSet)}')
+
     def load_file(self, filename):
         """加载CSV文件"""
         try:
@@ -162,9 +301,21 @@ class UserBasedCF():
         if not self.trainSet:
             print("训练集为空，无法计算相似度")
             return
+        self._train_store()
 
         print("计算用户相似度（结合行为相似度和内容相似度）...")
 
+        if self.sim_backend in ('sparse', 'ann'):
+            if self.behavior_backend == 'minhash':
+                self._calc_user_sim_minhash()
+            elif self.sim_backend == 'ann':
+                self._calc_user_sim_ann()
+            else:
+                self._calc_user_sim_sparse()
+            print("相似度计算完成!")
+            self._print_similar_users(['25', '27'])
+            return
+
         # 1. 基于行为的相似度
         print("计算行为相似度...")
         behavior_sim = self._calc_behavior_similarity()
@@ -175,8 +326,9 @@ class UserBasedCF():
 
         # 3. 合并相似度
         print("合并相似度...")
+        self.user_sim_matrix = TopKNeighbors(self.trainSet.keys(), self.n_keep_sim)
         for user1 in self.trainSet:
-            self.user_sim_matrix[user1] = {}
+            row = {}
 
             for user2 in self.trainSet:
                 if user1 == user2:
@@ -191,15 +343,108 @@ class UserBasedCF():
 
                 total_sim = w1 * sim1 + w2 * sim2
                 if total_sim > 0:
-                    self.user_sim_matrix[user1][user2] = total_sim
+                    row[user2] = total_sim
+
+            self.user_sim_matrix.set_user(user1, row)
 
         print("相似度计算完成!")
 
         # 输出用户25和27的相似用户
         self._print_similar_users(['25', '27'])
 
+    def _calc_user_sim_sparse(self, w1=0.7, w2=0.3):
+        """使用稀疏矩阵计算用户相似度（结果与逐对循环版本一致）"""
+        users = self.trainSet.user_keys
+
+        # 用户×视频 二值矩阵（Jaccard） + 用户×标签 权重矩阵（余弦）
+        print("构建用户×视频、用户×标签稀疏矩阵...")
+        user_video = self.trainSet.to_csr(binary=True)
+        user_tag, _ = sparse_similarity.build_csr_matrix(self.user_profiles, users)
+
+        # 分块计算合并后的相似度，每块逐行保留Top-K
+        print("分块计算合并相似度并保留Top-K邻居...")
+        self.user_sim_matrix = TopKNeighbors(users, self.n_keep_sim)
+        for start, block in sparse_similarity.iter_combined_similarity(user_video, user_tag, w1, w2):
+            self.user_sim_matrix.add_sparse_block(start, block)
+        print(f"相似用户存储占用 {self.user_sim_matrix.nbytes() / 1024:.1f} KB")
+
+    def _calc_user_sim_ann(self, w1=0.7, w2=0.3, n_candidates=None, n_tables=16, n_bits=None, block_size=1024):
+        """
+        近似计算用户相似度: 把每个用户的收藏视频、兴趣画像各自归一化后按 sqrt(w1)、sqrt(w2) 拼成一个向量，
+        两个用户向量的余弦 = w1*收藏余弦 + w2*画像余弦，与合并相似度很接近，
+        用它的LSH索引为每个用户找出候选用户，只对候选精确计算 w1*Jaccard + w2*内容相似度，不再计算全部用户对
+        相似用户的余弦一般只有0.5左右，每张表的位数不能太多，默认约为 log2(用户数) - 4，平均每个桶十几个用户
+        """
+        users = self.trainSet.user_keys
+        n_candidates = n_candidates or max(50, 4 * self.n_keep_sim)
+        n_bits = n_bits or max(6, int(np.log2(max(len(users), 1))) - 4)
+
+        print("构建用户向量的近似最近邻索引...")
+        user_video = self.trainSet.to_csr(binary=True)
+        user_tag, _ = sparse_similarity.build_csr_matrix(self.user_profiles, users)
+        user_tag = normalize_rows(user_tag)
+        embedding = sparse.hstack([np.sqrt(w1) * normalize_rows(user_video), np.sqrt(w2) * user_tag], format='csr')
+        self.user_ann = RandomProjectionIndex(n_tables, n_bits).build(embedding)
+        sizes = np.diff(user_video.indptr)
+
+        print(f"为每个用户查询 {n_candidates} 个候选用户并计算相似度...")
+        self.user_sim_matrix = TopKNeighbors(users, self.n_keep_sim)
+        for start in range(0, len(users), block_size):
+            stop = min(start + block_size, len(users))
+            found = [self.user_ann.query_row(i, n_candidates)[0] for i in range(start, stop)]
+            counts = [len(others) for others in found]
+            if not sum(counts):
+                continue
+            rows = np.repeat(np.arange(start, stop), counts)
+            others = np.concatenate(found)
+
+            # 候选用户对的Jaccard相似度: 共同收藏数 / (收藏数之和 - 共同收藏数)，画像余弦为归一化后的点积
+            common = np.asarray(user_video[rows].multiply(user_video[others]).sum(axis=1)).ravel()
+            jaccard = common / (sizes[rows] + sizes[others] - common)
+            cosine = np.asarray(user_tag[rows].multiply(user_tag[others]).sum(axis=1)).ravel()
+            total = w1 * jaccard + w2 * cosine
+
+            offset = 0
+            for i, count in zip(range(start, stop), counts):
+                self.user_sim_matrix.set_row(i, zip(total[offset:offset + count].tolist(),
+                                                    others[offset:offset + count].tolist()))
+                offset += count
+        print(f"相似用户存储占用 {self.user_sim_matrix.nbytes() / 1024:.1f} KB")
+
+    def _minhash_pairs(self, user_video):
+        """MinHash+LSH 找出候选用户对并精确计算Jaccard，返回 (行号数组, 行号数组, 相似度数组)"""
+        lsh = MinHashLSH(self.minhash_perm, self.minhash_threshold)
+        print(f"MinHash签名 + LSH分段（{lsh.bands}段×{lsh.rows}个值）生成候选用户对...")
+        i, j, sim = lsh.similar_pairs(user_video)
+        n_users = user_video.shape[0]
+        print(f"候选用户对 {len(i)} 个（全部用户对 {n_users * (n_users - 1) // 2} 个）")
+        return i, j, sim
+
+    def _calc_user_sim_minhash(self, w1=0.7, w2=0.3):
+        """只对MinHash候选用户对计算 w1*行为相似度 + w2*内容相似度"""
+        users = self.trainSet.user_keys
+        user_video = self.trainSet.to_csr(binary=True)
+        user_tag, _ = sparse_similarity.build_csr_matrix(self.user_profiles, users)
+        i, j, jaccard = self._minhash_pairs(user_video)
+        total = w1 * jaccard + w2 * sparse_similarity.pair_cosine(user_tag, i, j)
+
+        # 候选对是 i < j 的无序对，两个方向都加入后逐行保留Top-K
+        combined = sparse.csr_matrix((np.r_[total, total], (np.r_[i, j], np.r_[j, i])), shape=(len(users), len(users)))
+        self.user_sim_matrix = TopKNeighbors(users, self.n_keep_sim)
+        self.user_sim_matrix.add_sparse_block(0, combined)
+        print(f"相似用户存储占用 {self.user_sim_matrix.nbytes() / 1024:.1f} KB")
+
     def _calc_behavior_similarity(self):
         """计算基于行为的相似度（共同观看）"""
+        if self.behavior_backend == 'minhash':
+            users = self.trainSet.user_keys
+            behavior_sim = {user: {} for user in users}
+            i, j, sim = self._minhash_pairs(self.trainSet.to_csr(binary=True))
+            for a, b, value in zip(i.tolist(), j.tolist(), sim.tolist()):
+                behavior_sim[users[a]][users[b]] = value
+                behavior_sim[users[b]][users[a]] = value
+            return behavior_sim
+
         behavior_sim = {}
 
         # 构建视频-用户倒排表
@@ -276,8 +521,7 @@ class UserBasedCF():
 
         for user in target_users:
             if user in self.user_sim_matrix:
-                similar_users = sorted(self.user_sim_matrix[user].items(),
-                                     key=lambda x: x[1], reverse=True)[:5]
+                similar_users = self.user_sim_matrix.neighbors_of(user)[:5]
 
                 if similar_users:
                     print(f"\n用户{user}的最相似用户:")
@@ -312,21 +556,31 @@ class UserBasedCF():
 
         return list(common_tags)
 
+    def _train_store(self):
+        """训练集统一转换为 InteractionStore（兼容直接赋值为嵌套字典的用法）"""
+        if not isinstance(self.trainSet, InteractionStore):
+            self.trainSet = InteractionStore.from_dict(self.trainSet)
+        return self.trainSet
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
     def recommend_for_user(self, user):
         """为用户生成推荐（混合方法）"""
         K = self.n_sim_user
         N = self.n_rec_video
 
-        print(f"\n{'='*50}")
-        print(f"为用户{user}生成推荐:")
-        print('='*50)
+        self._log(f"\n{'='*50}")
+        self._log(f"为用户{user}生成推荐:")
+        self._log('='*50)
 
         if user not in self.trainSet:
-            print("  用户不在训练集中，使用基于内容的推荐")
+            self._log("  用户不在训练集中，使用基于内容的推荐")
             return self._content_based_recommend(user, N)
 
         watched_videos = set(self.trainSet[user].keys())
-        print(f"  已观看视频数: {len(watched_videos)}")
+        self._log(f"  已观看视频数: {len(watched_videos)}")
 
         # 方法1: 基于协同过滤的推荐
         cf_recommendations = self._collaborative_recommend(user, watched_videos, K, N)
@@ -353,7 +607,7 @@ class UserBasedCF():
             all_recommendations.pop(video, None)
 
         if not all_recommendations:
-            print("  没有生成推荐，使用热门视频后备")
+            self._log("  没有生成推荐，使用热门视频后备")
             return self._get_popular_videos(watched_videos, N)
 
         # 按得分排序
@@ -364,56 +618,57 @@ class UserBasedCF():
         recommendations = sorted_recommendations[:N]
 
         # 显示推荐详情
-        print(f"  生成 {len(recommendations)} 个推荐:")
-        for video, score in recommendations:
-            tags = self._get_video_tags(video)
-            print(f"    视频{video}: 得分={score:.3f}, 标签={tags}")
+        if self.verbose:
+            print(f"  生成 {len(recommendations)} 个推荐:")
+            for video, score in recommendations:
+                tags = self._get_video_tags(video)
+                print(f"    视频{video}: 得分={score:.3f}, 标签={tags}")
 
         return recommendations
 
     def _collaborative_recommend(self, user, watched_videos, K, N):
         """基于协同过滤的推荐"""
-        if user not in self.user_sim_matrix or not self.user_sim_matrix[user]:
-            return []
-
-        # 获取最相似的K个用户
-        similar_users = []
-        for other_user, sim in self.user_sim_matrix[user].items():
-            if sim > 0 and other_user in self.trainSet:
-                similar_users.append((other_user, sim))
+        # 获取最相似的K个用户（Top-K存储中已按相似度降序排列）
+        similar_users = [(other_user, sim) for other_user, sim in self.user_sim_matrix.neighbors_of(user)
+                         if sim > 0 and other_user in self.trainSet][:K]
 
         if not similar_users:
             return []
 
-        # 按相似度排序
-        similar_users.sort(key=lambda x: x[1], reverse=True)
-        similar_users = similar_users[:K]
-
-        print(f"  找到 {len(similar_users)} 个相似用户:")
-        for other_user, sim in similar_users[:3]:  # 显示前3个
-            print(f"    用户{other_user}: 相似度={sim:.3f}")
-
-        # 收集候选视频
-        candidate_videos = defaultdict(float)
-
-        for other_user, similarity in similar_users:
-            for video, rating in self.trainSet[other_user].items():
-                if video in watched_videos:
-                    continue
+        if self.verbose:
+            print(f"  找到 {len(similar_users)} 个相似用户:")
+            for other_user, sim in similar_users[:3]:  # 显示前3个
+                print(f"    用户{other_user}: 相似度={sim:.3f}")
+
+        # 收集候选视频: 相似用户收藏的视频，得分 = 相似度 * 评分
+        store = self._train_store()
+        rows = [store.user_index[other_user] for other_user, _ in similar_users]
+        videos = np.concatenate([store.row(i)[0] for i in rows])
+        scores = np.concatenate([store.row(i)[1] * similarity for i, (_, similarity) in zip(rows, similar_users)])
+
+        watched = [store.video_index[video] for video in watched_videos if video in store.video_index]
+        keep = ~np.isin(videos, watched)
+        videos, scores = videos[keep], scores[keep]
+        if videos.size == 0:
+            return []
 
-                # 计算得分
-                candidate_videos[video] += similarity * rating
+        return self._rank_videos(store, videos, scores, N)
 
-        if not candidate_videos:
-            return []
+    @staticmethod
+    def _rank_videos(store, videos, scores, N):
+        """
+        按视频累加得分，归一化到0-5分后取前N个
+        同分的视频按首次出现的先后排列（与按字典累加再排序的结果一致）
+        """
+        unique, first, inverse = np.unique(videos, return_index=True, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
 
-        # 归一化得分
-        max_score = max(candidate_videos.values())
+        max_score = totals.max()
         if max_score > 0:
-            for video in candidate_videos:
-                candidate_videos[video] = (candidate_videos[video] / max_score) * 5.0
+            totals = totals / max_score * 5.0
 
-        return sorted(candidate_videos.items(), key=lambda x: x[1], reverse=True)[:N]
+        order = np.lexsort((first, -totals))[:N]
+        return [(store.video_keys[j], score) for j, score in zip(unique[order].tolist(), totals[order].tolist())]
 
     def _content_based_recommend(self, user, N):
         """基于内容的推荐"""
@@ -425,13 +680,19 @@ class UserBasedCF():
             return []
 
         # 获取用户前5个兴趣标签
-        top_tags = sorted(user_profile.items(), key=lambda x: x[1], reverse=True)[:5]
-        print(f"  用户兴趣标签: {[tag for tag, _ in top_tags]}")
+        if self.verbose:
+            top_tags = sorted(user_profile.items(), key=lambda x: x[1], reverse=True)[:5]
+            print(f"  用户兴趣标签: {[tag for tag, _ in top_tags]}")
+
+        content = self._content_engine()
+        if content is not None:
+            return content.recommend(user, N)
 
         candidate_videos = defaultdict(float)
+        watched_videos = set(self.trainSet.get(user, ()))
 
         for video, tags in self.video_tags.items():
-            if video in self.trainSet.get(user, {}):
+            if video in watched_videos:
                 continue
 
             # 计算视频与用户兴趣的匹配度
@@ -450,7 +711,7 @@ class UserBasedCF():
         max_score = max(candidate_videos.values())
         if max_score > 0:
             for video in candidate_videos:
-                candidate_videos[video] = (candidate_videos[video] / max_score) * 5.0
+                candidate_videos[video] = round(candidate_videos[video] / max_score * 5.0, SCORE_DECIMALS)
 
         return sorted(candidate_videos.items(), key=lambda x: x[1], reverse=True)[:N]
 
@@ -462,101 +723,145 @@ class UserBasedCF():
         return "无标签"
 
     def _get_popular_videos(self, watched_videos, N):
-        """获取热门视频"""
+        """
+        获取热门视频（沿预先排好序的热门列表跳过已观看的视频）
+        按交互权重之和排名，从数据库加载时权重已按时间衰减，近期被收藏的视频更靠前
+        """
         if not self.trainSet:
             return []
+        return self._popularity_index().top(N, watched_videos, decayed=True)
 
-        # 计算视频流行度
-        video_popularity = defaultdict(int)
-        for user_videos in self.trainSet.values():
-            for video in user_videos:
-                video_popularity[video] += 1
-
-        # 过滤已观看视频
-        for video in watched_videos:
-            video_popularity.pop(video, None)
-
-        if not video_popularity:
-            return []
-
-        # 按流行度排序
-        popular_videos = sorted(video_popularity.items(),
-                               key=lambda x: x[1], reverse=True)
-
-        # 转换为(视频ID, 评分)格式
-        result = []
-        if popular_videos:
-            max_pop = max([count for _, count in popular_videos])
-            for video, count in popular_videos[:N]:
-                score = (count / max_pop) * 5.0 if max_pop > 0 else 3.0
-                result.append((video, score))
-
-        return result
-
-    def save_recommendations(self, db_connection):
-        """保存推荐结果到数据库"""
+    def save_model(self, path='hybrid_model'):
+        """
+        保存模型目录（rec_models.HybridModel），在线推荐服务和其他离线任务以内存映射方式加载
+        包括: 用户/视频ID词表、训练集、相似用户、视频×标签矩阵、热门视频列表
+        """
+        if not self.trainSet:
+            print("训练集为空，未保存模型")
+            return
+        store = self._train_store()
+
+        # 相似用户按训练集的用户顺序保存，邻居换算成训练集中的行号
+        sim = self.user_sim_matrix
+        neighbors = np.full((len(store), sim.k), -1, dtype=np.int32)
+        sims = np.zeros((len(store), sim.k), dtype=np.float32)
+        if len(sim.user_keys):
+            to_store = np.array([store.user_index.get(user, -1) for user in sim.user_keys], dtype=np.int64)
+            mapped = np.where(sim.neighbors >= 0, to_store[sim.neighbors], -1)
+            rows = to_store >= 0
+            neighbors[to_store[rows]] = mapped[rows]
+            sims[to_store[rows]] = np.where(mapped[rows] >= 0, sim.sims[rows], 0)
+
+        # 视频×标签 权重矩阵（CSR）及其转置
+        tag_index = {}
+        video_tag_indptr = [0]
+        tag_cols = []
+        weights = []
+        for tags in self.video_tags.values():
+            for tag, weight in tags.items():
+                tag_cols.append(tag_index.setdefault(tag, len(tag_index)))
+                weights.append(weight)
+            video_tag_indptr.append(len(tag_cols))
+        tag_cols = np.array(tag_cols, dtype=np.int32)
+        weights = np.array(weights, dtype=np.float64)
+        video_rows = np.repeat(np.arange(len(self.video_tags), dtype=np.int32), np.diff(video_tag_indptr))
+        by_tag = np.argsort(tag_cols, kind='stable')
+        tag_video_indptr = np.concatenate(([0], np.cumsum(np.bincount(tag_cols, minlength=len(tag_index)))))
+
+        # 与离线热门后备使用同一个排名（时间衰减热门）
+        ranking = self._popularity_index().decayed_ranking
+        arrays = {
+            'user_ids': np.array([int(user) for user in store.user_keys], dtype=np.int64),
+            'video_ids': np.array([int(video) for video in store.video_keys], dtype=np.int64),
+            'indptr': store.indptr,
+            'indices': store.indices,
+            'data': store.data,
+            'neighbors': neighbors,
+            'sims': sims,
+            'content_video_ids': np.array([int(video) for video in self.video_tags], dtype=np.int64),
+            'tag_names': np.array(list(tag_index), dtype=str),
+            'video_tag_indptr': np.array(video_tag_indptr, dtype=np.int64),
+            'video_tag_indices': tag_cols,
+            'video_tag_data': weights,
+            'tag_video_indptr': tag_video_indptr.astype(np.int64),
+            'tag_video_indices': video_rows[by_tag],
+            'tag_video_data': weights[by_tag],
+            'popular_videos': np.array([store.video_index[video] for video, _ in ranking], dtype=np.int32),
+            'popular_counts': np.array([count for _, count in ranking], dtype=np.float64),
+        }
+        for name in ('user', 'video', 'content_video'):
+            arrays[f'{name}_sorter'] = np.argsort(arrays[f'{name}_ids'], kind='stable')
+
+        version = save_artifact(path, HybridModel.model_type, arrays,
+                                n_sim_user=self.n_sim_user, n_rec_video=self.n_rec_video)
+        print(f"模型已保存到 {path}（版本 {version}, 用户 {len(store)} 个, 视频 {store.n_videos} 个, "
+              f"标签 {len(tag_index)} 个）")
+
+    def save_recommendations(self, db_connection, n_workers=1):
+        """
+        保存推荐结果到数据库
+        Args:
+            n_workers: 生成推荐的进程数，大于1时按用户分片并行生成，最后一次性写入数据库
+        Returns:
+            发布的推荐版本，未发布时返回None
+        """
         print("\n" + "="*50)
         print("保存推荐结果到数据库")
         print("="*50)
 
         if not self.trainSet:
             print("训练集为空，无法生成推荐")
-            return
-
-        try:
-            cursor = db_connection.cursor()
-
-            # 清空推荐表
-            cursor.execute("TRUNCATE TABLE myapp_rec;")
-            db_connection.commit()
-            print("已清空推荐表")
+            return None
 
-            # 准备插入语句
-            insert_sql = """
-                INSERT INTO myapp_rec (user_id, video_id, score, created_at) 
-                VALUES (%s, %s, %s, NOW())
-            """
+        users = list(self.trainSet.keys())
 
-            all_recommendations = []
+        # 先用分块矩阵乘法算好全部用户的内容推荐，逐用户生成推荐时直接取用
+        content = self._content_engine()
+        if content is not None:
+            print("批量计算基于内容的推荐...")
+            content.precompute(self.n_rec_video, users)
+        self._popularity_index()
 
-            # 为每个用户生成推荐
-            for user_id in self.trainSet.keys():
-                recommendations = self.recommend_for_user(user_id)
+        if n_workers > 1 and len(users) > 1:
+            all_recommendations, self.last_recommendations = self._generate_parallel(users, n_workers)
+        else:
+            all_recommendations, self.last_recommendations = _generate_rows(self, users)
 
-                for video_id, score in recommendations:
-                    try:
-                        user_id_int = int(user_id)
-                        video_id_int = int(video_id)
-                        score_float = float(score)
+        return save_recommendation_rows(db_connection, all_recommendations)
 
-                        all_recommendations.append((user_id_int, video_id_int, score_float))
-                    except (ValueError, TypeError) as e:
-                        print(f"数据类型转换错误: user={user_id}, video={video_id}, 错误: {e}")
-                        continue
-
-            # 批量插入推荐数据
-            if all_recommendations:
-                try:
-                    cursor.executemany(insert_sql, all_recommendations)
-                    db_connection.commit()
-                    print(f"\n成功插入 {len(all_recommendations)} 条推荐记录")
-
-                    # 特别检查用户25和27
-                    for user_id in [25, 27]:
-                        cursor.execute("SELECT COUNT(*) FROM myapp_rec WHERE user_id = %s", (user_id,))
-                        count = cursor.fetchone()[0]
-                        print(f"  用户{user_id}: {count} 条推荐")
-
-                except Exception as e:
-                    print(f"批量插入失败: {e}")
-                    db_connection.rollback()
-
-            cursor.close()
-
-        except Exception as e:
-            print(f"数据库操作失败: {e}")
-            import traceback
-            traceback.print_exc()
+    def _generate_parallel(self, users, n_workers):
+        """
+        多进程生成推荐
+        支持fork时子进程直接共享父进程中已训练好的模型（写时复制），
+        否则每个子进程在启动时接收一次模型，任务本身只传递用户ID
+        """
+        n_workers = min(n_workers, len(users))
+        shard_size = -(-len(users) // (n_workers * 4))
+        shards = [users[i:i + shard_size] for i in range(0, len(users), shard_size)]
+        print(f"使用 {n_workers} 个进程为 {len(users)} 个用户生成推荐...")
+
+        global _WORKER_CF
+        verbose = self.verbose
+        self.verbose = False
+        try:
+            if 'fork' in multiprocessing.get_all_start_methods():
+                _WORKER_CF = self
+                context = multiprocessing.get_context('fork')
+                pool = context.Pool(n_workers)
+            else:
+                pool = multiprocessing.Pool(n_workers, initializer=_init_worker, initargs=(self,))
+            with pool:
+                results = pool.map(_recommend_shard, shards)
+        finally:
+            _WORKER_CF = None
+            self.verbose = verbose
+
+        all_recommendations = []
+        last_recommendations = {}
+        for rows, recommendations in results:
+            all_recommendations.extend(rows)
+            last_recommendations.update(recommendations)
+        return all_recommendations, last_recommendations
 
     def verify_recommendations(self, db_connection):
         """验证推荐结果"""
@@ -631,6 +936,73 @@ class UserBasedCF():
             traceback.print_exc()
 
 
+# 多进程生成推荐时子进程使用的模型
+_WORKER_CF = None
+
+
+def _init_worker(user_cf):
+    global _WORKER_CF
+    _WORKER_CF = user_cf
+
+
+def _recommend_shard(users):
+    return _generate_rows(_WORKER_CF, users)
+
+
+def _generate_rows(user_cf, users):
+    """为一批用户生成推荐，返回 (待写入的记录列表, {user_id: 推荐列表})"""
+    all_recommendations = []
+    last_recommendations = {}
+
+    for user_id in users:
+        recommendations = user_cf.recommend_for_user(user_id)
+        last_recommendations[user_id] = recommendations
+
+        for video_id, score in recommendations:
+            try:
+                user_id_int = int(user_id)
+                video_id_int = int(video_id)
+                score_float = float(score)
+
+                all_recommendations.append((user_id_int, video_id_int, score_float))
+            except (ValueError, TypeError) as e:
+                print(f"数据类型转换错误: user={user_id}, video={video_id}, 错误: {e}")
+                continue
+
+    return all_recommendations, last_recommendations
+
+
+def save_recommendation_rows(db_connection, all_recommendations):
+    """
+    发布推荐结果: 写入暂存表后原子替换推荐表，旧版本保留在 myapp_rec_prev
+    Args:
+        all_recommendations: [(user_id, video_id, score)]
+    Returns:
+        发布的推荐版本，未发布或发布失败时返回None
+    """
+    version = None
+    try:
+        version = publish_recommendations(db_connection, all_recommendations)
+        if version is None:
+            return None
+
+        cursor = db_connection.cursor()
+
+        # 特别检查用户25和27
+        for user_id in [25, 27]:
+            cursor.execute("SELECT COUNT(*) FROM myapp_rec WHERE user_id = %s", (user_id,))
+            count = cursor.fetchone()[0]
+            print(f"  用户{user_id}: {count} 条推荐")
+
+        cursor.close()
+
+    except Exception as e:
+        print(f"数据库操作失败: {e}")
+        import traceback
+        traceback.print_exc()
+    return version
+
+
 def create_rating_csv_from_db():
     """从数据库读取数据并创建rating.csv文件"""
     print("从数据库读取数据创建rating.csv...")
@@ -684,28 +1056,65 @@ def create_rating_csv_from_db():
         return 0
 
 
-def main():
+def run_incremental(checkpoint_file='rec_checkpoint.pkl'):
+    """
+    增量更新: 只处理检查点之后新增的收藏记录
+    Returns:
+        是否更新成功；检查点不存在或更新失败时返回False，由调用方执行全量计算
+    """
+    if IncrementalUpdater is None:
+        print("未安装scipy，无法使用增量更新")
+        return False
+
+    user_cf = UserBasedCF(n_sim_user=0, n_rec_video=9)
+    updater = IncrementalUpdater(user_cf, checkpoint_file)
+    if not updater.load_checkpoint():
+        return False
+
+    try:
+        db = pymysql.connect(
+            host="localhost",
+            user='root',
+            password='li974521',
+            database='bill_video',
+            charset='utf8'
+        )
+        try:
+            updater.apply(db)
+        finally:
+            db.close()
+    except Exception as e:
+        # 推荐表没有写完，不保存检查点和模型，下一次从原检查点重新处理
+        print(f"增量更新失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+    # 推荐结果写入成功后再保存检查点和模型
+    updater.save_checkpoint()
+    user_cf.save_model('hybrid_model')
+    return True
+
+
+def main(incremental=False):
     """主函数"""
     print("=" * 60)
     print("混合推荐算法（修正版）")
     print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
 
-    # 步骤1: 从数据库创建rating.csv
-    data_count = create_rating_csv_from_db()
-
-    if data_count == 0:
-        print("错误: 没有从数据库读取到数据")
-        return
+    if incremental:
+        if run_incremental():
+            print("\n" + "=" * 60)
+            print("增量更新完成!")
+            print(f"结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            print("=" * 60)
+            return
+        print("增量更新未完成，执行全量计算")
 
-    # 步骤2: 创建推荐算法实例
+    # 步骤1: 创建推荐算法实例
     user_cf = UserBasedCF(n_sim_user=0, n_rec_video=9)
 
-    # 步骤3: 加载数据集
-    print("\n" + "-" * 40)
-    print("加载数据集...")
-    user_cf.get_dataset('rating.csv', pivot=0.9)
-
     # 连接数据库
     try:
         db = pymysql.connect(
@@ -716,6 +1125,20 @@ def main():
             charset='utf8'
         )
 
+        # 步骤2: 从数据库直接加载收藏和评论数据（按时间衰减加权）
+        print("\n" + "-" * 40)
+        decay_now = time.time()
+        data = load_weighted_interactions(db, now=decay_now)
+        if len(data) == 0:
+            print("错误: 没有从数据库读取到数据")
+            db.close()
+            return
+
+        # 步骤3: 划分数据集
+        print("\n" + "-" * 40)
+        print("加载数据集...")
+        user_cf.load_dataset(data, pivot=0.9)
+
         # 步骤4: 加载视频标签
         print("\n" + "-" * 40)
         user_cf.load_video_tags(db)
@@ -731,13 +1154,23 @@ def main():
 
         # 步骤7: 生成并保存推荐
         print("\n" + "-" * 40)
-        user_cf.save_recommendations(db)
+        published_version = user_cf.save_recommendations(db, n_workers=os.cpu_count() or 1)
 
         # 步骤8: 验证推荐结果
         user_cf.verify_recommendations(db)
 
         db.close()
 
+        # 步骤9: 保存模型目录，供在线推荐服务加载
+        user_cf.save_model('hybrid_model')
+
+        # 步骤10: 保存增量更新检查点
+        if IncrementalUpdater is not None:
+            updater = IncrementalUpdater(user_cf)
+            # 检查点取自训练数据的同一次查询，之后新增的收藏由下一次增量更新处理
+            updater.build_from_model(data.last_wishlist_id, published_version, decay_now)
+            updater.save_checkpoint()
+
     except Exception as e:
         print(f"数据库连接失败: {e}")
         return
@@ -755,7 +1188,8 @@ def main():
 
 if __name__ == '__main__':
     try:
-        main()
+        # python run_recommendation.py --incremental 只处理新增的收藏记录
+        main(incremental='--incremental' in sys.argv)
     except KeyboardInterrupt:
         print("\n程序被用户中断")
     except Exception as e:
@@ -0,0 +1,170 @@
+"""
+基于SciPy稀疏矩阵的用户相似度计算
+用CSR格式的 用户×视频 / 用户×标签 矩阵代替逐对用户的Python双重循环
+"""
+import numpy as np
+from scipy import sparse
+
+
+def build_csr_matrix(rows, row_keys, binary=False):
+    """
+    将 {行键: {列键: 值}} 形式的字典转换为CSR矩阵
+    Args:
+        rows: 嵌套字典，例如 trainSet 或 user_profiles
+        row_keys: 行键顺序（矩阵第i行对应 row_keys[i]）
+        binary: 为True时所有非零值记为1
+    Returns:
+        (CSR矩阵, 列键列表)
+    """
+    col_index = {}
+    indptr = [0]
+    indices = []
+    data = []
+
+    for key in row_keys:
+        for col, value in rows.get(key, {}).items():
+            if not binary and not value:
+                continue
+            j = col_index.setdefault(col, len(col_index))
+            indices.append(j)
+            data.append(1.0 if binary else float(value))
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64),
+         np.asarray(indices, dtype=np.int32),
+         np.asarray(indptr, dtype=np.int64)),
+        shape=(len(row_keys), len(col_index))
+    )
+    matrix.sum_duplicates()
+
+    col_keys = [None] * len(col_index)
+    for col, j in col_index.items():
+        col_keys[j] = col
+    return matrix, col_keys
+
+
+def _drop_diagonal(matrix, row_offset=0):
+    """去掉对角线（用户与自身的相似度）并清除显式零；row_offset 为分块计算时的起始行"""
+    matrix = matrix.tocoo()
+    mask = (matrix.row + row_offset != matrix.col) & (matrix.data != 0)
+    return sparse.csr_matrix(
+        (matrix.data[mask], (matrix.row[mask], matrix.col[mask])),
+        shape=matrix.shape
+    )
+
+
+def _jaccard_block(binary_matrix, sizes, start, stop):
+    block = binary_matrix[start:stop]
+    common = _drop_diagonal(block @ binary_matrix.T, start).tocoo()
+    union = sizes[common.row + start] + sizes[common.col] - common.data
+    sim = np.divide(common.data, union, out=np.zeros_like(common.data), where=union > 0)
+    return sparse.csr_matrix((sim, (common.row, common.col)), shape=common.shape)
+
+
+def _cosine_block(weight_matrix, norms, start, stop):
+    block = weight_matrix[start:stop]
+    dot = _drop_diagonal(block @ weight_matrix.T, start).tocoo()
+    denom = norms[dot.row + start] * norms[dot.col]
+    sim = np.divide(dot.data, denom, out=np.zeros_like(dot.data), where=denom > 0)
+    return sparse.csr_matrix((sim, (dot.row, dot.col)), shape=dot.shape)
+
+
+def _row_sizes(binary_matrix):
+    return np.diff(binary_matrix.indptr).astype(np.float64)
+
+
+def _row_norms(weight_matrix):
+    return np.sqrt(np.asarray(weight_matrix.multiply(weight_matrix).sum(axis=1)).ravel())
+
+
+def pair_jaccard(binary_matrix, rows, cols, chunk_size=200000):
+    """只计算给定行对 (rows[k], cols[k]) 的Jaccard相似度，用于近似方法找出的候选对"""
+    binary_matrix = binary_matrix.tocsr().astype(np.float64, copy=False)
+    sizes = _row_sizes(binary_matrix)
+    sim = np.zeros(len(rows))
+    for lo in range(0, len(rows), chunk_size):
+        r, c = rows[lo:lo + chunk_size], cols[lo:lo + chunk_size]
+        common = np.asarray(binary_matrix[r].multiply(binary_matrix[c]).sum(axis=1)).ravel()
+        union = sizes[r] + sizes[c] - common
+        sim[lo:lo + chunk_size] = np.divide(common, union, out=np.zeros_like(common), where=union > 0)
+    return sim
+
+
+def pair_cosine(weight_matrix, rows, cols, chunk_size=200000):
+    """只计算给定行对 (rows[k], cols[k]) 的余弦相似度"""
+    weight_matrix = weight_matrix.tocsr().astype(np.float64, copy=False)
+    norms = _row_norms(weight_matrix)
+    sim = np.zeros(len(rows))
+    for lo in range(0, len(rows), chunk_size):
+        r, c = rows[lo:lo + chunk_size], cols[lo:lo + chunk_size]
+        dot = np.asarray(weight_matrix[r].multiply(weight_matrix[c]).sum(axis=1)).ravel()
+        denom = norms[r] * norms[c]
+        sim[lo:lo + chunk_size] = np.divide(dot, denom, out=np.zeros_like(dot), where=denom > 0)
+    return sim
+
+
+def combined_similarity_rows(user_video, user_tag, rows, w1=0.7, w2=0.3, sizes=None, norms=None):
+    """
+    只计算指定行（不要求连续）与所有行之间的 w1*Jaccard + w2*余弦，公式与 iter_combined_similarity 一致
+    共同收藏数 = R[rows]·Rᵀ，增量更新时只需为受影响的用户计算，不用保存全部用户对的共现计数
+    Args:
+        sizes / norms: 每行的收藏数、标签向量范数，多次调用时可预先算好传入
+    Returns:
+        CSR矩阵，第k行对应第 rows[k] 个用户，已去掉用户与自身的相似度
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    user_video = user_video.tocsr().astype(np.float64, copy=False)
+    user_tag = user_tag.tocsr().astype(np.float64, copy=False)
+    sizes = _row_sizes(user_video) if sizes is None else sizes
+    norms = _row_norms(user_tag) if norms is None else norms
+    shape = (len(rows), user_video.shape[0])
+
+    common = (user_video[rows] @ user_video.T).tocoo()
+    union = sizes[rows[common.row]] + sizes[common.col] - common.data
+    jaccard = np.divide(common.data, union, out=np.zeros_like(common.data), where=union > 0)
+
+    dot = (user_tag[rows] @ user_tag.T).tocoo()
+    denom = norms[rows[dot.row]] * norms[dot.col]
+    cosine = np.divide(dot.data, denom, out=np.zeros_like(dot.data), where=denom > 0)
+
+    combined = (sparse.csr_matrix((jaccard, (common.row, common.col)), shape=shape) * w1 +
+                sparse.csr_matrix((cosine, (dot.row, dot.col)), shape=shape) * w2).tocoo()
+    mask = (combined.col != rows[combined.row]) & (combined.data != 0)
+    return sparse.csr_matrix((combined.data[mask], (combined.row[mask], combined.col[mask])), shape=shape)
+
+
+def iter_combined_similarity(user_video, user_tag, w1=0.7, w2=0.3, block_size=1024):
+    """
+    分块计算 w1*行为相似度 + w2*内容相似度
+    每次只生成 block_size 行，避免一次性构造 用户×用户 的完整矩阵
+    Yields:
+        (起始行号, 该块的CSR相似度矩阵)
+    """
+    user_video = user_video.tocsr().astype(np.float64, copy=False)
+    user_tag = user_tag.tocsr().astype(np.float64, copy=False)
+    sizes = _row_sizes(user_video)
+    norms = _row_norms(user_tag)
+    n_users = user_video.shape[0]
+
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        block = (_jaccard_block(user_video, sizes, start, stop) * w1 +
+                 _cosine_block(user_tag, norms, start, stop) * w2)
+        yield start, block.tocsr()
+
+
+def iter_cosine_similarity(weight_matrix, block_size=1024):
+    """
+    分块计算行与行之间的余弦相似度（范数只计算一次）
+    Yields:
+        (起始行号, 该块的CSR相似度矩阵)
+    """
+    weight_matrix = weight_matrix.tocsr().astype(np.float64, copy=False)
+    norms = _row_norms(weight_matrix)
+    n_rows = weight_matrix.shape[0]
+
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        yield start, _cosine_block(weight_matrix, norms, start, stop)
+
@@ -1,3 +1,5 @@
+from collections import Counter
+
 import pandas as pd
 import pymysql
 
@@ -18,6 +20,28 @@ def clean_title(title):
     return title
 data['标题'] = data['标题'].apply(clean_title)
 
+# 3.1 解析视频时长为秒数（与 myapp.models.parse_duration_seconds 一致），写入 duration_seconds 列
+def parse_duration_seconds(duration_str):
+    try:
+        parts = [int(part) for part in str(duration_str).strip().split(':')]
+    except ValueError:
+        return None
+    if len(parts) == 3:  # 时:分:秒
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    if len(parts) == 2:  # 分:秒
+        return parts[0] * 60 + parts[1]
+    if len(parts) == 1:  # 只有秒
+        return parts[0]
+    return None
+
+# 3.2 拆分标签（与 myapp.tag_index.split_tags 一致，标签最长255个字符），写入词云使用的 myapp_videotag / myapp_tagfrequency 表
+def split_tags(tags):
+    if not isinstance(tags, str):
+        return []
+    unified_tags = tags.replace('，', ',').replace('\n', ',').replace(';', ',').replace(' ', ',')
+    tag_list = (tag.strip()[:255].strip() for tag in unified_tags.split(','))
+    return [tag for tag in tag_list if tag]
+
 # 4. 转换发布时间格式（适配数据库datetime类型，处理可能的时间戳或字符串）
 # 从CSV看“发布时间戳”是字符串格式（如2024-07-09 12:00:00），直接格式化即可
 data['发布时间戳'] = pd.to_datetime(data['发布时间戳'], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
@@ -50,6 +74,7 @@ try:
         author,          -- 作者（对应CSV“作者”）
         video_description, -- 视频文案（对应CSV“视频文案”）
         video_duration,  -- 视频时长（对应CSV“视频时长(分钟)”）
+        duration_seconds, -- 视频时长秒数（由视频时长解析，无法解析时为NULL）
         damaku_count,    -- 弹幕数量（对应CSV“弹幕数量”）
         favorites_count, -- 收藏人数（对应CSV“收藏人数”）
         likes_count,     -- 点赞人数（对应CSV“点赞人数”）
@@ -60,11 +85,19 @@ try:
         title,           -- 标题（对应CSV“标题”）
         video_type,      -- 视频类型（对应CSV“视频类型”）
         category         -- 类别（对应CSV“类别”）
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+
+    video_tag_sql = "INSERT INTO myapp_videotag (video_id, tag, count) VALUES (%s, %s, %s)"
+    # 同一类别的标签次数累加到已有词频上
+    tag_frequency_sql = """
+    INSERT INTO myapp_tagfrequency (category, tag, count) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE count = count + VALUES(count)
     """
 
     # 逐行插入数据（批量插入更高效，这里用循环确保兼容性）
     insert_count = 0
+    tag_frequencies = Counter()
     for _, row in data.iterrows():
         # 构造插入值（顺序与SQL字段完全一致，处理可能的空值）
         values = (
@@ -73,6 +106,7 @@ try:
             row['作者'] if pd.notna(row['作者']) else '',
             row['视频文案'] if pd.notna(row['视频文案']) else '',
             row['视频时长(分钟)'] if pd.notna(row['视频时长(分钟)']) else '',
+            parse_duration_seconds(row['视频时长(分钟)']) if pd.notna(row['视频时长(分钟)']) else None,
             int(row['弹幕数量']) if pd.notna(row['弹幕数量']) else 0,
             int(row['收藏人数']) if pd.notna(row['收藏人数']) else 0,
             int(row['点赞人数']) if pd.notna(row['点赞人数']) else 0,
@@ -87,6 +121,17 @@ try:
         cursor.execute(insert_sql, values)
         insert_count += 1
 
+        # 新视频的标签索引（video_id 为刚插入记录的自增主键）
+        tag_counts = Counter(split_tags(row['标签'] if pd.notna(row['标签']) else ''))
+        if tag_counts:
+            cursor.executemany(video_tag_sql, [(cursor.lastrowid, tag, count) for tag, count in tag_counts.items()])
+            for tag, count in tag_counts.items():
+                # 词频表的类别去掉末尾空格（与 myapp.tag_index.category_key 一致）
+                tag_frequencies[values[-1].rstrip(' '), tag] += count
+
+    cursor.executemany(tag_frequency_sql, [(category, tag, count)
+                                           for (category, tag), count in tag_frequencies.items()])
+
     # 提交事务（必须执行，否则数据不会写入数据库）
     connection.commit()
     print(f"\n数据插入完成！共成功插入 {insert_count} 条数据到 study_clean 表。")
@@ -0,0 +1,5 @@
+"""离线推荐脚本都在 BlBl 目录下以顶层模块方式导入"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
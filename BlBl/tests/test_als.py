@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from als_recommender import ImplicitALS
+from rec_models import FactorModel, load_model
+
+
+def clustered_train_set():
+    """两组用户各自只收藏一组视频，组内每个用户缺一个视频"""
+    train = {}
+    for group, videos in ((0, range(100, 106)), (1, range(200, 206))):
+        videos = [str(video) for video in videos]
+        for k in range(6):
+            user = str(group * 10 + k)
+            train[user] = {video: 5 for i, video in enumerate(videos) if i != k}
+    return train
+
+
+@pytest.fixture(scope='module')
+def als():
+    model = ImplicitALS(n_factors=4, iterations=10, n_rec_video=3, n_threads=2, seed=0)
+    model.trainSet = clustered_train_set()
+    model.fit()
+    return model
+
+
+def factor_model(als):
+    return FactorModel([int(user) for user in als.user_ids], [int(video) for video in als.video_ids],
+                       als.user_factors, als.item_factors, als.regularization, als.alpha)
+
+
+def test_fit_recommends_within_the_group(als):
+    for user, videos in als.trainSet.items():
+        recs = als.recommend_for_user(user)
+        assert recs and recs[0][1] == pytest.approx(5.0)
+        assert not set(video for video, _ in recs) & set(videos)
+        # 组内唯一没收藏的视频排在第一
+        group = next(iter(videos))[0]
+        assert recs[0][0][0] == group
+        assert recs[0][0] not in videos
+    assert als.recommend_for_user('999') == []
+
+
+def test_fold_in_matches_one_more_user_step(als):
+    model = factor_model(als)
+    Y = als.item_factors.astype(np.float64)
+    expected = np.zeros((len(als.user_ids), als.n_factors))
+    als._gram = Y.T @ Y
+    als._solve_rows(als.user_items, Y, 0, len(als.user_ids), expected)
+
+    for user, videos in als.trainSet.items():
+        vector = model.fold_in([int(video) for video in videos], list(videos.values()))
+        assert np.allclose(vector, expected[als.user_index[user]], atol=1e-6)
+    assert model.fold_in([999]) is None
+
+
+def test_recommend_filters_watched_videos(als):
+    model = factor_model(als)
+    recs = model.recommend([100, 101, 102], N=3)
+    assert [score for _, score in recs] == sorted((score for _, score in recs), reverse=True)
+    assert {video for video, _ in recs} <= set(range(103, 106))
+    assert recs[0][1] == pytest.approx(5.0)
+
+    # 没有收藏时使用训练得到的用户向量（不知道收藏，不做过滤）
+    scores = als.item_factors @ als.user_factors[als.user_index['0']]
+    recs = model.recommend([], N=3, user_id=0)
+    assert [score for _, score in recs] == pytest.approx(np.sort(scores)[::-1][:3] / scores.max() * 5.0)
+    assert all(scores[als.video_index[str(video)]] / scores.max() * 5.0 == pytest.approx(score) for video, score in recs)
+    assert model.recommend([], N=3) == []
+    assert model.recommend([100], N=0) == []
+
+
+def test_saved_model_recommends_the_same(als, tmp_path):
+    als.save_model(str(tmp_path / 'als_model'))
+    loaded = load_model(str(tmp_path / 'als_model'))
+    assert isinstance(loaded, FactorModel)
+    model = factor_model(als)
+    for watched in ([100, 101], [200], [100, 200]):
+        assert loaded.recommend(watched) == pytest.approx(model.recommend(watched))
@@ -0,0 +1,31 @@
+import numpy as np
+from scipy import sparse
+
+from ann_benchmark import neighbor_overlap, timed_similarity
+from ann_index import RandomProjectionIndex, exact_top_k
+from benchmark import generate_videos, generate_wishlist
+
+K = 10
+
+
+def test_index_recall_against_exact_search():
+    # 固定随机种子: 10个簇，每簇50个向量
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(10, 32))
+    vectors = sparse.csr_matrix(np.repeat(centers, 50, axis=0) + 0.3 * rng.normal(size=(500, 32)))
+    index = RandomProjectionIndex(8, 8, seed=0).build(vectors)
+
+    recalls = []
+    for row in range(0, 500, 25):
+        exact, _ = exact_top_k(index.vectors, index._row_vector(row), K, exclude=[row])
+        found, _ = index.query_row(row, K)
+        assert row not in found.tolist()
+        recalls.append(len(np.intersect1d(found, exact)) / len(exact))
+    assert np.mean(recalls) >= 0.9
+
+
+def test_hybrid_neighbors_recall_against_sparse_backend():
+    ratings, video_rows = generate_wishlist(300, 200, seed=0), generate_videos(200, seed=0)
+    exact = timed_similarity(ratings, video_rows, K, 'sparse')[0]
+    approx = timed_similarity(ratings, video_rows, K, 'ann')[0]
+    assert neighbor_overlap(exact, approx) >= 0.95
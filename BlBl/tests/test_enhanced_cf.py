@@ -0,0 +1,86 @@
+import importlib.util
+import math
+import os
+import random
+
+import numpy as np
+import pytest
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '协同过滤修改带相关用户（）.py')
+spec = importlib.util.spec_from_file_location('enhanced_cf', MODULE_PATH)
+enhanced_cf = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(enhanced_cf)
+EnhancedUserBasedCF = enhanced_cf.EnhancedUserBasedCF
+
+
+def random_train_set(n_users=40, n_videos=30, seed=0):
+    rng = random.Random(seed)
+    return {str(user): {str(video): rng.randint(1, 5) for video in rng.sample(range(n_videos), rng.randint(1, 12))}
+            for user in range(n_users)}
+
+
+def centered_pearson(x, y):
+    """按均值中心化计算的皮尔逊相关系数，方差为0时为0"""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    dx, dy = x - x.mean(), y - y.mean()
+    den = math.sqrt((dx * dx).sum() * (dy * dy).sum())
+    return float((dx * dy).sum() / den) if den > 1e-12 else 0
+
+
+def brute_force_sims(train, min_common):
+    """逐对求共同观看的视频，按两个评分列表计算加权皮尔逊相关系数"""
+    sims, commons = {}, {}
+    for u1, videos1 in train.items():
+        for u2, videos2 in train.items():
+            common = [video for video in videos1 if video in videos2]
+            if u1 == u2 or not common:
+                continue
+            commons[(u1, u2)] = len(common)
+            if len(common) >= max(min_common, 2):
+                corr = centered_pearson([videos1[v] for v in common], [videos2[v] for v in common])
+                sims[(u1, u2)] = max(0, corr * (1 + math.log1p(len(common))))
+            else:
+                sims[(u1, u2)] = 0
+    return sims, commons
+
+
+@pytest.mark.parametrize('min_common', [1, 3])
+def test_one_pass_statistics_match_pairwise_pearson(min_common):
+    cf = EnhancedUserBasedCF(min_common=min_common)
+    cf.trainSet = random_train_set()
+    cf.calc_user_sim_enhanced()
+
+    sims, commons = brute_force_sims(cf.trainSet, min_common)
+    got = {(u1, u2): sim for u1, row in cf.user_sim_matrix.items() for u2, sim in row.items()}
+    assert got.keys() == sims.keys()
+    for pair, sim in sims.items():
+        assert got[pair] == pytest.approx(sim, abs=1e-9)
+        assert cf.get_common_count(*pair) == commons[pair]
+    assert any(sim > 0 for sim in sims.values())
+    assert cf.get_common_count('0', 'missing') == 0
+
+
+def test_pearson_from_stats_matches_numpy():
+    rng = np.random.default_rng(0)
+    x, y = rng.integers(1, 6, 20), rng.integers(1, 6, 20)
+    stats = (len(x), x.sum(), y.sum(), (x * x).sum(), (y * y).sum(), (x * y).sum())
+    assert EnhancedUserBasedCF.pearson_from_stats(*stats) == pytest.approx(np.corrcoef(x, y)[0, 1])
+    # 评分全部相同时方差为0
+    assert EnhancedUserBasedCF.pearson_from_stats(3, 15, 6, 75, 14, 30) == 0
+    assert EnhancedUserBasedCF.pearson_from_stats(0, 0, 0, 0, 0, 0) == 0
+
+
+def test_category_masks_are_cached_until_categories_change():
+    cf = EnhancedUserBasedCF()
+    cf.trainSet = {'1': {'10': 5, '11': 5}, '2': {'12': 5}}
+    cf.set_video_categories([(10, '游戏', ''), (11, '音乐', '翻唱'), (12, '游戏', '')])
+
+    mask = cf.get_category_mask('1')
+    assert mask == [True, True] and cf.get_category_mask('2') == [True, False]
+    assert cf.get_category_mask('1') is mask
+    assert cf.get_category_mask('missing') is None
+
+    # 视频分类变化后偏好矩阵重建，缓存的类别也随之更新
+    cf.set_video_categories([(12, '知识', '')])
+    assert cf.get_category_mask('2') == [False, False, True]
+    assert cf.get_category_mask('1') is not mask
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from benchmark import generate_wishlist
+from evaluate import ADAPTERS, evaluate, holdout_split, interaction_ratings
+from interaction_loader import COMMENT_WEIGHT, WISHLIST_WEIGHT, combine_interactions, decay_weights
+
+NOW = 1.7e9
+
+
+@pytest.fixture(scope='module')
+def data():
+    """收藏和评论按随机的时间衰减加权，与 load_weighted_interactions 的结果格式相同"""
+    rows = generate_wishlist(150, 100, seed=1)
+    rng = np.random.default_rng(1)
+    wish_users = [int(user) for user, _, _ in rows]
+    wish_videos = [int(video) for _, video, _ in rows]
+    comments = rng.integers(0, len(rows), 60)
+    return combine_interactions([
+        (wish_users, wish_videos, WISHLIST_WEIGHT * decay_weights(NOW - rng.uniform(0, 300, len(rows)) * 86400, NOW)),
+        (np.array(wish_users)[comments], np.array(wish_videos)[comments],
+         COMMENT_WEIGHT * decay_weights(NOW - rng.uniform(0, 300, len(comments)) * 86400, NOW)),
+    ])
+
+
+def test_interaction_ratings_keep_weights(data):
+    ratings = interaction_ratings(data)
+    assert len(ratings) == len(data)
+    trainSet, testSet = holdout_split(ratings, pivot=1.0)
+    assert not testSet
+    assert trainSet.keys() == data.to_dict().keys()
+    for user, videos in data.to_dict().items():
+        assert trainSet[user] == pytest.approx(videos)
+    # 权重按时间衰减，不再是统一的评分
+    assert len({weight for _, _, weight in ratings}) > 1
+
+
+@pytest.mark.parametrize('name', ['hybrid', 'itemcf'])
+def test_evaluate_on_weighted_interactions(data, name):
+    result = evaluate(ADAPTERS[name](9), interaction_ratings(data), trace_memory=False)
+    assert result['users'] > 0
+    assert 0 < result['coverage'] <= 1
+    assert 0 <= result['precision'] <= 1 and 0 <= result['recall'] <= 1
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import run_recommendation
+from benchmark import generate_videos, generate_wishlist
+from interaction_loader import WISHLIST_WEIGHT, decay_weights
+from interaction_store import InteractionStore
+from rec_models import HybridModel, load_model
+
+NOW = 1.7e9
+N = 9
+TOLERANCE = 1e-6
+
+
+def assert_same_recommendations(got, expected):
+    assert [int(video) for video, _ in got] == [int(video) for video, _ in expected]
+    assert [score for _, score in got] == pytest.approx([score for _, score in expected], abs=TOLERANCE)
+
+
+def train_set(decayed):
+    """幂律合成数据；decayed 为真时收藏权重按随机的收藏时间衰减"""
+    rows = generate_wishlist(200, 150, seed=3)
+    rng = np.random.default_rng(3)
+    ages = rng.uniform(0, 200, len(rows)) * 86400
+    weights = WISHLIST_WEIGHT * decay_weights(NOW - ages, NOW) if decayed else np.full(len(rows), WISHLIST_WEIGHT)
+    train = {}
+    for (user, video, _), weight in zip(rows, weights.tolist()):
+        train.setdefault(user, {})[video] = weight
+    return InteractionStore.from_dict(train)
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['uniform', 'decayed'])
+def trained(request, tmp_path_factory):
+    cf = run_recommendation.UserBasedCF(n_sim_user=5, n_rec_video=N)
+    cf.trainSet = train_set(request.param)
+    cf.set_video_tags(generate_videos(150, seed=3)[:120])  # 部分视频没有标签
+    cf.build_user_profiles()
+    cf.calc_user_sim_with_content()
+    cf.verbose = False
+    path = str(tmp_path_factory.mktemp('hybrid') / 'hybrid_model')
+    cf.save_model(path)
+    return cf, load_model(path)
+
+
+def test_content_profile_uses_training_weights(trained):
+    cf, model = trained
+    assert isinstance(model, HybridModel)
+    for user in cf.trainSet:
+        row = model.user_index[int(user)]
+        lo, hi = model.indptr[row], model.indptr[row + 1]
+        watched = model.video_ids[model.indices[lo:hi]].tolist()
+        assert_same_recommendations(model._content_recommend(watched, N, model.data[lo:hi]),
+                                    cf._content_based_recommend(user, N))
+
+
+def test_training_users_match_offline_recommendations(trained):
+    cf, model = trained
+    for user in cf.trainSet:
+        assert_same_recommendations(model.recommend([], N, user_id=int(user)), cf.recommend_for_user(user))
+
+
+def test_current_favourites_with_weights_match_offline(trained):
+    # 在线服务传入当前收藏和按同一公式衰减的权重，收藏没有变化时与离线推荐一致
+    cf, model = trained
+    for user in cf.trainSet:
+        videos = cf.trainSet[user]
+        watched, ratings = [int(video) for video in videos], list(videos.values())
+        assert_same_recommendations(model.recommend(watched, N, user_id=int(user), ratings=ratings),
+                                    cf.recommend_for_user(user))
@@ -0,0 +1,154 @@
+import contextlib
+import io
+import pickle
+import random
+from datetime import datetime
+
+import pytest
+
+from incremental_update import IncrementalUpdater
+from interaction_loader import load_weighted_interactions
+from run_recommendation import UserBasedCF
+
+VERSION = datetime(2026, 1, 1)
+TAGS = ['a', 'b', 'c', 'd', 'e', 'f', 'python', '二次元']
+
+
+class FakeCursor():
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, sql, params=()):
+        self.db.statements.append(sql.strip())
+        if 'FROM myapp_wishlist' in sql and sql.strip().startswith('SELECT id'):
+            # 增量读取: WHERE id > %s ORDER BY id
+            last_id = params[0] if params else 0
+            self.result = [row for row in self.db.wishlist if row[0] > last_id]
+        elif 'FROM myapp_wishlist' in sql:
+            # 全量读取: user_id, video_id, 时间戳, id
+            self.result = [(user, video, ts, row_id) for row_id, user, video, ts in self.db.wishlist]
+        elif 'FROM myapp_comment' in sql:
+            self.result = []
+        elif 'MAX(created_at)' in sql:
+            self.result = [(self.db.version,)]
+        else:
+            self.result = []
+
+    def executemany(self, sql, rows):
+        self.db.statements.append(sql.strip())
+        self.db.rows.extend(rows)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def fetchmany(self, size):
+        rows, self.result = self.result[:size], self.result[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeDB():
+    """收藏表的记录 (id, user_id, video_id, 收藏时间戳) 和线上推荐版本"""
+    def __init__(self, wishlist=(), version=VERSION):
+        self.wishlist = list(wishlist)
+        self.version = version
+        self.statements = []
+        self.rows = []
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def train(pairs, n_sim_user):
+    rnd = random.Random(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        cf = UserBasedCF(n_sim_user=n_sim_user)
+        cf.verbose = False
+        for video in range(80):
+            cf.video_tags[str(video)] = {tag: rnd.choice([1.0, 0.8]) for tag in rnd.sample(TAGS, rnd.randint(0, 3))}
+        for user, video in pairs:
+            cf.trainSet.setdefault(user, {})[video] = 5
+        cf.build_user_profiles()
+        cf.calc_user_sim_with_content()
+        cf.last_recommendations = {user: cf.recommend_for_user(user) for user in cf.trainSet}
+    return cf
+
+
+@pytest.fixture(scope='module')
+def pairs():
+    rnd = random.Random(3)
+    pairs = sorted({(str(rnd.randint(0, 70)), str(rnd.randint(0, 79))) for _ in range(500)})
+    rnd.shuffle(pairs)
+    return pairs[:420], pairs[420:] + [('999', '3'), ('999', '5')]
+
+
+@pytest.mark.parametrize('n_sim_user', [0, 3])
+def test_incremental_neighbors_match_full_computation(pairs, n_sim_user, tmp_path):
+    old, new = pairs
+    checkpoint = str(tmp_path / 'checkpoint.pkl')
+    updater = IncrementalUpdater(train(old, n_sim_user), checkpoint)
+    updater.build_from_model(len(old), VERSION)
+    updater.save_checkpoint()
+
+    # 收藏表中既有全量计算读过的记录，也有之后新增的记录（收藏时间未知时不衰减，权重与训练时的5分一致）
+    wishlist = [(i + 1, int(user), int(video), -1) for i, (user, video) in enumerate(old + new)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        incremental = UserBasedCF(n_sim_user=n_sim_user)
+        incremental.verbose = False
+        updater = IncrementalUpdater(incremental, checkpoint)
+        updater.load_checkpoint()
+        updater.apply(FakeDB(wishlist))
+    full = train(old + new, n_sim_user)
+
+    assert set(incremental.user_sim_matrix.user_keys) == set(full.trainSet)
+    for user in full.trainSet:
+        got = [(other, round(sim, 5)) for other, sim in incremental.user_sim_matrix.neighbors_of(user)]
+        expected = [(other, round(sim, 5)) for other, sim in full.user_sim_matrix.neighbors_of(user)]
+        assert got == expected, user
+        assert IncrementalUpdater._rounded(incremental.last_recommendations[user]) == \
+               IncrementalUpdater._rounded(full.last_recommendations[user]), user
+    assert updater.last_wishlist_id == len(old) + len(new)
+    # 全量计算已经读过的收藏不会再次累加
+    assert {rating for user in incremental.trainSet for rating in incremental.trainSet[user].values()} == {5}
+
+
+def test_apply_refuses_when_live_version_changed(pairs, tmp_path):
+    old, _ = pairs
+    checkpoint = str(tmp_path / 'checkpoint.pkl')
+    updater = IncrementalUpdater(train(old, 3), checkpoint)
+    updater.build_from_model(len(old), VERSION)
+
+    db = FakeDB([(len(old) + 1, 1, 2, -1)], version=datetime(2026, 1, 2))
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(RuntimeError):
+        updater.apply(db)
+    assert not db.rows
+
+
+def test_checkpoint_comes_from_the_loaded_rows():
+    db = FakeDB([(3, 1, 10, 1700000000), (9, 2, 10, 1700000000), (5, 1, 11, -1)])
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = load_weighted_interactions(db, now=1700000000)
+    assert len(data) == 3 and data.last_wishlist_id == 9
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        empty = load_weighted_interactions(FakeDB(), now=1700000000)
+    assert len(empty) == 0 and empty.last_wishlist_id is None
+
+
+def test_old_checkpoint_format_needs_full_computation(tmp_path):
+    checkpoint = tmp_path / 'checkpoint.pkl'
+    checkpoint.write_bytes(pickle.dumps({'last_added_time': datetime(2026, 1, 1)}))
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert not IncrementalUpdater(UserBasedCF(), str(checkpoint)).load_checkpoint()
@@ -0,0 +1,45 @@
+import numpy as np
+
+from interaction_store import InteractionStore
+
+ROWS = {
+    '3': {'10': 5.0, '11': 2.0},
+    '1': {},
+    '7': {'11': 0.5, '12': 5.0, '10': 1.25},
+}
+
+
+def test_from_dict_round_trip():
+    store = InteractionStore.from_dict(ROWS)
+    assert list(store) == list(ROWS)
+    assert {user: dict(store[user]) for user in store} == ROWS
+    # 视频顺序与字典的插入顺序一致
+    assert [list(store[user]) for user in store] == [list(videos) for videos in ROWS.values()]
+    assert store.nnz == 5 and store.n_videos == 3
+    assert InteractionStore.from_dict(store) is store
+
+
+def test_to_csr_matches_dict():
+    store = InteractionStore.from_dict(ROWS)
+    matrix = store.to_csr().toarray()
+    binary = store.to_csr(binary=True).toarray()
+    for i, user in enumerate(store.user_keys):
+        for video, rating in ROWS[user].items():
+            assert matrix[i, store.video_index[video]] == rating
+    assert binary.sum() == store.nnz and np.array_equal(binary > 0, matrix > 0)
+
+
+def test_with_interactions_matches_rebuilt_dict():
+    # 已存在的 (用户, 视频) 跳过，新视频、新用户追加在最后
+    store = InteractionStore.from_dict(ROWS)
+    updated = store.with_interactions([('1', '12', 5.0), ('9', '13', 5.0), ('3', '10', 4.0)])
+    expected = {user: dict(videos) for user, videos in ROWS.items()}
+    expected['1']['12'] = 5.0
+    expected['9'] = {'13': 5.0}
+    assert {user: dict(updated[user]) for user in updated} == expected
+    assert list(updated) == list(expected)
+
+    # accumulate=True 时已有的交互累加权重
+    summed = store.with_interactions([('3', '10', 1.0), ('3', '10', 0.5)], accumulate=True)
+    assert summed['3']['10'] == 6.5
+    assert dict(store['3']) == ROWS['3']
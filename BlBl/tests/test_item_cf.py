@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from item_cf import ItemBasedCF
+from rec_models import ItemNeighborIndex, load_model
+
+ROWS = [(1, 10), (1, 11), (2, 10), (2, 11), (2, 12), (3, 12), (3, 13), (4, 14)]
+
+
+def brute_force_sims(rows):
+    """视频-视频余弦相似度: 共同收藏数 / sqrt(收藏数i * 收藏数j)"""
+    fans = {}
+    for user, video in rows:
+        fans.setdefault(video, set()).add(user)
+    return {(a, b): len(fans[a] & fans[b]) / np.sqrt(len(fans[a]) * len(fans[b]))
+            for a in fans for b in fans if a != b and fans[a] & fans[b]}
+
+
+@pytest.fixture
+def model():
+    cf = ItemBasedCF(n_sim_video=3, n_rec_video=9)
+    cf.set_interactions(ROWS)
+    cf.calc_item_sim()
+    return cf
+
+
+def test_neighbors_match_brute_force(model):
+    expected = brute_force_sims(ROWS)
+    for video in (10, 11, 12, 13, 14):
+        got = model.index.similar_videos(video)
+        assert {other: sim for other, sim in got} == pytest.approx(
+            {b: sim for (a, b), sim in expected.items() if a == video})
+        assert [sim for _, sim in got] == sorted((sim for _, sim in got), reverse=True)
+    assert model.index.similar_videos(99) == []
+
+
+def test_recommend_sums_neighbor_similarities(model):
+    sims = brute_force_sims(ROWS)
+    recs = model.recommend_for_user(1)
+    # 用户1收藏了10、11，候选只有12（13、14与之没有共同收藏）
+    assert [video for video, _ in recs] == [12]
+    assert recs[0][1] == pytest.approx(5.0)
+
+    recs = dict(model.index.recommend([10, 13]))
+    raw = {11: sims[(10, 11)], 12: sims[(10, 12)] + sims[(13, 12)]}
+    top = max(raw.values())
+    assert recs == pytest.approx({video: score / top * 5.0 for video, score in raw.items()})
+
+
+def test_recommend_returns_empty_when_nothing_left(model):
+    # 所有邻居都已收藏、没有邻居、N=0 时都返回空列表
+    assert model.index.recommend([10, 11, 12, 13]) == []
+    assert model.index.recommend([14]) == []
+    assert model.index.recommend([10], N=0) == []
+    assert model.index.recommend([99]) == []
+    assert model.recommend_for_user(4) == []
+
+
+def test_saved_index_recommends_the_same(model, tmp_path):
+    model.save_index(str(tmp_path / 'item_index'))
+    loaded = load_model(str(tmp_path / 'item_index'))
+    assert isinstance(loaded, ItemNeighborIndex)
+    for watched in ([10], [10, 13], [12], [14]):
+        assert loaded.recommend(watched) == model.index.recommend(watched)
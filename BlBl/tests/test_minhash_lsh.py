@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from ann_benchmark import neighbor_overlap, timed_similarity
+from benchmark import generate_videos, generate_wishlist
+from minhash_lsh import MinHashLSH
+from run_recommendation import UserBasedCF
+
+K = 10
+
+
+def _jaccard(matrix, i, j):
+    a, b = set(matrix[i].indices.tolist()), set(matrix[j].indices.tolist())
+    return len(a & b) / len(a | b)
+
+
+def test_similar_pairs_are_exact_and_cover_similar_users():
+    rng = np.random.default_rng(0)
+    base = rng.random((40, 300)) < 0.05
+    # 每个用户与下一个用户几乎收藏相同的视频
+    matrix = sparse.csr_matrix(np.vstack([base, base | (rng.random((40, 300)) < 0.01)]).astype(np.float64))
+    i, j, sim = MinHashLSH(threshold=0.5, seed=0).similar_pairs(matrix)
+
+    assert np.all(i < j)
+    for a, b, value in zip(i.tolist(), j.tolist(), sim.tolist()):
+        assert value == pytest.approx(_jaccard(matrix, a, b))
+    found = set(zip(i.tolist(), j.tolist()))
+    similar = [(a, a + 40) for a in range(40) if _jaccard(matrix, a, a + 40) >= 0.7]
+    assert similar and sum(pair in found for pair in similar) / len(similar) >= 0.95
+
+
+def test_hybrid_neighbors_recall_against_exact_behavior():
+    ratings, video_rows = generate_wishlist(300, 200, seed=0), generate_videos(200, seed=0)
+    exact = timed_similarity(ratings, video_rows, K, 'sparse')[0]
+    approx = timed_similarity(ratings, video_rows, K, 'sparse', 'minhash')[0]
+    assert neighbor_overlap(exact, approx) >= 0.9
+
+
+def test_ann_with_minhash_is_rejected():
+    with pytest.raises(ValueError):
+        UserBasedCF(sim_backend='ann', behavior_backend='minhash')
@@ -0,0 +1,223 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import rec_publisher
+
+LIVE_DDL = """CREATE TABLE `myapp_rec` (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `score` decimal(5,2) NOT NULL,
+  `user_id` int NOT NULL,
+  `video_id` int NOT NULL,
+  `created_at` datetime(6) NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `myapp_rec_user_id_51a1c3a6_fk_users_id` (`user_id`),
+  KEY `myapp_rec_video_id_9c0a1b2e_fk_study_clean_id` (`video_id`),
+  CONSTRAINT `myapp_rec_user_id_51a1c3a6_fk_users_id` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`),
+  CONSTRAINT `myapp_rec_video_id_9c0a1b2e_fk_study_clean_id` FOREIGN KEY (`video_id`) REFERENCES `study_clean` (`id`)
+) ENGINE=InnoDB AUTO_INCREMENT=5 DEFAULT CHARSET=utf8mb4"""
+
+
+def _constraints(sql):
+    return [line.split('`')[1] for line in sql.splitlines() if line.strip().startswith('CONSTRAINT')]
+
+
+def test_staging_table_keeps_foreign_keys_with_new_names():
+    sql = rec_publisher.staging_table_sql(LIVE_DDL, '20260101000000000001')
+    assert sql.startswith('CREATE TABLE `myapp_rec_staging`')
+    assert 'FOREIGN KEY (`user_id`) REFERENCES `users` (`id`)' in sql
+    assert 'FOREIGN KEY (`video_id`) REFERENCES `study_clean` (`id`)' in sql
+    names = _constraints(sql)
+    assert len(names) == 2
+    assert all(name.endswith('_v20260101000000000001') and len(name) <= 64 for name in names)
+    assert not set(names) & set(_constraints(LIVE_DDL))
+
+
+def test_constraint_names_do_not_grow_across_publishes():
+    first = rec_publisher.staging_table_sql(LIVE_DDL, '20260101000000000001')
+    live = first.replace('`myapp_rec_staging`', '`myapp_rec`', 1)
+    second = rec_publisher.staging_table_sql(live, '20260102000000000002')
+    assert [name.rsplit('_v', 1)[0] for name in _constraints(first)] == \
+           [name.rsplit('_v', 1)[0] for name in _constraints(second)]
+    assert not set(_constraints(first)) & set(_constraints(second))
+
+
+def test_missing_foreign_keys_are_restored():
+    # 之前用 CREATE TABLE ... LIKE 发布过的线上表没有外键
+    ddl = '\n'.join(line for line in LIVE_DDL.splitlines() if 'CONSTRAINT' not in line)
+    ddl = ddl.replace('(`video_id`),', '(`video_id`)')
+    sql = rec_publisher.staging_table_sql(ddl, '20260101000000000001')
+    assert 'FOREIGN KEY (`user_id`) REFERENCES `users` (`id`)' in sql
+    assert 'FOREIGN KEY (`video_id`) REFERENCES `study_clean` (`id`)' in sql
+    assert sql.rstrip().endswith('DEFAULT CHARSET=utf8mb4')
+
+
+class IntegrityError(Exception):
+    pass
+
+
+class FakeCursor():
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, sql, params=()):
+        sql = sql.strip()
+        self.db.statements.append(sql)
+        tables = self.db.tables
+        if sql.startswith('SHOW CREATE TABLE'):
+            name = sql.split()[-1]
+            self.result = [(name, tables[name]['ddl'])]
+        elif sql.startswith('SHOW TABLES LIKE'):
+            self.result = [(params[0],)] if params[0] in tables else []
+        elif sql.startswith('CREATE TABLE'):
+            self.db.create_table(sql)
+        elif sql.startswith('DROP TABLE IF EXISTS'):
+            tables.pop(sql.split()[-1], None)
+        elif sql.startswith('RENAME TABLE'):
+            for pair in sql[len('RENAME TABLE'):].split(','):
+                old, new = pair.split(' TO ')
+                table = tables.pop(old.strip())
+                table['ddl'] = table['ddl'].replace(f'`{old.strip()}`', f'`{new.strip()}`', 1)
+                tables[new.strip()] = table
+        elif sql.startswith('ALTER TABLE'):
+            name, constraint = sql.split()[2], sql.split('`')[1]
+            table = tables[name]
+            table['foreign_keys'] = {column: key for column, key in table['foreign_keys'].items()
+                                     if key[0] != constraint}
+            table['ddl'] = '\n'.join(line for line in table['ddl'].splitlines() if constraint not in line)
+        elif 'MAX(created_at)' in sql:
+            self.result = [(self.db.version,)]
+        elif 'COUNT(*)' in sql:
+            self.result = [(len(tables[sql.split()[-1]]['rows']),)]
+        elif 'information_schema' in sql:
+            keys = tables[params[0]]['foreign_keys']
+            self.result = [(column, name, rule) for column, (name, rule) in keys.items()
+                           if column not in self.db.hidden_keys]
+        elif sql.startswith('DELETE FROM'):
+            rows = tables[sql.split()[2]]['rows']
+            rows[:] = [row for row in rows if row[0] not in params]
+        else:
+            self.result = []
+
+    def executemany(self, sql, rows):
+        self.db.statements.append(sql.strip())
+        self.db.rows.extend(rows)
+        self.db.tables[sql.split()[2]]['rows'].extend(rows)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeDB():
+    """按执行的SQL维护各表的外键和记录，删除用户时按外键的删除规则检查（与MySQL一致）"""
+    def __init__(self, live_ddl=LIVE_DDL, hidden_keys=(), version=None):
+        self.hidden_keys = hidden_keys
+        self.version = version
+        self.statements = []
+        self.rows = []
+        self.committed = False
+        self.tables = {}
+        self.create_table(live_ddl)
+
+    def create_table(self, ddl):
+        keys = {}
+        for line in ddl.splitlines():
+            if 'FOREIGN KEY' in line:
+                rule = 'CASCADE' if 'ON DELETE CASCADE' in line else 'RESTRICT'
+                keys[line.split('FOREIGN KEY (`')[1].split('`')[0]] = (line.split('`')[1], rule)
+        self.tables[ddl.split('`')[1]] = {'ddl': ddl, 'foreign_keys': keys, 'rows': []}
+
+    def delete_user(self, user_id):
+        """相当于 DELETE FROM users WHERE id = user_id（Django 已先删除线上表中的记录）"""
+        self.tables['myapp_rec']['rows'] = [row for row in self.tables['myapp_rec']['rows'] if row[0] != user_id]
+        for name, table in self.tables.items():
+            referencing = [row for row in table['rows'] if row[0] == user_id]
+            if not referencing or 'user_id' not in table['foreign_keys']:
+                continue
+            if table['foreign_keys']['user_id'][1] != 'CASCADE':
+                raise IntegrityError(f"1451: {name} 中的记录引用了用户 {user_id}")
+            table['rows'] = [row for row in table['rows'] if row[0] != user_id]
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+def test_publish_creates_staging_table_with_foreign_keys():
+    db = FakeDB()
+    assert rec_publisher.publish_recommendations(db, [(1, 2, 4.5), (1, 3, 3.0)]) is not None
+    assert not any('LIKE myapp_rec' in sql for sql in db.statements)
+    create = next(sql for sql in db.statements if sql.startswith('CREATE TABLE `myapp_rec_staging`'))
+    assert create.count('FOREIGN KEY') == 2 and create.count('ON DELETE CASCADE') == 2
+    assert any(sql.startswith('RENAME TABLE myapp_rec TO myapp_rec_prev') for sql in db.statements)
+
+
+def test_restrict_foreign_keys_block_deletes():
+    # 原来的外键（RESTRICT）在旧版本表中仍有引用时删除用户失败
+    db = FakeDB()
+    db.tables['myapp_rec']['rows'] = [(7, 2, 4.5, None)]
+    db.tables['myapp_rec_prev'] = db.tables.pop('myapp_rec')
+    db.tables['myapp_rec'] = {'ddl': LIVE_DDL, 'foreign_keys': {}, 'rows': []}
+    with pytest.raises(IntegrityError):
+        db.delete_user(7)
+
+
+def test_deleting_user_referenced_by_previous_version():
+    db = FakeDB()
+    db.tables['myapp_rec']['rows'] = [(7, 2, 4.5, None), (8, 2, 3.0, None)]
+    rec_publisher.publish_recommendations(db, [(7, 3, 4.0), (8, 3, 2.0)])
+    # 修复前建立的线上表（现在的 myapp_rec_prev）外键不是级联删除，替换后被去掉
+    assert db.tables['myapp_rec_prev']['foreign_keys'] == {}
+    db.delete_user(7)
+
+    rec_publisher.publish_recommendations(db, [(8, 4, 1.0)])
+    assert {rule for _, rule in db.tables['myapp_rec_prev']['foreign_keys'].values()} == {'CASCADE'}
+    db.delete_user(8)
+    assert db.tables['myapp_rec_prev']['rows'] == [] and db.tables['myapp_rec']['rows'] == []
+
+
+def test_versions_differ_within_the_same_second():
+    db = FakeDB()
+    first = rec_publisher.publish_recommendations(db, [(1, 2, 4.5)])
+    db.version = first
+    second = rec_publisher.publish_recommendations(db, [(1, 3, 4.5)])
+    assert second > first
+    # 线上版本在未来（时钟回拨）时也要比它新
+    db.version = second + timedelta(seconds=30)
+    assert rec_publisher.publish_recommendations(db, [(1, 4, 4.5)]) > db.version
+
+
+def test_publish_refuses_to_swap_without_foreign_keys():
+    db = FakeDB(hidden_keys=('video_id',))
+    with pytest.raises(RuntimeError):
+        rec_publisher.publish_recommendations(db, [(1, 2, 4.5)])
+    assert not any(sql.startswith('RENAME TABLE') for sql in db.statements)
+
+
+def test_incremental_rows_keep_the_live_version():
+    version = datetime(2026, 1, 1, 12, 0, 0)
+    db = FakeDB(version=version)
+    rec_publisher.update_user_recommendations(db, version, {'7': [('3', 4.5), ('4', 2.0)]})
+    assert db.committed
+    assert db.rows == [(7, 3, 4.5, version), (7, 4, 2.0, version)]
+    assert any(sql.startswith('DELETE FROM myapp_rec') for sql in db.statements)
+
+
+def test_incremental_rows_refused_after_republish_or_rollback():
+    db = FakeDB(version=datetime(2026, 1, 2))
+    with pytest.raises(RuntimeError):
+        rec_publisher.update_user_recommendations(db, datetime(2026, 1, 1), {'7': [('3', 4.5)]})
+    assert not db.committed and not db.rows
+    assert not any(sql.startswith('DELETE') for sql in db.statements)
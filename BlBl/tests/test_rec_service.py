@@ -0,0 +1,106 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+django = pytest.importorskip('django')
+from django.conf import settings
+
+if not settings.configured:
+    # 只测试推荐服务本身，不连接数据库
+    settings.configure(
+        INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth', 'myapp'],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        BASE_DIR=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    django.setup()
+
+from interaction_loader import user_interaction_weights
+from myapp import rec_service
+from myapp.rec_service import RecommendationService
+from rec_models import ItemNeighborIndex
+
+NOW = datetime.now()
+WISHLIST = [(10, NOW), (11, NOW - timedelta(days=60))]
+COMMENTS = [(12, NOW - timedelta(days=10)), (10, None)]
+
+
+class FakeManager():
+    """只支持 filter(...).values_list(...) 的查询"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, **kwargs):
+        return self
+
+    def values_list(self, *fields):
+        return self.rows
+
+
+class FakeModel():
+    version = 'fake'
+
+    def __init__(self):
+        self.calls = []
+
+    def recommend(self, watched_videos, N=9, user_id=None, ratings=None):
+        self.calls.append((list(watched_videos), N, user_id, ratings))
+        return [(99, 5.0)]
+
+
+@pytest.fixture
+def user_rows(monkeypatch):
+    monkeypatch.setattr(rec_service.Wishlist, 'objects', FakeManager(WISHLIST), raising=False)
+    monkeypatch.setattr(rec_service.Comment, 'objects', FakeManager(COMMENTS), raising=False)
+
+
+def make_service(model):
+    service = RecommendationService('/nonexistent', check_interval=3600)
+    service.model = model
+    service._last_check = float('inf')
+    return service
+
+
+def test_recommend_passes_decayed_weights(user_rows):
+    model = FakeModel()
+    assert make_service(model).recommend(7, n=5) == [(99, 5.0)]
+
+    (watched, N, user_id, ratings), = model.calls
+    expected = user_interaction_weights(WISHLIST, COMMENTS)
+    assert watched == list(expected) == [10, 11, 12]
+    assert N == 5 and user_id == 7
+    assert ratings == pytest.approx(list(expected.values()), rel=1e-4)
+    # 60天前的收藏按时间衰减，权重低于刚收藏的视频
+    assert ratings[1] < ratings[0]
+
+
+def test_recommend_without_model(user_rows):
+    assert RecommendationService('/nonexistent').recommend(7) == []
+
+
+def save_index(path, neighbors):
+    ItemNeighborIndex(np.array([10, 11, 12]), np.array(neighbors), np.ones((3, 1)),
+                      np.array([1, 1, 1])).save(path)
+
+
+def test_reload_switches_to_new_version(tmp_path, monkeypatch):
+    path = str(tmp_path / 'item_index')
+    save_index(path, [[1], [2], [0]])
+    service = RecommendationService(path, check_interval=3600)
+    first = service.get_model()
+    assert first.recommend([10]) == [(11, 5.0)]
+    assert service.get_model() is first  # 检查间隔内不重新读取
+
+    save_index(path, [[2], [0], [1]])  # 同一秒内保存的版本号带后缀，CURRENT 一定会变
+    second = service.reload()
+    assert second is not first
+    assert second.recommend([10]) == [(12, 5.0)]
+    assert service.reload() is second  # 版本没变不重复加载
+
+    # 加载失败时继续使用旧模型
+    def broken(path):
+        raise ValueError('损坏的模型')
+    monkeypatch.setattr(rec_service, 'load_model', broken)
+    assert service.reload(force=True) is second
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from ann_benchmark import timed_similarity
+from benchmark import generate_videos, generate_wishlist
+
+K = 10
+TOLERANCE = 1e-6
+
+
+def assert_same_neighbors(got, expected):
+    """
+    两个后端的相似用户列表一致（不比较顺序）:
+    python 后端按集合的遍历顺序累加，相似度相同或只差舍入误差的邻居先后、第K名的取舍都可能不同
+    """
+    assert len(got) == len(expected)
+    assert np.allclose(sorted(sim for _, sim in got), sorted(sim for _, sim in expected), atol=TOLERANCE)
+    if not expected:
+        return
+    kth = min(sim for _, sim in expected)
+    assert {other for other, sim in got if sim > kth + TOLERANCE} == \
+           {other for other, sim in expected if sim > kth + TOLERANCE}
+    got = dict(got)
+    for other, sim in expected:
+        if other in got:
+            assert got[other] == pytest.approx(sim, abs=TOLERANCE)
+
+
+@pytest.fixture(scope='module')
+def data():
+    # 固定随机种子的幂律合成数据
+    ratings = [row for row in generate_wishlist(300, 200, seed=0) if int(row[0]) < 120]
+    return ratings, generate_videos(200, seed=0)
+
+
+def test_sparse_matches_python_backend(data):
+    ratings, video_rows = data
+    sparse_sim = timed_similarity(ratings, video_rows, K, 'sparse')[0]
+    python_sim = timed_similarity(ratings, video_rows, K, 'python')[0]
+
+    assert list(sparse_sim.user_keys) == list(python_sim.user_keys)
+    assert sum(len(sparse_sim.neighbors_of(user)) for user in sparse_sim.user_keys) > 0
+    for user in sparse_sim.user_keys:
+        assert_same_neighbors(python_sim.neighbors_of(user), sparse_sim.neighbors_of(user))
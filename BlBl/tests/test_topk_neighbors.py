@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from topk_neighbors import TopKNeighbors
+
+USERS = ['a', 'b', 'c', 'd', 'e']
+
+
+def test_ties_keep_smaller_row_first():
+    neighbors = TopKNeighbors(USERS, 3)
+    neighbors.set_row(0, [(0.5, 4), (0.5, 1), (0.9, 2), (0.5, 3), (0.0, 0)])
+    assert neighbors.neighbors_of('a') == [('c', pytest.approx(0.9)), ('b', 0.5), ('d', 0.5)]
+    assert neighbors.kth_sims()[0] == 0.5
+
+
+def test_sparse_block_matches_dict_rows():
+    rng = np.random.default_rng(0)
+    dense = np.round(rng.random((5, 5)), 1) * (rng.random((5, 5)) > 0.4)
+    np.fill_diagonal(dense, 0)
+
+    from_block = TopKNeighbors(USERS, 2)
+    from_block.add_sparse_block(0, sparse.csr_matrix(dense))
+    from_dict = TopKNeighbors(USERS, 2)
+    for i, user in enumerate(USERS):
+        from_dict.set_user(user, {USERS[j]: dense[i, j] for j in range(5)[::-1] if dense[i, j] > 0})
+
+    for i, user in enumerate(USERS):
+        expected = sorted(((-dense[i, j], j) for j in range(5) if dense[i, j] > 0))[:2]
+        assert [other for other, _ in from_block.neighbors_of(user)] == [USERS[j] for _, j in expected]
+        assert from_dict.neighbors_of(user) == from_block.neighbors_of(user)
+        assert dict(from_block[user]) == pytest.approx({USERS[j]: -sim for sim, j in expected})
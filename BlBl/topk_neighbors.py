@@ -0,0 +1,107 @@
+"""
+有界Top-K相似用户存储
+每个用户只保留相似度最高的K个邻居，用紧凑的numpy数组保存，内存为 O(用户数·K)
+"""
+import heapq
+
+import numpy as np
+
+
+class TopKNeighbors():
+    def __init__(self, user_keys, k):
+        """
+        初始化
+        Args:
+            user_keys: 用户ID列表（第i行对应 user_keys[i]）
+            k: 每个用户保留的邻居数
+        """
+        self.k = max(int(k), 0)
+        self.user_keys = list(user_keys)
+        self.user_index = {user: i for i, user in enumerate(self.user_keys)}
+
+        n_users = len(self.user_keys)
+        # 邻居按相似度降序存放，不足K个的位置为-1
+        self.neighbors = np.full((n_users, self.k), -1, dtype=np.int32)
+        self.sims = np.zeros((n_users, self.k), dtype=np.float32)
+        self.counts = np.zeros(n_users, dtype=np.int32)
+
+    def add_users(self, users):
+        """追加新用户（增量更新时使用），新用户的邻居为空"""
+        new_users = [user for user in users if user not in self.user_index]
+        if not new_users:
+            return
+        for user in new_users:
+            self.user_index[user] = len(self.user_keys)
+            self.user_keys.append(user)
+
+        n_new = len(new_users)
+        self.neighbors = np.vstack([self.neighbors, np.full((n_new, self.k), -1, dtype=np.int32)])
+        self.sims = np.vstack([self.sims, np.zeros((n_new, self.k), dtype=np.float32)])
+        self.counts = np.concatenate([self.counts, np.zeros(n_new, dtype=np.int32)])
+
+    def kth_sims(self):
+        """每个用户第K个邻居的相似度（邻居不足K个时为0），用于判断新相似度能否进入Top-K"""
+        if self.k == 0:
+            return np.full(len(self.user_keys), np.inf, dtype=np.float32)
+        kth = self.sims[:, self.k - 1].copy()
+        kth[self.counts < self.k] = 0
+        return kth
+
+    def set_row(self, row, candidates):
+        """
+        用堆做部分选择，从候选 (相似度, 邻居行号) 中选出前K个写入第row行
+        只保留相似度大于0的邻居；相似度相同时行号小的在前（与原来按列号顺序稳定排序的结果一致）
+        """
+        top = heapq.nlargest(self.k, ((sim, j) for sim, j in candidates if sim > 0),
+                             key=lambda item: (item[0], -item[1]))
+        count = len(top)
+        self.counts[row] = count
+        self.neighbors[row, :] = -1
+        self.sims[row, :] = 0
+        if count:
+            self.sims[row, :count] = [sim for sim, _ in top]
+            self.neighbors[row, :count] = [j for _, j in top]
+
+    def set_user(self, user, candidates):
+        """按用户ID写入邻居，candidates 为 {other_user: sim} 字典"""
+        row = self.user_index[user]
+        self.set_row(row, ((sim, self.user_index[other]) for other, sim in candidates.items()
+                           if other in self.user_index))
+
+    def add_sparse_block(self, start, block):
+        """把分块计算得到的CSR相似度矩阵逐行做Top-K选择"""
+        indptr, indices, data = block.indptr, block.indices, block.data
+        for i in range(block.shape[0]):
+            lo, hi = indptr[i], indptr[i + 1]
+            self.set_row(start + i, zip(data[lo:hi].tolist(), indices[lo:hi].tolist()))
+
+    def neighbors_of(self, user):
+        """返回 [(邻居用户, 相似度)]，已按相似度降序排列"""
+        row = self.user_index.get(user)
+        if row is None:
+            return []
+        count = self.counts[row]
+        return [(self.user_keys[j], float(sim))
+                for j, sim in zip(self.neighbors[row, :count], self.sims[row, :count])]
+
+    def nbytes(self):
+        """邻居数组占用的字节数"""
+        return self.neighbors.nbytes + self.sims.nbytes + self.counts.nbytes
+
+    # 兼容原来 {user_id: {other_user_id: similarity}} 的字典访问方式
+    def __contains__(self, user):
+        return user in self.user_index
+
+    def __getitem__(self, user):
+        if user not in self.user_index:
+            raise KeyError(user)
+        return dict(self.neighbors_of(user))
+
+    def __iter__(self):
+        return iter(self.user_keys)
+
+    def __len__(self):
+        return len(self.user_keys)
+
+    def get(self, user, default=None):
+        return self[user] if user in self.user_index else default
@@ -11,6 +11,9 @@ from operator import itemgetter
 from datetime import datetime
 import numpy as np
 
+from popularity import PopularityIndex
+from rec_publisher import publish_recommendations
+
 
 class EnhancedUserBasedCF():
     def __init__(self, n_sim_user=5, n_rec_video=8, min_common=2):
@@ -31,14 +34,22 @@ class EnhancedUserBasedCF():
 
         # 相似度矩阵
         self.user_sim_matrix = {}  # {user_id: {other_user_id: similarity}}
+        self.common_counts = {}    # {user_id: {other_user_id: 共同观看数}}
 
         # 增强数据
         self.video_categories = {}  # {video_id: category}
-        self.user_categories = {}  # {user_id: {category: weight}}
+        self.user_categories = {}  # {user_id: {category: weight}}，按需生成并缓存
+        self.user_category_masks = {}  # {user_id: 偏好类别的布尔列表}，按需生成并缓存
+        self.category_index = {}  # {category: 列号}
+        self.video_category_index = {}  # {video_id: 类别列号}
+        self.user_category_index = {}  # {user_id: 行号}
+        self.user_category_matrix = None  # 用户×类别 偏好矩阵（各类别收藏占比），训练集或视频分类变化后重建
+        self._category_trainSet = None
 
         # 统计信息
         self.user_mean_ratings = {}  # 用户平均评分
         self.all_videos = set()
+        self.popularity = None  # PopularityIndex，训练集或视频分类变化后重建
 
         print(f'增强协同过滤推荐算法')
         print(f'相似用户数 = {self.n_sim_user}')
@@ -58,15 +69,7 @@ class EnhancedUserBasedCF():
             WHERE category IS NOT NULL
             """
             cursor.execute(query)
-
-            for video_id, category, video_type in cursor.fetchall():
-                # 创建复合分类
-                if video_type and video_type.strip():
-                    full_category = f"{category}_{video_type}"
-                else:
-                    full_category = category
-
-                self.video_categories[str(video_id)] = full_category
+            self.set_video_categories(cursor.fetchall())
 
             print(f"已加载 {len(self.video_categories)} 个视频的分类信息")
             cursor.close()
@@ -76,6 +79,19 @@ class EnhancedUserBasedCF():
             import traceback
             traceback.print_exc()
 
+    def set_video_categories(self, rows):
+        """根据 study_clean 的 (id, category, video_type) 记录生成视频分类"""
+        self.popularity = None
+        self.user_category_matrix = None
+        for video_id, category, video_type in rows:
+            # 创建复合分类
+            if video_type and video_type.strip():
+                full_category = f"{category}_{video_type}"
+            else:
+                full_category = category
+
+            self.video_categories[str(video_id)] = full_category
+
     def get_dataset(self, filename, pivot=0.85):
         """从CSV文件加载数据集"""
         trainSet_len = 0
@@ -113,6 +129,8 @@ class EnhancedUserBasedCF():
                 print(f"解析行时出错: {line}, 错误: {e}")
                 continue
 
+        self.popularity = None
+        self.user_category_matrix = None
         print('训练集和测试集划分成功!')
         print(f'训练集大小 = {trainSet_len}, 用户数: {len(self.trainSet)}')
         print(f'测试集大小 = {testSet_len}, 用户数: {len(self.testSet)}')
@@ -200,60 +218,50 @@ class EnhancedUserBasedCF():
         # 构建用户相似度矩阵
         self.user_sim_matrix = {}
 
-        # 计算用户对之间的相似度
+        # 扫描一遍倒排表，为每对共同观看过视频的用户累加皮尔逊相关系数的充分统计量
+        # [n, Σx, Σy, Σx², Σy², Σxy]，x 为ID较小的用户的评分；两个方向共享同一个列表
         for video, users in video_user.items():
             user_list = list(users)
+            ratings = [self.trainSet[user][video] for user in user_list]
             for i in range(len(user_list)):
+                u1, r1 = user_list[i], ratings[i]
                 for j in range(i + 1, len(user_list)):
-                    u1, u2 = user_list[i], user_list[j]
+                    u2, r2 = user_list[j], ratings[j]
 
                     # 初始化数据结构
-                    if u1 not in self.user_sim_matrix:
-                        self.user_sim_matrix[u1] = {}
-                    if u2 not in self.user_sim_matrix:
-                        self.user_sim_matrix[u2] = {}
-
-                    # 增加共同观看计数
-                    self.user_sim_matrix[u1].setdefault(u2, {"common": 0, "ratings": []})
-                    self.user_sim_matrix[u2].setdefault(u1, {"common": 0, "ratings": []})
-
-                    self.user_sim_matrix[u1][u2]["common"] += 1
-                    self.user_sim_matrix[u2][u1]["common"] += 1
+                    row1 = self.user_sim_matrix.setdefault(u1, {})
+                    row2 = self.user_sim_matrix.setdefault(u2, {})
+
+                    stats = row1.get(u2)
+                    if stats is None:
+                        stats = [0, 0, 0, 0, 0, 0]
+                        row1[u2] = stats
+                        row2[u1] = stats
+
+                    x, y = (r1, r2) if u1 < u2 else (r2, r1)
+                    stats[0] += 1
+                    stats[1] += x
+                    stats[2] += y
+                    stats[3] += x * x
+                    stats[4] += y * y
+                    stats[5] += x * y
 
         print("计算皮尔逊相关系数...")
-        # 计算最终相似度（皮尔逊相关系数）
-        for u1 in self.user_sim_matrix:
-            for u2 in self.user_sim_matrix[u1]:
-                common_info = self.user_sim_matrix[u1][u2]
-
-                if common_info["common"] >= self.min_common:
-                    # 获取共同观看的视频
-                    common_videos = set(self.trainSet.get(u1, {})).intersection(
-                                    set(self.trainSet.get(u2, {})))
-
-                    if len(common_videos) >= self.min_common:
-                        # 收集评分
-                        ratings_u1 = []
-                        ratings_u2 = []
-
-                        for video in common_videos:
-                            rating1 = self.trainSet.get(u1, {}).get(video, 0)
-                            rating2 = self.trainSet.get(u2, {}).get(video, 0)
-                            ratings_u1.append(rating1)
-                            ratings_u2.append(rating2)
-
-                        # 计算皮尔逊相关系数
-                        if len(ratings_u1) >= 2:
-                            corr = self.pearson_sim(ratings_u1, ratings_u2)
-                            # 共同观看数量作为权重
-                            weighted_sim = corr * (1 + math.log1p(len(common_videos)))
-                            self.user_sim_matrix[u1][u2] = max(0, weighted_sim)
-                        else:
-                            self.user_sim_matrix[u1][u2] = 0
-                    else:
-                        self.user_sim_matrix[u1][u2] = 0
+        # 计算最终相似度（皮尔逊相关系数），同时保存共同观看数
+        self.common_counts = {}
+        for u1, row in self.user_sim_matrix.items():
+            common_row = self.common_counts[u1] = {}
+            for u2, stats in row.items():
+                common = stats[0]
+                common_row[u2] = common
+
+                if common >= self.min_common and common >= 2:
+                    corr = self.pearson_from_stats(*stats)
+                    # 共同观看数量作为权重
+                    weighted_sim = corr * (1 + math.log1p(common))
+                    row[u2] = max(0, weighted_sim)
                 else:
-                    self.user_sim_matrix[u1][u2] = 0
+                    row[u2] = 0
 
         print("相似度计算完成!")
 
@@ -266,11 +274,16 @@ class EnhancedUserBasedCF():
         if n == 0:
             return 0
 
-        sum1 = sum(ratings1)
-        sum2 = sum(ratings2)
-        sum1_sq = sum([r*r for r in ratings1])
-        sum2_sq = sum([r*r for r in ratings2])
-        p_sum = sum([ratings1[i] * ratings2[i] for i in range(n)])
+        return self.pearson_from_stats(
+            n, sum(ratings1), sum(ratings2),
+            sum([r*r for r in ratings1]), sum([r*r for r in ratings2]),
+            sum([ratings1[i] * ratings2[i] for i in range(n)]))
+
+    @staticmethod
+    def pearson_from_stats(n, sum1, sum2, sum1_sq, sum2_sq, p_sum):
+        """根据充分统计量 (n, Σx, Σy, Σx², Σy², Σxy) 计算皮尔逊相关系数"""
+        if n == 0:
+            return 0
 
         num = p_sum - (sum1 * sum2 / n)
         den = math.sqrt((sum1_sq - sum1*sum1/n) * (sum2_sq - sum2*sum2/n))
@@ -289,12 +302,11 @@ class EnhancedUserBasedCF():
                 similar_users = []
                 for other_user, sim in self.user_sim_matrix[user].items():
                     if isinstance(sim, (int, float)) and sim > 0:
-                        # 获取共同观看数量
-                        common_videos = set(self.trainSet.get(user, {})).intersection(
-                                      set(self.trainSet.get(other_user, {})))
+                        # 获取共同观看数量（计算相似度时已统计）
+                        common_count = self.get_common_count(user, other_user)
 
-                        if len(common_videos) > 0:
-                            similar_users.append((other_user, sim, len(common_videos)))
+                        if common_count > 0:
+                            similar_users.append((other_user, sim, common_count))
 
                 # 按相似度排序
                 similar_users.sort(key=lambda x: x[1], reverse=True)
@@ -311,26 +323,71 @@ class EnhancedUserBasedCF():
             else:
                 print(f"用户{user}没有相似用户")
 
+    def get_common_count(self, user, other_user):
+        """两个用户共同观看的视频数（calc_user_sim_enhanced 中统计）"""
+        return self.common_counts.get(user, {}).get(other_user, 0)
+
+    def build_category_preferences(self):
+        """预先计算 用户×类别 偏好矩阵: 每个用户的收藏在各类别中的占比"""
+        self.category_index = {}
+        for category in self.video_categories.values():
+            self.category_index.setdefault(category, len(self.category_index))
+        self.video_category_index = {video: self.category_index[category]
+                                     for video, category in self.video_categories.items()}
+        self.user_category_index = {user: i for i, user in enumerate(self.trainSet)}
+
+        matrix = np.zeros((len(self.user_category_index), len(self.category_index)))
+        for i, videos in enumerate(self.trainSet.values()):
+            for video in videos:
+                k = self.video_category_index.get(video)
+                if k is not None:
+                    matrix[i, k] += 1
+
+        # 归一化
+        totals = matrix.sum(axis=1, keepdims=True)
+        np.divide(matrix, totals, out=matrix, where=totals > 0)
+
+        self.user_category_matrix = matrix
+        self._category_trainSet = self.trainSet
+        self.user_categories = {}
+        self.user_category_masks = {}
+
+    def _category_preferences_ready(self):
+        if self.user_category_matrix is None or self._category_trainSet is not self.trainSet:
+            self.build_category_preferences()
+
+    def get_category_mask(self, user_id):
+        """用户偏好的类别（按类别列号的布尔列表，每个用户只生成一次），用户不在训练集中时返回None"""
+        self._category_preferences_ready()
+        if user_id in self.user_category_masks:
+            return self.user_category_masks[user_id]
+        i = self.user_category_index.get(user_id)
+        mask = None if i is None else (self.user_category_matrix[i] > 0).tolist()
+        self.user_category_masks[user_id] = mask
+        return mask
+
     def get_user_category_preference(self, user_id):
-        """获取用户类别偏好"""
+        """获取用户类别偏好 {category: 占比}（从偏好矩阵生成，每个用户只生成一次）"""
         if not self.video_categories:
             return {}
 
-        if user_id in self.trainSet:
-            category_counts = defaultdict(int)
-            videos = self.trainSet[user_id]
-
-            for video in videos:
-                if video in self.video_categories:
+        self._category_preferences_ready()
+        if user_id in self.user_categories:
+            return self.user_categories[user_id]
+
+        preference = {}
+        i = self.user_category_index.get(user_id)
+        if i is not None:
+            row = self.user_category_matrix[i]
+            # 类别按在用户收藏中首次出现的顺序排列
+            for video in self.trainSet[user_id]:
+                k = self.video_category_index.get(video)
+                if k is not None:
                     category = self.video_categories[video]
-                    category_counts[category] += 1
-
-            # 归一化
-            total = sum(category_counts.values())
-            if total > 0:
-                return {cat: count/total for cat, count in category_counts.items()}
-
-        return {}
+                    if category not in preference:
+                        preference[category] = float(row[k])
+        self.user_categories[user_id] = preference
+        return preference
 
     def recommend_enhanced(self, user):
         """增强版推荐算法"""
@@ -346,30 +403,30 @@ class EnhancedUserBasedCF():
 
         # 获取用户类别偏好
         user_preferences = self.get_user_category_preference(user)
-        preferred_categories = set(user_preferences.keys())
+        preferred_mask = self.get_category_mask(user)
 
         print(f"\n为用户{user}生成推荐:")
         print(f"  已观看视频数: {len(watched_videos)}")
         print(f"  类别偏好: {list(user_preferences.items())[:5]}")
+        # 热门后备优先推荐用户最偏好类别的热门视频
+        preferred_category = max(user_preferences, key=user_preferences.get) if user_preferences else None
 
         # 获取相似用户
         if user not in self.user_sim_matrix or not self.user_sim_matrix[user]:
             print("  没有找到相似用户，使用热门推荐")
-            return self.get_popular_fallback(watched_videos, N)
+            return self.get_popular_fallback(watched_videos, N, preferred_category)
 
         # 过滤相似用户（相似度>0）
         similar_users = []
         for other_user, sim in self.user_sim_matrix[user].items():
             if isinstance(sim, (int, float)) and sim > 0:
                 # 检查是否有足够的共同观看
-                common_videos = set(self.trainSet.get(user, {})).intersection(
-                              set(self.trainSet.get(other_user, {})))
-                if len(common_videos) >= 1:  # 至少有1个共同观看
+                if self.get_common_count(user, other_user) >= 1:  # 至少有1个共同观看
                     similar_users.append((other_user, sim))
 
         if not similar_users:
             print("  没有符合条件的相似用户，使用热门推荐")
-            return self.get_popular_fallback(watched_videos, N)
+            return self.get_popular_fallback(watched_videos, N, preferred_category)
 
         # 按相似度排序
         similar_users.sort(key=lambda x: x[1], reverse=True)
@@ -380,22 +437,23 @@ class EnhancedUserBasedCF():
 
         # 收集候选视频
         candidate_videos = defaultdict(float)
+        video_category_index = self.video_category_index
 
         for other_user, similarity in top_similar_users:
             other_videos = self.trainSet.get(other_user, {})
-            other_pref = self.get_user_category_preference(other_user)
+            other_mask = self.get_category_mask(other_user)
 
             for video, rating in other_videos.items():
                 if video in watched_videos:
                     continue
 
-                # 计算视频与用户偏好的匹配度
+                # 计算视频与用户偏好的匹配度（按类别列号查偏好矩阵）
                 category_match = 1.0
-                if self.video_categories and video in self.video_categories:
-                    video_category = self.video_categories[video]
-                    if video_category in preferred_categories:
+                k = video_category_index.get(video)
+                if k is not None:
+                    if preferred_mask[k]:
                         category_match = 2.0  # 偏好类别权重更高
-                    elif video_category in other_pref:
+                    elif other_mask is not None and other_mask[k]:
                         category_match = 1.5  # 相似用户偏好类别
 
                 # 计算得分
@@ -404,7 +462,7 @@ class EnhancedUserBasedCF():
 
         if not candidate_videos:
             print("  没有候选视频，使用热门推荐")
-            return self.get_popular_fallback(watched_videos, N)
+            return self.get_popular_fallback(watched_videos, N, preferred_category)
 
         # 归一化得分
         max_score = max(candidate_videos.values())
@@ -427,37 +485,21 @@ class EnhancedUserBasedCF():
 
         return recommendations
 
-    def get_popular_fallback(self, watched_videos, N):
-        """获取热门视频作为后备推荐"""
+    def get_popular_fallback(self, watched_videos, N, category=None):
+        """
+        获取热门视频作为后备推荐（沿预先排好序的热门列表跳过已观看的视频）
+        Args:
+            category: 优先推荐该分类的热门视频，不足N个时用全局热门补足
+        """
         if not self.trainSet:
             return []
+        return self.popularity_index().top(N, watched_videos, category=category)
 
-        # 计算视频流行度
-        video_popularity = defaultdict(int)
-        for user_videos in self.trainSet.values():
-            for video in user_videos:
-                video_popularity[video] += 1
-
-        # 过滤已观看视频
-        for video in watched_videos:
-            video_popularity.pop(video, None)
-
-        if not video_popularity:
-            return []
-
-        # 按流行度排序
-        popular_videos = sorted(video_popularity.items(),
-                               key=lambda x: x[1], reverse=True)
-
-        # 转换为(视频ID, 评分)格式
-        result = []
-        if popular_videos:
-            max_pop = max([count for _, count in popular_videos])
-            for video, count in popular_videos[:N]:
-                score = (count / max_pop) * 5.0 if max_pop > 0 else 3.0
-                result.append((video, score))
-
-        return result
+    def popularity_index(self):
+        """返回热门视频索引（含分类热门），每个训练集只统计一次"""
+        if self.popularity is None or self.popularity.source is not self.trainSet:
+            self.popularity = PopularityIndex(self.trainSet, self.video_categories)
+        return self.popularity
 
     def save_recommendations(self):
         """保存推荐结果到数据库"""
@@ -480,19 +522,9 @@ class EnhancedUserBasedCF():
             )
             cursor = db.cursor()
 
-            # 加载视频分类信息
+            # 加载视频分类信息，预先计算用户类别偏好
             self.load_video_categories(db)
-
-            # 清空推荐表
-            cursor.execute("TRUNCATE TABLE myapp_rec;")
-            db.commit()
-            print("已清空推荐表")
-
-            # 准备插入语句
-            insert_sql = """
-                INSERT INTO myapp_rec (user_id, video_id, score, created_at) 
-                VALUES (%s, %s, %s, NOW())
-            """
+            self.build_category_preferences()
 
             all_recommendations = []
             user_recommendation_stats = {}
@@ -515,15 +547,12 @@ class EnhancedUserBasedCF():
                         print(f"数据类型转换错误: user={user_id}, video={video_id}, score={score}, 错误: {e}")
                         continue
 
-            # 批量插入推荐数据
+            # 写入暂存表后原子替换推荐表
             if all_recommendations:
                 try:
-                    cursor.executemany(insert_sql, all_recommendations)
-                    db.commit()
-                    print(f"\n成功插入 {len(all_recommendations)} 条推荐记录")
+                    publish_recommendations(db, all_recommendations)
                 except Exception as e:
                     print(f"批量插入失败: {e}")
-                    db.rollback()
 
             # 统计信息
             print("\n推荐统计:")
@@ -42,12 +42,12 @@ class BiliVideoAnalyzer:
                     self.df['发布年份'] = self.df['发布时间'].dt.year
                     self.df['发布小时'] = self.df['发布时间'].dt.hour
 
-                # 处理视频时长字段（转换为数值）
+                # 处理视频时长字段（"时:分:秒"、"分:秒" 或 "秒" 转换为分钟，整列一次解析，无法解析的为NaN）
                 if '视频时长(分钟)' in self.df.columns:
-                    self.df['时长分钟'] = pd.to_numeric(
-                        self.df['视频时长(分钟)'].str.replace(',', '.'),
-                        errors='coerce'
-                    )
+                    parts = self.df['视频时长(分钟)'].astype(str).str.strip().str.extract(
+                        r'^(?:(\d+):)??(?:(\d+):)?(\d+)$'
+                    ).apply(pd.to_numeric)
+                    self.df['时长分钟'] = parts[0].fillna(0) * 60 + parts[1].fillna(0) + parts[2] / 60
 
                 if not self.df.empty:
                     print(f"数据处理成功，共{len(self.df)}条有效数据")